@@ -7,71 +7,131 @@ Handles different data periods for each station.
 import pandas as pd
 import numpy as np
 import os
+import sys
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_cleaning.station_cache import load_station_cache, timestamps_to_years, levels_to_float64
+from data_cleaning.timestamps import parse_timestamps
+from data_cleaning.rollup import build_station_rollup, daily_from_hourly_grid, rollup_to_frame, save_cube
+from data_cleaning.hourly_store import open_hourly_store, year_bounds, valid_mask
+from data_cleaning.completeness import station_completeness, save_completeness
+from data_cleaning.stations import STATION_DATA_FOLDERS
+
 # Government baseline rate: 6.2 mm/year = 0.0203 ft/year (2.03 ft per 100 years)
 GOVERNMENT_SLR_RATE_MM_YEAR = 6.2
 GOVERNMENT_SLR_RATE_FT_YEAR = 0.0203
 GOVERNMENT_SLR_RATE_FT_100YEAR = 2.03
 
-def aggregate_station_data(filepath, station_name):
+# Rows per chunk for the streaming aggregator
+STREAM_CHUNK_ROWS = 100_000
+
+# Medians are taken from per-year histograms on a 0.001 ft grid. NOAA levels
+# have at most 3 decimals, so this is exact; other data is off by <= 0.0005 ft
+MEDIAN_RESOLUTION_FT = 0.001
+MEDIAN_SCALE = 1000
+_BIN_SPAN = 1 << 32  # packs (year index, level bin) into one int64 key
+
+def new_annual_state():
+    """Empty running state for the streaming annual aggregator."""
+    return {}
+
+def update_annual_state(state, years, values):
     """
-    Aggregate hourly water level data to annual statistics.
+    Fold one chunk of hourly observations into the running annual statistics.
+    
+    Per year the state keeps the count, running mean and sum of squared
+    deviations (Welford/Chan merge of chunk statistics), min, max, and a
+    sparse histogram of values on a MEDIAN_RESOLUTION_FT grid for the median.
+    Memory therefore depends on the number of years and distinct levels,
+    not on the number of hourly rows.
     
     Args:
-        filepath: Path to cleaned CSV file
-        station_name: Name of the station
+        state: Dict from new_annual_state()
+        years: Array of calendar years
+        values: Array of water levels (ft)
+    """
+    years = np.asarray(years, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    
+    # Filter out invalid data and years (should be between 1980 and 2100)
+    keep = ~np.isnan(values) & (years >= 1980) & (years <= 2100)
+    years = years[keep]
+    values = values[keep]
+    if len(values) == 0:
+        return state
+    
+    # Chunk statistics per year
+    chunk_years, inverse = np.unique(years, return_inverse=True)
+    counts = np.bincount(inverse)
+    means = np.bincount(inverse, weights=values) / counts
+    m2s = np.bincount(inverse, weights=(values - means[inverse]) ** 2)
+    mins = np.full(len(chunk_years), np.inf)
+    maxs = np.full(len(chunk_years), -np.inf)
+    np.minimum.at(mins, inverse, values)
+    np.maximum.at(maxs, inverse, values)
+    
+    # Histogram of (year, level bin) pairs for the median
+    bins = np.round(values * MEDIAN_SCALE).astype(np.int64)
+    keys, key_counts = np.unique(inverse * _BIN_SPAN + (bins + _BIN_SPAN // 2), return_counts=True)
+    key_years = keys // _BIN_SPAN
+    key_bins = keys % _BIN_SPAN - _BIN_SPAN // 2
+    
+    for i, year in enumerate(chunk_years):
+        year = int(year)
+        n_b, mean_b, m2_b = int(counts[i]), means[i], m2s[i]
+        current = state.get(year)
+        if current is None:
+            state[year] = current = {'count': 0, 'mean': 0.0, 'm2': 0.0,
+                                     'min': np.inf, 'max': -np.inf, 'histogram': {}}
         
-    Returns:
-        DataFrame with annual statistics
+        # Chan et al. parallel merge of (count, mean, M2)
+        n_a = current['count']
+        n = n_a + n_b
+        delta = mean_b - current['mean']
+        current['mean'] += delta * n_b / n
+        current['m2'] += m2_b + delta ** 2 * n_a * n_b / n
+        current['count'] = n
+        current['min'] = min(current['min'], mins[i])
+        current['max'] = max(current['max'], maxs[i])
+    
+    for i, level_bin, n in zip(key_years.tolist(), key_bins.tolist(), key_counts.tolist()):
+        histogram = state[int(chunk_years[i])]['histogram']
+        histogram[level_bin] = histogram.get(level_bin, 0) + n
+    
+    return state
+
+def _histogram_median(histogram, count):
+    """Median from a sparse level histogram (mean of the middle pair for even counts)."""
+    level_bins = np.array(sorted(histogram))
+    cumulative = np.cumsum([histogram[b] for b in level_bins])
+    lower = level_bins[np.searchsorted(cumulative, (count - 1) // 2, side='right')] / MEDIAN_SCALE
+    upper = level_bins[np.searchsorted(cumulative, count // 2, side='right')] / MEDIAN_SCALE
+    return (lower + upper) / 2
+
+def finalize_annual_state(state, station_name):
     """
-    print(f"\nProcessing {station_name}...")
-    
-    if not os.path.exists(filepath):
-        print(f"Warning: File '{filepath}' not found!")
-        return None
+    Convert the running state into the annual statistics table.
     
-    # Load data with low_memory=False to handle mixed types
-    df = pd.read_csv(filepath, low_memory=False)
-    
-    # Convert Verified_ft to numeric, handling any non-numeric values
-    df['Verified_ft'] = pd.to_numeric(df['Verified_ft'], errors='coerce')
-    
-    # Filter out rows with invalid data
-    df = df.dropna(subset=['Verified_ft'])
-    
-    # Try to parse datetime - handle different formats
-    # First try standard format: YYYY/MM/DD HH:MM
-    try:
-        df['datetime'] = pd.to_datetime(df['Date'].astype(str) + ' ' + df['Time'].astype(str), 
-                                        format='%Y/%m/%d %H:%M', errors='coerce')
-    except:
-        df['datetime'] = pd.to_datetime(df['Date'].astype(str) + ' ' + df['Time'].astype(str), 
-                                        errors='coerce')
-    
-    # Filter out rows where datetime parsing failed
-    df = df.dropna(subset=['datetime'])
-    
-    # Extract year
-    df['year'] = df['datetime'].dt.year
-    
-    # Filter out invalid years (should be between 1980 and 2100)
-    df = df[(df['year'] >= 1980) & (df['year'] <= 2100)]
-    
-    # Group by year and calculate statistics
-    annual_stats = df.groupby('year').agg({
-        'Verified_ft': [
-            'mean',      # Annual mean water level
-            'median',    # Annual median
-            'std',       # Annual standard deviation
-            'min',       # Annual minimum
-            'max',       # Annual maximum
-            'count'      # Number of observations per year
-        ]
-    }).reset_index()
-    
-    # Flatten column names
-    annual_stats.columns = ['year', 'mean_ft', 'median_ft', 'std_ft', 'min_ft', 'max_ft', 'count']
+    Returns:
+        DataFrame with the annual_water_levels.csv columns
+    """
+    rows = []
+    for year in sorted(state):
+        current = state[year]
+        n = current['count']
+        rows.append({
+            'year': year,
+            'mean_ft': current['mean'],                                   # Annual mean water level
+            'median_ft': _histogram_median(current['histogram'], n),      # Annual median
+            'std_ft': np.sqrt(current['m2'] / (n - 1)) if n > 1 else np.nan,  # Annual standard deviation
+            'min_ft': current['min'],                                     # Annual minimum
+            'max_ft': current['max'],                                     # Annual maximum
+            'count': n                                                    # Number of observations per year
+        })
+    
+    annual_stats = pd.DataFrame(rows, columns=['year', 'mean_ft', 'median_ft', 'std_ft',
+                                               'min_ft', 'max_ft', 'count'])
     
     # Add station name
     annual_stats['station'] = station_name
@@ -89,16 +149,165 @@ def aggregate_station_data(filepath, station_name):
     
     return annual_stats
 
-def calculate_decadal_stats(annual_df):
+def aggregate_station_data(filepath, station_name, chunksize=STREAM_CHUNK_ROWS):
+    """
+    Aggregate hourly water level data to annual statistics.
+    
+    The cleaned CSV is streamed in chunks, so peak memory stays flat
+    regardless of how long the station's history is.
+    
+    Args:
+        filepath: Path to cleaned CSV file
+        station_name: Name of the station
+        chunksize: Rows read per chunk
+        
+    Returns:
+        DataFrame with annual statistics
+    """
+    print(f"\nProcessing {station_name}...")
+    
+    if not os.path.exists(filepath):
+        print(f"Warning: File '{filepath}' not found!")
+        return None
+    
+    state = new_annual_state()
+    
+    for chunk in pd.read_csv(filepath, dtype=str, keep_default_na=False, chunksize=chunksize):
+        # Convert Verified_ft to numeric, handling any non-numeric values
+        values = pd.to_numeric(chunk['Verified_ft'], errors='coerce').values
+        
+        # Parse datetime with the vectorized fixed-format parser
+        # (YYYY/MM/DD HH:MM, or M/D/YY H:MM in the DataManagement exports)
+        date_column = 'Date' if 'Date' in chunk.columns else 'date_recorded'
+        datetimes = parse_timestamps(chunk[date_column], chunk['Time'])
+        
+        # Filter out rows where datetime parsing failed
+        parsed = ~np.isnat(datetimes)
+        
+        update_annual_state(state, timestamps_to_years(datetimes[parsed]), values[parsed])
+    
+    return finalize_annual_state(state, station_name)
+
+def aggregate_station_cache(folder_name, station_name, chunksize=STREAM_CHUNK_ROWS):
+    """
+    Aggregate a station's hourly data to annual statistics using the binary cache.
+    
+    The memory-mapped cache is streamed in chunks, like the CSV path.
+    
+    Args:
+        folder_name: Folder containing the station's yearly CSV files
+        station_name: Name of the station
+        chunksize: Rows processed per chunk
+        
+    Returns:
+        DataFrame with annual statistics
+    """
+    print(f"\nProcessing {station_name} (cached)...")
+    
+    cached = load_station_cache(folder_name)
+    if cached is None:
+        return None
+    timestamps, levels = cached
+    
+    state = new_annual_state()
+    for start in range(0, len(timestamps), chunksize):
+        stop = start + chunksize
+        update_annual_state(state, timestamps_to_years(timestamps[start:stop]),
+                            levels_to_float64(levels[start:stop]))
+    
+    return finalize_annual_state(state, station_name)
+
+def build_aggregate_cube(station_names):
+    """
+    Build the daily/monthly/annual/decadal cube for every station with an hourly store.
+    
+    Args:
+        station_names: Stations to include (must have a data folder)
+        
+    Returns:
+        DataFrame with one row per (station, resolution, period)
+    """
+    frames = []
+    for station_name in station_names:
+        folder_name = STATION_DATA_FOLDERS.get(station_name)
+        if not folder_name or not os.path.exists(folder_name):
+            print(f"  Skipping {station_name} in aggregate cube (no cached hourly data)")
+            continue
+        
+        # Days come straight from the fixed-stride hourly store (years 1980-2100)
+        store = open_hourly_store(folder_name)
+        if store is None:
+            print(f"  Skipping {station_name} in aggregate cube (no hourly store)")
+            continue
+        start, _ = year_bounds(store, 1980)
+        _, stop = year_bounds(store, 2100)
+        daily = daily_from_hourly_grid(levels_to_float64(store['levels'][start:stop]),
+                                       valid_mask(store, start, stop), store['epoch'] + start)
+        if len(daily['key']) == 0:
+            print(f"  Skipping {station_name} in aggregate cube (no valid hours in 1980-2100)")
+            continue
+        
+        rollup = build_station_rollup(daily)
+        frames.append(rollup_to_frame(station_name, rollup))
+    
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True)
+
+def build_completeness_index(station_names):
     """
-    Calculate decadal statistics for trend analysis.
+    Observed vs expected hours per station-year and station-month.
     
     Args:
-        annual_df: DataFrame with annual statistics
+        station_names: Stations to include (must have a data folder)
         
     Returns:
-        DataFrame with decadal statistics
+        DataFrame with one row per (station, resolution, period), or None
     """
+    frames = []
+    for station_name in station_names:
+        folder_name = STATION_DATA_FOLDERS.get(station_name)
+        if not folder_name or not os.path.exists(folder_name):
+            continue
+        
+        store = open_hourly_store(folder_name)
+        if store is None:
+            continue
+        frames.append(station_completeness(store, valid_mask(store), station_name))
+    
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True)
+
+def calculate_decadal_stats(annual_df, cube_df=None):
+    """
+    Calculate decadal statistics for the summary printout.
+    
+    Stations in the aggregate cube use its decadal rows: mean and std of every
+    hourly observation in the decade, the same numbers as aggregate_cube.csv.
+    Stations without an hourly store fall back to the mean and std of their
+    annual means, which is a much narrower spread (year-to-year variation only).
+    
+    Args:
+        annual_df: DataFrame with annual statistics for one station
+        cube_df: Aggregate cube from build_aggregate_cube(), or None
+        
+    Returns:
+        DataFrame with decadal statistics and a 'basis' column
+        ('hourly' or 'annual means')
+    """
+    station_name = annual_df['station'].iloc[0]
+    if cube_df is not None:
+        decades = cube_df[(cube_df['station'] == station_name) & (cube_df['resolution'] == 'decadal')]
+        if len(decades) > 0:
+            return pd.DataFrame({
+                'decade': decades['period'].str.rstrip('s').astype(int).values,
+                'decadal_mean_ft': decades['mean_ft'].values,
+                'decadal_std_ft': decades['std_ft'].values,
+                'num_years': decades['n_periods'].values,
+                'basis': 'hourly'
+            })
+    
     annual_df = annual_df.copy()
     annual_df['decade'] = (annual_df['year'] // 10) * 10
     
@@ -108,6 +317,7 @@ def calculate_decadal_stats(annual_df):
     }).reset_index()
     
     decadal_stats.columns = ['decade', 'decadal_mean_ft', 'decadal_std_ft', 'num_years']
+    decadal_stats['basis'] = 'annual means'
     
     return decadal_stats
 
@@ -130,9 +340,13 @@ def main():
     
     all_annual_data = []
     
-    # Process each station
+    # Process each station, preferring the binary cache built from the raw yearly files
     for station_name, filepath in stations.items():
-        annual_data = aggregate_station_data(filepath, station_name)
+        folder_name = STATION_DATA_FOLDERS.get(station_name)
+        if folder_name and os.path.exists(folder_name):
+            annual_data = aggregate_station_cache(folder_name, station_name)
+        else:
+            annual_data = aggregate_station_data(filepath, station_name)
         if annual_data is not None:
             all_annual_data.append(annual_data)
     
@@ -155,16 +369,28 @@ def main():
         station_data.to_csv(station_file, index=False)
         print(f"[OK] {station_name} annual data saved to: {station_file}")
     
+    # Materialize every resolution once so later stages never re-read hourly data
+    cube = build_aggregate_cube(stations.keys())
+    if cube is not None:
+        save_cube(cube)
+    
+    # Completeness weights for the weighted trend and projection fits
+    completeness = build_completeness_index(stations.keys())
+    if completeness is not None:
+        save_completeness(completeness)
+    
     # Calculate decadal statistics
     print("\n" + "=" * 60)
     print("Decadal Statistics Summary")
     print("=" * 60)
+    print("(± is the std of hourly levels; stations marked 'annual means' use the std of yearly means)")
     
     for station_name in stations.keys():
         station_data = combined_annual[combined_annual['station'] == station_name]
         if len(station_data) > 0:
-            decadal_stats = calculate_decadal_stats(station_data)
-            print(f"\n{station_name}:")
+            decadal_stats = calculate_decadal_stats(station_data, cube)
+            basis = decadal_stats['basis'].iloc[0]
+            print(f"\n{station_name}:" + (" (annual means)" if basis != 'hourly' else ""))
             for _, row in decadal_stats.iterrows():
                 print(f"  {row['decade']}s: Mean = {row['decadal_mean_ft']:.2f} ft "
                       f"(±{row['decadal_std_ft']:.2f} ft, {int(row['num_years'])} years)")
@@ -4,27 +4,178 @@ Simple script to combine and clean water level data for linear regression modeli
 Removes preliminary data and cleans missing values.
 """
 
+import argparse
 import csv
+import hashlib
+import io
+import json
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
-def process_folder(folder_name, output_filename):
-    """Combine and clean water level CSV files from a specific folder."""
+# Yearly NOAA exports are named YYYY.csv or YYYY_*.csv (e.g. 2001_water_levels.csv)
+YEARLY_FILE_PATTERN = re.compile(r'^(\d{4})(_.*)?\.csv$')
+
+# Header row of every cleaned output file
+CLEANED_HEADER = ["Date", "Time", "Verified_ft"]
+
+MANIFEST_VERSION = 1
+
+def list_yearly_files(folder_name):
+    """Return the sorted paths of the yearly water level CSV files in a folder."""
+    yearly_files = []
+    for file in os.listdir(folder_name):
+        if YEARLY_FILE_PATTERN.match(file):
+            yearly_files.append(os.path.join(folder_name, file))
+    yearly_files.sort()  # Sort by year
+    return yearly_files
+
+def file_digest(filepath, chunk_size=1 << 20):
+    """SHA-256 of a file's contents, read in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def source_unchanged(filepath, entry):
+    """
+    Check a source file against its recorded fingerprint.
+    
+    Size and mtime are compared first; the content hash is only computed
+    when they differ, so a touched-but-identical file is not re-parsed.
+    
+    Args:
+        filepath: Path of the source file
+        entry: Dict with 'size', 'mtime_ns' and 'sha256', or None
+        
+    Returns:
+        (unchanged, stat_info, sha256 or None if it was not computed)
+    """
+    stat_info = os.stat(filepath)
+    if entry is None:
+        return False, stat_info, None
+    if entry['size'] == stat_info.st_size and entry['mtime_ns'] == stat_info.st_mtime_ns:
+        return True, stat_info, entry['sha256']
+    sha256 = file_digest(filepath)
+    unchanged = entry['size'] == stat_info.st_size and entry['sha256'] == sha256
+    return unchanged, stat_info, sha256
+
+def clean_yearly_file(csv_file):
+    """
+    Read one yearly file and return its verified rows in timestamp order.
+    
+    This is the unit of work for parallel ingest, so it must not touch any
+    shared state.
+    
+    Returns:
+        List of (Date, Time, Verified) tuples
+    """
+    rows = []
+    
+    with open(csv_file, 'r', encoding='utf-8') as infile:
+        reader = csv.reader(infile)
+        next(reader)  # Skip header
+        
+        for row in reader:
+            # Skip rows with missing verified data
+            if len(row) >= 5 and row[4] != "-" and row[4].strip():
+                rows.append((row[0], row[1], row[4]))
+    
+    # NOAA dates and times (YYYY/MM/DD, HH:MM) sort lexicographically in time order
+    rows.sort(key=lambda r: (r[0], r[1]))
+    
+    return rows
+
+def submit_yearly_files(csv_files, executor):
+    """Queue parsing of yearly files on a process pool; returns {path: future}."""
+    return {csv_file: executor.submit(clean_yearly_file, csv_file) for csv_file in csv_files}
+
+def cleaned_filename(folder_name):
+    """Output filename: cleaned_<folder_name_lowercase_with_underscores>_water_levels.csv"""
+    output_name = folder_name.lower().replace(" ", "_").replace("-", "_")
+    return f"cleaned_{output_name}_water_levels.csv"
+
+def manifest_path(output_file):
+    """Manifest recording which yearly files are folded into a cleaned output file."""
+    return os.path.splitext(output_file)[0] + "_manifest.json"
+
+def load_manifest(output_file):
+    """
+    Load the manifest for a cleaned output file.
+    
+    Returns None (forcing a full rebuild) when the manifest is missing,
+    from an older version, or no longer matches the output file's size.
+    """
+    path = manifest_path(output_file)
+    if not (os.path.exists(path) and os.path.exists(output_file)):
+        return None
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    if os.path.getsize(output_file) != manifest.get('output_size'):
+        return None
+    return manifest
+
+def stale_yearly_files(csv_files, manifest):
+    """
+    Split yearly files into those already folded into the output and those to parse.
+    
+    Returns:
+        ({filename: manifest entry} of unchanged files, [paths of new or changed files])
+    """
+    entries = manifest['files'] if manifest else {}
+    reused = {}
+    stale = []
+    
+    for csv_file in csv_files:
+        filename = os.path.basename(csv_file)
+        entry = entries.get(filename)
+        unchanged, stat_info, _ = source_unchanged(csv_file, entry)
+        if unchanged:
+            reused[filename] = dict(entry, mtime_ns=stat_info.st_mtime_ns)
+        else:
+            stale.append(csv_file)
+    
+    return reused, stale
+
+def _encode_rows(rows):
+    """Encode rows exactly as csv.writer writes them to the output file."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+def process_folder(folder_name, output_filename, workers=1, pending=None, rebuild=False):
+    """
+    Combine and clean water level CSV files from a specific folder.
+    
+    The output is made of one contiguous segment per yearly file. A manifest
+    next to the output records each file's checksum and byte range, so only
+    new or changed files are parsed; their rows are spliced in and untouched
+    segments are kept as-is.
+    
+    Args:
+        folder_name: Folder containing the yearly CSV files
+        output_filename: Name of the cleaned file written to output/
+        workers: Number of worker processes used to parse the yearly files
+        pending: Optional {path: future} of files already queued on a shared
+                 process pool (see clean_and_combine_data)
+        rebuild: If True, ignore the manifest and rewrite the whole output
+    """
     
     # Create output folder
     os.makedirs("output", exist_ok=True)
     
     # Find all water level CSV files
-    csv_files = []
     if not os.path.exists(folder_name):
         print(f"Warning: Folder '{folder_name}' not found!")
         return None
     
-    for file in os.listdir(folder_name):
-        if file.endswith(".csv"):
-            csv_files.append(os.path.join(folder_name, file))
-    
-    csv_files.sort()  # Sort by year
+    csv_files = list_yearly_files(folder_name)
     
     if not csv_files:
         print(f"No CSV files found in '{folder_name}' folder!")
@@ -35,69 +186,166 @@ def process_folder(folder_name, output_filename):
     # Prepare output file
     output_file = f"output/{output_filename}"
     
-    with open(output_file, 'w', newline='', encoding='utf-8') as outfile:
-        writer = csv.writer(outfile)
-        
-        # Write header (only verified data)
-        writer.writerow(["Date", "Time", "Verified_ft"])
-        
-        total_rows = 0
-        
-        for csv_file in csv_files:
+    manifest = None if rebuild else load_manifest(output_file)
+    reused, stale = stale_yearly_files(csv_files, manifest)
+    removed = sorted(set(manifest['files']) - set(reused) - {os.path.basename(f) for f in stale}) if manifest else []
+    
+    if manifest and not stale and not removed:
+        print(f"Output up to date: {output_file}")
+        print(f"Total clean records: {manifest['total_rows']:,}")
+        return output_file
+    
+    print(f"Reusing {len(reused)} unchanged file(s), parsing {len(stale)}")
+    
+    executor = None
+    if pending is None and workers > 1 and len(stale) > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        pending = submit_yearly_files(stale, executor)
+    
+    # Each segment is (first timestamp, filename, manifest entry, encoded rows or None)
+    segments = [(entry['first'], filename, entry, None) for filename, entry in reused.items()]
+    try:
+        for csv_file in stale:
             # Extract year from filename (handle both formats: YYYY.csv or YYYY_*.csv)
             filename = os.path.basename(csv_file)
             year = filename.split('_')[0].replace('.csv', '')
             print(f"Processing {year}...")
             
-            with open(csv_file, 'r', encoding='utf-8') as infile:
-                reader = csv.reader(infile)
-                next(reader)  # Skip header
-                
-                for row in reader:
-                    # Skip rows with missing verified data
-                    if len(row) >= 5 and row[4] != "-" and row[4].strip():
-                        # Write: Date, Time, Verified
-                        writer.writerow([row[0], row[1], row[4]])
-                        total_rows += 1
+            if pending is not None and csv_file in pending:
+                rows = pending[csv_file].result()
+            else:
+                rows = clean_yearly_file(csv_file)
+            
+            stat_info = os.stat(csv_file)
+            entry = {
+                'size': stat_info.st_size,
+                'mtime_ns': stat_info.st_mtime_ns,
+                'sha256': file_digest(csv_file),
+                'rows': len(rows),
+                'first': f"{rows[0][0]} {rows[0][1]}" if rows else ""
+            }
+            segments.append((entry['first'], filename, entry, _encode_rows(rows)))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    
+    # Yearly files cover disjoint time ranges, so ordering whole segments by
+    # their first timestamp merges them in timestamp order
+    segments.sort(key=lambda segment: (segment[0], segment[1]))
+    
+    header = _encode_rows([CLEANED_HEADER])
+    
+    # Segments that are unchanged and still at their old offset stay in place;
+    # everything after the first difference is rewritten
+    keep_until = 0
+    if manifest:
+        keep_until = len(header)
+        for _, _, entry, data in segments:
+            if data is not None or entry['offset'] != keep_until:
+                break
+            keep_until += entry['length']
+    
+    # Invalidate the manifest first so an interrupted write forces a full rebuild
+    if os.path.exists(manifest_path(output_file)):
+        os.remove(manifest_path(output_file))
+    
+    with open(output_file, 'r+b' if keep_until else 'wb') as outfile:
+        # Read the reused segments that have to move before truncating
+        tail = []
+        for first, filename, entry, data in segments:
+            if data is None and entry['offset'] >= keep_until:
+                outfile.seek(entry['offset'])
+                data = outfile.read(entry['length'])
+            tail.append(data)
+        
+        if keep_until:
+            outfile.seek(keep_until)
+            outfile.truncate()
+        else:
+            outfile.write(header)
+        
+        files = {}
+        for (first, filename, entry, _), data in zip(segments, tail):
+            if data is not None:
+                entry = dict(entry, offset=outfile.tell(), length=len(data))
+                outfile.write(data)
+            files[filename] = entry
+        output_size = outfile.tell()
+    
+    total_rows = sum(entry['rows'] for entry in files.values())
+    
+    with open(manifest_path(output_file), 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': MANIFEST_VERSION,
+            'folder': folder_name,
+            'output_size': output_size,
+            'total_rows': total_rows,
+            'files': files
+        }, f, indent=2, sort_keys=True)
     
     print(f"Cleaned data saved to: {output_file}")
     print(f"Total clean records: {total_rows:,}")
     
     return output_file
 
-def clean_and_combine_data():
+def clean_and_combine_data(workers=1, rebuild=False):
     """Combine and clean water level CSV files for ML modeling.
-    Automatically discovers and processes all folders containing CSV files."""
+    Automatically discovers and processes all folders containing CSV files.
+    
+    With workers > 1, every new or changed (station, year) file is queued on
+    one shared process pool up front, so ingest scales with core count rather
+    than with the number of stations."""
     
     # Folders to skip (not data folders)
     skip_folders = {"output", "__pycache__", ".git"}
     
-    # Find all folders that contain CSV files
+    # Find all folders that contain yearly CSV files
     folders_to_process = []
     
     for item in os.listdir("."):
         if os.path.isdir(item) and item not in skip_folders:
-            # Check if folder contains CSV files
-            csv_count = sum(1 for f in os.listdir(item) if f.endswith(".csv"))
-            if csv_count > 0:
+            if list_yearly_files(item):
                 folders_to_process.append(item)
     
     if not folders_to_process:
         print("No folders with CSV files found!")
         return
     
+    folders_to_process.sort()
+    
     print(f"Found {len(folders_to_process)} folder(s) with CSV files to process")
+    if workers > 1:
+        print(f"Parsing with {workers} worker processes")
     print("=" * 40)
     
-    # Process each folder
-    for folder_name in sorted(folders_to_process):
-        # Generate output filename: cleaned_<folder_name_lowercase_with_underscores>_water_levels.csv
-        output_name = folder_name.lower().replace(" ", "_").replace("-", "_")
-        output_filename = f"cleaned_{output_name}_water_levels.csv"
-        process_folder(folder_name, output_filename)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        pending = {}
+        if executor is not None:
+            for folder_name in folders_to_process:
+                output_file = f"output/{cleaned_filename(folder_name)}"
+                manifest = None if rebuild else load_manifest(output_file)
+                _, stale = stale_yearly_files(list_yearly_files(folder_name), manifest)
+                pending[folder_name] = submit_yearly_files(stale, executor)
+        
+        # Process each folder
+        for folder_name in folders_to_process:
+            process_folder(folder_name, cleaned_filename(folder_name),
+                           pending=pending.get(folder_name), rebuild=rebuild)
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Water Level Data Cleaner")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes for parsing yearly files (0 = one per CPU core)")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Ignore the manifests and rewrite every cleaned file")
+    args = parser.parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    
     print("Water Level Data Cleaner")
     print("=" * 40)
-    clean_and_combine_data()
+    clean_and_combine_data(workers=workers, rebuild=args.rebuild)
     print("\nDone!")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Data-completeness index per station-year and station-month.
+Computed in one vectorized pass over the hourly store's validity bitmask:
+observed vs expected hours and the longest run of missing hours in each period.
+The annual completeness is used as the weight in the weighted least-squares
+trend and projection fits, so partial years count for less.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+COMPLETENESS_FILE = 'output/data_completeness.csv'
+
+# Floor on regression weights so a sparse year is down-weighted, never dropped
+MIN_COMPLETENESS_WEIGHT = 0.05
+
+def _period_starts(store, unit):
+    """Hour offsets of every month or year boundary covered by the store."""
+    first = store['epoch'].astype(f'datetime64[{unit}]')
+    last = (store['epoch'] + store['n_hours'] - 1).astype(f'datetime64[{unit}]')
+    periods = np.arange(first, last + 1)
+    starts = (periods.astype('datetime64[h]') - store['epoch']).astype(np.int64)
+    return periods, np.clip(starts, 0, store['n_hours'])
+
+def _longest_gaps(valid, starts):
+    """Longest run of missing hours inside each period, gaps cut at period edges."""
+    positions = np.arange(len(valid))
+    last_seen = np.where(valid, positions, -1)
+    # A period start acts as if the hour before it were observed
+    last_seen[starts] = np.maximum(last_seen[starts], starts - 1)
+    last_seen = np.maximum.accumulate(last_seen)
+    gap_length = positions - last_seen
+    return np.maximum.reduceat(gap_length, starts)
+
+def period_completeness(store, valid, unit):
+    """
+    Completeness of every calendar period ('Y' or 'M') in a station's store.
+
+    Args:
+        store: Dict from hourly_store.open_hourly_store()
+        valid: Full validity mask of the store
+        unit: 'Y' for years, 'M' for months
+
+    Returns:
+        DataFrame with period, expected_hours, observed_hours,
+        completeness and longest_gap_hours
+    """
+    periods, starts = _period_starts(store, unit)
+    bounds = np.append(starts, store['n_hours'])
+    expected = np.diff(bounds)
+
+    observed = np.add.reduceat(valid.astype(np.int64), starts)
+    longest_gap = _longest_gaps(valid, starts)
+
+    return pd.DataFrame({
+        'period': np.datetime_as_string(periods),
+        'expected_hours': expected,
+        'observed_hours': observed,
+        'completeness': observed / expected,
+        'longest_gap_hours': longest_gap
+    })
+
+def station_completeness(store, valid, station_name):
+    """Annual and monthly completeness rows for one station."""
+    frames = []
+    for resolution, unit in (('annual', 'Y'), ('monthly', 'M')):
+        table = period_completeness(store, valid, unit)
+        table.insert(0, 'resolution', resolution)
+        table.insert(0, 'station', station_name)
+        frames.append(table)
+    return pd.concat(frames, ignore_index=True)
+
+def save_completeness(completeness_df, output_file=COMPLETENESS_FILE):
+    """Write the completeness table to CSV."""
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    completeness_df.to_csv(output_file, index=False)
+    print(f"[OK] Data completeness index saved to: {output_file}")
+    return output_file
+
+def load_annual_weights(completeness_file=COMPLETENESS_FILE):
+    """
+    Regression weights per (station, year) from the completeness index.
+
+    Returns:
+        DataFrame with station, year and weight, or None if the index is missing
+    """
+    if not os.path.exists(completeness_file):
+        return None
+
+    table = pd.read_csv(completeness_file, dtype={'period': str})
+    table = table[table['resolution'] == 'annual']
+    return pd.DataFrame({
+        'station': table['station'].values,
+        'year': table['period'].astype(int).values,
+        'weight': np.clip(table['completeness'].values, MIN_COMPLETENESS_WEIGHT, 1.0)
+    })
+
+def completeness_weights(annual_data, weights_df):
+    """
+    Align completeness weights with a station's annual rows.
+
+    Years missing from the index get weight 1.0.
+    """
+    if weights_df is None:
+        return None
+    merged = annual_data[['station', 'year']].merge(weights_df, on=['station', 'year'], how='left')
+    return merged['weight'].fillna(1.0).values
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Fixed-stride, memory-mapped hourly water level store.
+Each station is a float32 array with one slot per hour since the station
+epoch (January 1 of its first year, GMT), plus a packed validity bitmask.
+Hours with no verified observation (missing or preliminary-only) are NaN
+and have their validity bit cleared. Any time range maps to an index range
+in O(1), and slices are zero-copy views of the memory-mapped file.
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_cleaning.clean_data import list_yearly_files
+from data_cleaning.station_cache import CACHE_DIR, build_station_cache, station_slug
+
+STORE_DIR = 'output/hourly_store'
+STORE_VERSION = 1
+
+SECONDS_PER_HOUR = 3600
+
+def _cache_fingerprint(cache_station_dir):
+    """Size and mtime of the combined cache arrays the store was built from."""
+    fingerprint = {}
+    for name in ('timestamps.npy', 'verified_ft.npy'):
+        stat_info = os.stat(os.path.join(cache_station_dir, name))
+        fingerprint[name] = [stat_info.st_size, stat_info.st_mtime_ns]
+    return fingerprint
+
+def _read_meta(station_dir):
+    meta_file = os.path.join(station_dir, 'meta.json')
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    return meta if meta.get('version') == STORE_VERSION else None
+
+def build_hourly_store(folder_name, store_dir=STORE_DIR, cache_dir=CACHE_DIR):
+    """
+    Build (or refresh) a station's hourly store from its binary cache.
+
+    The store is only rewritten when the cache arrays have changed.
+
+    Args:
+        folder_name: Folder containing the station's yearly CSV files
+        store_dir: Root directory of the hourly stores
+        cache_dir: Root directory of the station cache
+
+    Returns:
+        Path of the station's store directory, or None if the folder is missing
+    """
+    cache_station_dir = build_station_cache(folder_name, cache_dir)
+    if cache_station_dir is None:
+        return None
+
+    station_dir = os.path.join(store_dir, station_slug(folder_name))
+    fingerprint = _cache_fingerprint(cache_station_dir)
+    meta = _read_meta(station_dir)
+    if meta is not None and meta['source'] == fingerprint:
+        return station_dir
+
+    os.makedirs(station_dir, exist_ok=True)
+    timestamps = np.load(os.path.join(cache_station_dir, 'timestamps.npy'), mmap_mode='r')
+    levels = np.load(os.path.join(cache_station_dir, 'verified_ft.npy'), mmap_mode='r')
+
+    # Only observations on the hour have a slot
+    on_hour = np.asarray(timestamps) % SECONDS_PER_HOUR == 0
+    hours = np.asarray(timestamps)[on_hour] // SECONDS_PER_HOUR
+    values = np.asarray(levels)[on_hour]
+
+    if len(hours):
+        first_year = hours.min().astype('datetime64[h]').astype('datetime64[Y]')
+        epoch_hour = int(first_year.astype('datetime64[h]').astype(np.int64))
+        last_year = hours.max().astype('datetime64[h]').astype('datetime64[Y]') + 1
+        n_hours = int(last_year.astype('datetime64[h]').astype(np.int64)) - epoch_hour
+    else:
+        epoch_hour, n_hours = 0, 0
+
+    offsets = hours - epoch_hour
+    store_levels = np.lib.format.open_memmap(os.path.join(station_dir, 'levels.npy'), mode='w+',
+                                             dtype=np.float32, shape=(n_hours,))
+    store_levels[:] = np.nan
+    store_levels[offsets] = values
+    store_levels.flush()
+
+    valid = np.zeros(n_hours, dtype=bool)
+    valid[offsets] = True
+    np.save(os.path.join(station_dir, 'valid_bits.npy'), np.packbits(valid, bitorder='little'))
+    del store_levels
+
+    meta = {
+        'version': STORE_VERSION,
+        'station_folder': folder_name,
+        'epoch': str(np.datetime64(epoch_hour, 'h')),
+        'n_hours': n_hours,
+        'n_valid': int(valid.sum()),
+        'dropped_off_hour': int((~on_hour).sum()),
+        'source': fingerprint
+    }
+    with open(os.path.join(station_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+    print(f"  Hourly store for '{folder_name}': {n_hours:,} hours from {meta['epoch']}, "
+          f"{meta['n_valid']:,} valid")
+    return station_dir
+
+def open_hourly_store(folder_name, store_dir=STORE_DIR, cache_dir=CACHE_DIR):
+    """
+    Open a station's hourly store, building or refreshing it first if needed.
+
+    Returns:
+        Dict with 'epoch' (datetime64[h] of slot 0), 'n_hours', 'levels'
+        (read-only float32 memmap) and 'valid_bits' (packed uint8 memmap),
+        or None if the station folder is missing
+    """
+    station_dir = build_hourly_store(folder_name, store_dir, cache_dir)
+    if station_dir is None:
+        return None
+
+    meta = _read_meta(station_dir)
+    return {
+        'station_dir': station_dir,
+        'epoch': np.datetime64(meta['epoch'], 'h'),
+        'n_hours': meta['n_hours'],
+        'levels': np.load(os.path.join(station_dir, 'levels.npy'), mmap_mode='r'),
+        'valid_bits': np.load(os.path.join(station_dir, 'valid_bits.npy'), mmap_mode='r')
+    }
+
+def hour_index(store, when):
+    """Slot index of a time (datetime64 or ISO string), clipped to the store."""
+    offset = int((np.datetime64(when, 'h') - store['epoch']).astype(np.int64))
+    return min(max(offset, 0), store['n_hours'])
+
+def valid_mask(store, start_index=0, stop_index=None):
+    """Unpack the validity bits for slots [start_index, stop_index)."""
+    stop_index = store['n_hours'] if stop_index is None else stop_index
+    if stop_index <= start_index:
+        return np.zeros(0, dtype=bool)
+    first_byte = start_index // 8
+    last_byte = (stop_index + 7) // 8
+    bits = np.unpackbits(store['valid_bits'][first_byte:last_byte], bitorder='little')
+    skip = start_index - first_byte * 8
+    return bits[skip:skip + (stop_index - start_index)].astype(bool)
+
+def slice_hours(store, start, end):
+    """
+    Hourly values for the time range [start, end).
+
+    Args:
+        store: Dict from open_hourly_store()
+        start, end: datetime64 values or ISO strings
+
+    Returns:
+        (levels view, validity mask, datetime64[h] of the first slot)
+    """
+    start_index = hour_index(store, start)
+    stop_index = max(hour_index(store, end), start_index)
+    return (store['levels'][start_index:stop_index],
+            valid_mask(store, start_index, stop_index),
+            store['epoch'] + start_index)
+
+def year_bounds(store, year):
+    """Slot range [start, stop) covering a calendar year."""
+    return (hour_index(store, np.datetime64(f"{year:04d}-01-01T00", 'h')),
+            hour_index(store, np.datetime64(f"{year + 1:04d}-01-01T00", 'h')))
+
+if __name__ == "__main__":
+    print("Hourly Store Builder")
+    print("=" * 40)
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    for item in sorted(os.listdir(data_dir)):
+        folder = os.path.join(data_dir, item)
+        if os.path.isdir(folder) and list_yearly_files(folder):
+            store = open_hourly_store(folder)
+            if store is not None and store['n_hours']:
+                levels, valid, first = slice_hours(store, store['epoch'], store['epoch'] + store['n_hours'])
+                print(f"[OK] {item}: {store['n_hours']:,} hours from {first}, "
+                      f"{valid.mean():.1%} valid")
+    print("\nDone!")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Multi-resolution aggregate cube: hourly -> daily -> monthly -> annual -> decadal.
+Each level is built from the level below by merging (count, mean, M2, min, max),
+so hourly data is only read once. All levels are stored in one table indexed
+by (station, resolution, period) for later stages and the web front end.
+Medians are not composable across levels and are only kept in the annual
+statistics produced by aggregate_data.py.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+RESOLUTIONS = ['daily', 'monthly', 'annual', 'decadal']
+
+CUBE_FILE = 'output/aggregate_cube.csv'
+
+HOURS_PER_DAY = 24
+
+def _group_bounds(keys):
+    """Start offsets of runs of equal keys in a sorted key array."""
+    return np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1])
+
+def daily_from_hourly_grid(levels, valid, first_hour):
+    """
+    Daily (count, mean, M2, min, max) from a fixed-stride hourly grid.
+
+    Args:
+        levels: Hourly levels, one slot per hour starting at midnight
+        valid: Boolean mask of slots holding an observation
+        first_hour: datetime64[h] of the first slot
+
+    Returns:
+        Level dict for the days with at least one observation
+    """
+    n_days = len(levels) // HOURS_PER_DAY
+    grid = np.asarray(levels[:n_days * HOURS_PER_DAY], dtype=np.float64).reshape(n_days, HOURS_PER_DAY)
+    mask = np.asarray(valid[:n_days * HOURS_PER_DAY]).reshape(n_days, HOURS_PER_DAY)
+
+    count = mask.sum(axis=1)
+    observed = count > 0
+    grid, mask, count = grid[observed], mask[observed], count[observed]
+
+    mean = np.where(mask, grid, 0.0).sum(axis=1) / count
+    m2 = np.where(mask, (grid - mean[:, None]) ** 2, 0.0).sum(axis=1)
+    first_day = np.datetime64(first_hour, 'D')
+
+    return {
+        'key': first_day + np.flatnonzero(observed),
+        'count': count,
+        'n_periods': count,
+        'mean': mean,
+        'm2': m2,
+        'min': np.where(mask, grid, np.inf).min(axis=1),
+        'max': np.where(mask, grid, -np.inf).max(axis=1)
+    }
+
+def _combine(level, parent_keys):
+    """
+    Merge sorted child periods into their parent periods.
+
+    Combines per-group (count, mean, M2) exactly:
+    M2 = sum(M2_i) + sum(n_i * (mean_i - mean)^2)
+    """
+    starts = _group_bounds(parent_keys)
+    count = np.add.reduceat(level['count'], starts)
+    mean = np.add.reduceat(level['count'] * level['mean'], starts) / count
+    spread = level['count'] * (level['mean'] - np.repeat(mean, np.diff(np.append(starts, len(parent_keys))))) ** 2
+    m2 = np.add.reduceat(level['m2'], starts) + np.add.reduceat(spread, starts)
+
+    return {
+        'key': parent_keys[starts],
+        'count': count,
+        'n_periods': np.diff(np.append(starts, len(parent_keys))),
+        'mean': mean,
+        'm2': m2,
+        'min': np.minimum.reduceat(level['min'], starts),
+        'max': np.maximum.reduceat(level['max'], starts)
+    }
+
+def build_station_rollup(daily):
+    """
+    Build every coarser resolution for one station from its daily level.
+
+    Args:
+        daily: Level dict from daily_from_hourly_grid()
+
+    Returns:
+        Dict of resolution -> level dict (key, count, n_periods, mean, m2, min, max)
+    """
+    monthly = _combine(daily, daily['key'].astype('datetime64[M]'))
+    annual = _combine(monthly, monthly['key'].astype('datetime64[Y]'))
+
+    years = annual['key'].astype(np.int64) + 1970
+    decadal = _combine(annual, (years // 10) * 10)
+
+    return {'daily': daily, 'monthly': monthly, 'annual': annual, 'decadal': decadal}
+
+def _period_labels(resolution, keys):
+    """Period label and start date for each key of a resolution."""
+    if resolution == 'decadal':
+        labels = [f"{int(decade)}s" for decade in keys]
+        starts = (np.asarray(keys, dtype=np.int64) - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+    else:
+        labels = np.datetime_as_string(keys)
+        starts = keys.astype('datetime64[D]')
+    return labels, np.datetime_as_string(starts)
+
+def rollup_to_frame(station_name, rollup):
+    """Flatten one station's rollup into cube rows."""
+    frames = []
+    for resolution in RESOLUTIONS:
+        level = rollup[resolution]
+        labels, starts = _period_labels(resolution, level['key'])
+        count = level['count']
+        std = np.sqrt(np.divide(level['m2'], count - 1, out=np.full(len(count), np.nan),
+                                where=count > 1))
+        frames.append(pd.DataFrame({
+            'station': station_name,
+            'resolution': resolution,
+            'period': labels,
+            'period_start': starts,
+            'count': count,
+            'n_periods': level['n_periods'],
+            'mean_ft': level['mean'],
+            'std_ft': std,
+            'min_ft': level['min'],
+            'max_ft': level['max']
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+def save_cube(cube_df, output_file=CUBE_FILE):
+    """Write the cube table to CSV."""
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    cube_df.to_csv(output_file, index=False)
+    print(f"[OK] Aggregate cube saved to: {output_file} ({len(cube_df):,} rows)")
+    return output_file
+
+def load_cube(resolution=None, station=None, cube_file=CUBE_FILE):
+    """
+    Load cube rows, optionally for one resolution and/or station.
+
+    Returns:
+        DataFrame indexed by (station, resolution, period), or None if missing
+    """
+    if not os.path.exists(cube_file):
+        return None
+
+    cube_df = pd.read_csv(cube_file, dtype={'period': str})
+    if resolution is not None:
+        cube_df = cube_df[cube_df['resolution'] == resolution]
+    if station is not None:
+        cube_df = cube_df[cube_df['station'] == station]
+    return cube_df.set_index(['station', 'resolution', 'period'])
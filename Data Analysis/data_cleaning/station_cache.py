@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Binary columnar cache of cleaned hourly water levels, one per station.
+Each yearly NOAA file is parsed once into int64 timestamps (seconds since
+1970-01-01 GMT) and float32 verified levels stored as .npy files. A file is
+only re-parsed when its size, mtime and content hash no longer match the index.
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_cleaning.clean_data import list_yearly_files, file_digest, source_unchanged
+from data_cleaning.timestamps import parse_timestamps
+
+CACHE_DIR = 'output/cache'
+CACHE_VERSION = 1
+
+# NOAA verified levels carry at most 3 decimals; rounding on load restores the
+# exact decimal values lost when they are stored as float32
+LEVEL_DECIMALS = 3
+
+def station_slug(folder_name):
+    """Cache directory name for a station data folder."""
+    name = os.path.basename(os.path.normpath(folder_name))
+    return name.lower().replace(" ", "_").replace("-", "_")
+
+def parse_yearly_file(csv_file):
+    """
+    Parse one yearly NOAA CSV into timestamp and verified level arrays.
+
+    Applies the same rules as clean_data.process_folder: rows without a
+    verified value ("-" or blank) are dropped.
+
+    Returns:
+        (int64 seconds since epoch, float32 verified levels in ft)
+    """
+    df = pd.read_csv(csv_file, usecols=[0, 1, 4], header=0, names=['Date', 'Time', 'Verified_ft'],
+                     dtype=str, keep_default_na=False)
+    df = df[(df['Verified_ft'] != '-') & (df['Verified_ft'].str.strip() != '')]
+
+    levels = pd.to_numeric(df['Verified_ft'], errors='coerce')
+    datetimes = parse_timestamps(df['Date'], df['Time'])
+    valid = levels.notna().values & ~np.isnat(datetimes)
+
+    timestamps = datetimes[valid].astype(np.int64)
+    return timestamps, levels.values[valid].astype(np.float32)
+
+def _load_index(station_dir):
+    index_file = os.path.join(station_dir, 'index.json')
+    if os.path.exists(index_file):
+        with open(index_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') == CACHE_VERSION:
+            return index
+    return {'version': CACHE_VERSION, 'files': {}}
+
+def _save_index(station_dir, index):
+    index_file = os.path.join(station_dir, 'index.json')
+    tmp_file = index_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, index_file)
+
+def _part_paths(station_dir, filename):
+    stem = os.path.splitext(filename)[0]
+    parts_dir = os.path.join(station_dir, 'parts')
+    return (os.path.join(parts_dir, f"{stem}.timestamps.npy"),
+            os.path.join(parts_dir, f"{stem}.verified_ft.npy"))
+
+def build_station_cache(folder_name, cache_dir=CACHE_DIR):
+    """
+    Bring a station's cache up to date with its yearly source files.
+
+    Args:
+        folder_name: Folder containing the station's yearly CSV files
+        cache_dir: Root directory of the cache
+
+    Returns:
+        Path of the station's cache directory, or None if the folder is missing
+    """
+    if not os.path.exists(folder_name):
+        print(f"Warning: Folder '{folder_name}' not found!")
+        return None
+
+    station_dir = os.path.join(cache_dir, station_slug(folder_name))
+    os.makedirs(os.path.join(station_dir, 'parts'), exist_ok=True)
+
+    index = _load_index(station_dir)
+    old_files = index['files']
+    new_files = {}
+    rebuilt = []
+
+    for csv_file in list_yearly_files(folder_name):
+        filename = os.path.basename(csv_file)
+        entry = old_files.get(filename)
+        ts_path, level_path = _part_paths(station_dir, filename)
+
+        unchanged, stat_info, sha256 = source_unchanged(csv_file, entry)
+        if unchanged and os.path.exists(ts_path) and os.path.exists(level_path):
+            new_files[filename] = dict(entry, mtime_ns=stat_info.st_mtime_ns)
+            continue
+
+        timestamps, levels = parse_yearly_file(csv_file)
+        np.save(ts_path, timestamps)
+        np.save(level_path, levels)
+        new_files[filename] = {
+            'size': stat_info.st_size,
+            'mtime_ns': stat_info.st_mtime_ns,
+            'sha256': sha256 or file_digest(csv_file),
+            'rows': int(len(timestamps))
+        }
+        rebuilt.append(filename)
+
+    # Drop parts whose source file has disappeared
+    removed = sorted(set(old_files) - set(new_files))
+    for filename in removed:
+        for path in _part_paths(station_dir, filename):
+            if os.path.exists(path):
+                os.remove(path)
+
+    combined_ts = os.path.join(station_dir, 'timestamps.npy')
+    combined_levels = os.path.join(station_dir, 'verified_ft.npy')
+    if rebuilt or removed or not (os.path.exists(combined_ts) and os.path.exists(combined_levels)):
+        timestamps = [np.load(_part_paths(station_dir, f)[0]) for f in sorted(new_files)]
+        levels = [np.load(_part_paths(station_dir, f)[1]) for f in sorted(new_files)]
+        timestamps = np.concatenate(timestamps) if timestamps else np.empty(0, dtype=np.int64)
+        levels = np.concatenate(levels) if levels else np.empty(0, dtype=np.float32)
+
+        if len(timestamps) > 1 and np.any(np.diff(timestamps) < 0):
+            order = np.argsort(timestamps, kind='stable')
+            timestamps = timestamps[order]
+            levels = levels[order]
+
+        np.save(combined_ts, timestamps)
+        np.save(combined_levels, levels)
+
+    index['files'] = new_files
+    _save_index(station_dir, index)
+
+    if rebuilt or removed:
+        print(f"  Cache for '{folder_name}': rebuilt {len(rebuilt)} file(s), "
+              f"removed {len(removed)}, reused {len(new_files) - len(rebuilt)}")
+
+    return station_dir
+
+def load_station_cache(folder_name, cache_dir=CACHE_DIR):
+    """
+    Load a station's cached hourly data, refreshing it first if needed.
+
+    Returns:
+        (int64 timestamps in seconds since epoch, float32 verified levels),
+        memory-mapped from disk, or None if the station folder is missing
+    """
+    station_dir = build_station_cache(folder_name, cache_dir)
+    if station_dir is None:
+        return None
+
+    timestamps = np.load(os.path.join(station_dir, 'timestamps.npy'), mmap_mode='r')
+    levels = np.load(os.path.join(station_dir, 'verified_ft.npy'), mmap_mode='r')
+    return timestamps, levels
+
+def timestamps_to_years(timestamps):
+    """Calendar year of each int64 timestamp."""
+    return np.asarray(timestamps).astype('datetime64[s]').astype('datetime64[Y]').astype(np.int64) + 1970
+
+def levels_to_float64(levels):
+    """Upcast cached float32 levels, restoring their exact decimal values."""
+    return np.round(np.asarray(levels, dtype=np.float64), LEVEL_DECIMALS)
+
+if __name__ == "__main__":
+    print("Station Cache Builder")
+    print("=" * 40)
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    for item in sorted(os.listdir(data_dir)):
+        folder = os.path.join(data_dir, item)
+        if os.path.isdir(folder) and list_yearly_files(folder):
+            station_dir = build_station_cache(folder)
+            print(f"[OK] {item}: {station_dir}")
+    print("\nDone!")
@@ -0,0 +1,21 @@
+"""
+Station registry: raw data folder and tide gauge location of every station.
+Adding a station means adding it to both dicts here. This module has no
+dependencies so light modules (the spatial index and its worker processes)
+can import it without loading the ingest stack.
+"""
+
+# Raw yearly data folder for each station (used to build the binary cache)
+STATION_DATA_FOLDERS = {
+    'Grand Isle': 'data/grand Isle',
+    'New Canal Station': 'data/New Canal Station',
+    'Port Fourchon': 'data/Port Fourchan'
+}
+
+# Tide gauge coordinates (latitude, longitude) for the spatial flood stages;
+# a station without coordinates is left out of the interpolated flood results
+STATION_COORDINATES = {
+    'Grand Isle': (29.263, -89.957),
+    'New Canal Station': (30.027, -90.113),
+    'Port Fourchon': (29.114, -90.199)
+}
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Vectorized timestamp parsing for NOAA water level exports.
+Date and time strings are viewed as byte matrices and their fields are
+converted to integer arrays without creating a Python string per row.
+Supported layouts:
+- YYYY/MM/DD + HH:MM (NOAA CO-OPS yearly downloads)
+- M/D/YY + H:MM (DataManagement/RawData/VerifiedWaterLevels*.csv)
+Rows in any other layout fall back to pandas format inference.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+_ZERO = ord('0')
+_SECONDS_PER_DAY = 86400
+
+# Two-digit years follow the strptime %y convention: 69-99 -> 1900s, 00-68 -> 2000s
+_TWO_DIGIT_YEAR_PIVOT = 69
+
+# Only rows shaped like a date plus a clock time are worth slow inference;
+# anything else (blank, 'nan', stray numeric rows) is left as NaT
+_FALLBACK_PATTERN = r'\d{1,4}[/.-]\d{1,2}[/.-]\d{1,4}\s+\d{1,2}:\d{2}(:\d{2})?'
+
+_DAYS_IN_MONTH = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+
+def _byte_matrix(values, width):
+    """
+    View strings as an (n, width + 1) uint8 matrix, zero padded.
+
+    The extra column detects strings longer than width. Returns None if
+    the values cannot be encoded as ASCII bytes.
+    """
+    try:
+        raw = np.asarray(values, dtype=object).astype(f'S{width + 1}')
+    except (UnicodeEncodeError, ValueError, TypeError):
+        return None
+    return raw.view(np.uint8).reshape(len(raw), width + 1)
+
+def _digits(matrix, columns):
+    """Integer value of fixed digit columns, plus a mask of rows where all are digits."""
+    digits = matrix[:, columns].astype(np.int64) - _ZERO
+    ok = np.all((digits >= 0) & (digits <= 9), axis=1)
+    value = np.zeros(len(matrix), dtype=np.int64)
+    for i in range(len(columns)):
+        value = value * 10 + digits[:, i]
+    return value, ok
+
+def _scan_fields(matrix, separator, n_fields, max_digits):
+    """
+    Split variable-width digit fields (e.g. '1/15/15' or '0:00') column by column.
+
+    Returns:
+        (field values (n, n_fields), digit counts (n, n_fields), ok mask)
+    """
+    n, width = matrix.shape
+    values = np.zeros((n, n_fields), dtype=np.int64)
+    counts = np.zeros((n, n_fields), dtype=np.int64)
+    field = np.zeros(n, dtype=np.int64)
+    ok = np.ones(n, dtype=bool)
+    ended = np.zeros(n, dtype=bool)
+    rows = np.arange(n)
+
+    for j in range(width):
+        byte = matrix[:, j]
+        is_end = byte == 0
+        is_digit = (byte >= _ZERO) & (byte <= _ZERO + 9) & ~ended
+        is_sep = (byte == separator) & ~ended
+
+        ok &= ~(ended & ~is_end)  # nothing may follow the terminator
+        ok &= is_digit | is_sep | is_end
+
+        f = np.minimum(field, n_fields - 1)
+        d = np.where(is_digit, byte.astype(np.int64) - _ZERO, 0)
+        values[rows, f] = np.where(is_digit, values[rows, f] * 10 + d, values[rows, f])
+        counts[rows, f] += is_digit
+
+        field += is_sep
+        ended |= is_end
+
+    ok &= ended & (field == n_fields - 1)
+    ok &= np.all((counts >= 1) & (counts <= max_digits), axis=1)
+    return values, counts, ok
+
+def _days_from_civil(year, month, day):
+    """Days since 1970-01-01 for proleptic Gregorian dates (vectorized)."""
+    y = year - (month <= 2)
+    era = np.floor_divide(y, 400)
+    yoe = y - era * 400
+    mp = np.where(month > 2, month - 3, month + 9)
+    doy = (153 * mp + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+def _valid_date(year, month, day):
+    month_ok = (month >= 1) & (month <= 12)
+    dim = _DAYS_IN_MONTH[np.clip(month, 0, 12)]
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    dim = dim + ((month == 2) & leap)
+    return month_ok & (day >= 1) & (day <= dim)
+
+def _parse_dates(dates):
+    """Date strings to days since epoch, plus a mask of parsed rows."""
+    n = len(dates)
+    days = np.zeros(n, dtype=np.int64)
+    parsed = np.zeros(n, dtype=bool)
+
+    matrix = _byte_matrix(dates, 10)
+    if matrix is None:
+        return days, parsed
+
+    # Fast path: fixed-width YYYY/MM/DD
+    year, ok_y = _digits(matrix, [0, 1, 2, 3])
+    month, ok_m = _digits(matrix, [5, 6])
+    day, ok_d = _digits(matrix, [8, 9])
+    fixed = (ok_y & ok_m & ok_d & (matrix[:, 4] == ord('/')) & (matrix[:, 7] == ord('/'))
+             & (matrix[:, 10] == 0))
+    fixed &= _valid_date(year, month, day)
+    days[fixed] = _days_from_civil(year[fixed], month[fixed], day[fixed])
+    parsed |= fixed
+
+    # Variable-width M/D/YY for the remaining rows
+    rest = ~parsed
+    if rest.any():
+        values, counts, ok = _scan_fields(matrix[rest], ord('/'), 3, 4)
+        month, day, year = values[:, 0], values[:, 1], values[:, 2]
+        ok &= (counts[:, 0] <= 2) & (counts[:, 1] <= 2) & (counts[:, 2] == 2)
+        year = np.where(year < _TWO_DIGIT_YEAR_PIVOT, 2000 + year, 1900 + year)
+        ok &= _valid_date(year, month, day)
+
+        idx = np.flatnonzero(rest)[ok]
+        days[idx] = _days_from_civil(year[ok], month[ok], day[ok])
+        parsed[idx] = True
+
+    return days, parsed
+
+def _parse_times(times):
+    """HH:MM or H:MM strings to seconds since midnight, plus a mask of parsed rows."""
+    n = len(times)
+    seconds = np.zeros(n, dtype=np.int64)
+    parsed = np.zeros(n, dtype=bool)
+
+    matrix = _byte_matrix(times, 5)
+    if matrix is None:
+        return seconds, parsed
+
+    # Fast path: fixed-width HH:MM
+    hour, ok_h = _digits(matrix, [0, 1])
+    minute, ok_m = _digits(matrix, [3, 4])
+    fixed = ok_h & ok_m & (matrix[:, 2] == ord(':')) & (matrix[:, 5] == 0)
+    fixed &= (hour <= 23) & (minute <= 59)
+    seconds[fixed] = hour[fixed] * 3600 + minute[fixed] * 60
+    parsed |= fixed
+
+    # Variable-width H:MM for the remaining rows
+    rest = ~parsed
+    if rest.any():
+        values, _, ok = _scan_fields(matrix[rest], ord(':'), 2, 2)
+        hour, minute = values[:, 0], values[:, 1]
+        ok &= (hour <= 23) & (minute <= 59)
+
+        idx = np.flatnonzero(rest)[ok]
+        seconds[idx] = hour[ok] * 3600 + minute[ok] * 60
+        parsed[idx] = True
+
+    return seconds, parsed
+
+def parse_timestamps(dates, times):
+    """
+    Parse separate date and time columns into datetime64[s] values.
+
+    Args:
+        dates: Sequence of date strings (YYYY/MM/DD or M/D/YY)
+        times: Sequence of time strings (HH:MM or H:MM)
+
+    Returns:
+        numpy datetime64[s] array, NaT where a row could not be parsed
+    """
+    dates = np.asarray(dates, dtype=object)
+    times = np.asarray(times, dtype=object)
+
+    days, date_ok = _parse_dates(dates)
+    seconds, time_ok = _parse_times(times)
+    ok = date_ok & time_ok
+
+    result = np.full(len(dates), np.datetime64('NaT'), dtype='datetime64[s]')
+    result[ok] = (days[ok] * _SECONDS_PER_DAY + seconds[ok]).astype('datetime64[s]')
+
+    # Slow inference only for date-like rows the fast paths rejected
+    failed = np.flatnonzero(~ok)
+    if len(failed):
+        combined = (pd.Series(dates[failed]).astype(str).str.strip() + ' '
+                    + pd.Series(times[failed]).astype(str).str.strip())
+        inferred = pd.Series(pd.NaT, index=combined.index, dtype='datetime64[s]')
+        candidates = combined.str.fullmatch(_FALLBACK_PATTERN)
+        if candidates.any():
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                try:
+                    inferred[candidates] = pd.to_datetime(combined[candidates], format='mixed', errors='coerce')
+                except (ValueError, TypeError):
+                    pass
+        result[failed] = inferred.values.astype('datetime64[s]')
+
+    return result
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Flood risk for large asset inventories (parcels, roads, facilities).
+The inventory is read in chunks from CSV or GeoJSON, each chunk is matched
+to its nearest stations and classified for every projection year with the
+array kernels of the flood stage, and results are appended to files
+partitioned by year (output/asset_risk/year=YYYY/part-NNNNN.csv). Only one
+chunk and the per-year status counts are held in memory, so inventory size
+is bounded by disk, not RAM. Assets without finite coordinates or elevation
+are written with the INVALID status and counted in the summary.
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.flood_risk_assessment import classify_flood_risk
+from models.spatial_index import (NEAREST_STATIONS, IDW_POWER, idw_neighbors, idw_gather,
+                                  station_projection_matrices)
+
+ASSET_INVENTORY_FILE = 'data/assets.csv'
+ASSET_RISK_DIR = 'output/asset_risk'
+ASSET_CHUNK = 20_000
+
+# Inventory columns every asset needs; asset_id, name and asset_type are carried through if present
+REQUIRED_COLUMNS = ['elevation_ft', 'latitude', 'longitude']
+PASSTHROUGH_COLUMNS = ['asset_id', 'name', 'asset_type']
+
+FLOOD_STATUSES = ['UNDERWATER', 'CRITICAL', 'HIGH RISK', 'MODERATE RISK', 'LOW RISK']
+
+# Status of assets whose coordinates or elevation are missing or not finite
+INVALID_STATUS = 'INVALID'
+SUMMARY_STATUSES = FLOOD_STATUSES + [INVALID_STATUS]
+
+# Characters read per step when streaming a GeoJSON FeatureCollection
+GEOJSON_BLOCK = 1 << 20
+
+def _vertices(coordinates):
+    """All positions of a GeoJSON coordinates array (None for anything that is not an array)."""
+    if not isinstance(coordinates, list):
+        return [None]
+    if coordinates and not isinstance(coordinates[0], list):
+        return [coordinates]
+    return [vertex for part in coordinates for vertex in _vertices(part)]
+
+def _is_position(vertex):
+    """True for a position with numeric longitude and latitude."""
+    return (isinstance(vertex, list) and len(vertex) >= 2
+            and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in vertex[:2]))
+
+def _feature_row(feature):
+    """
+    Inventory row of a GeoJSON feature (points as-is, other geometries at their mean vertex).
+
+    A geometry with no vertices or any non-numeric vertex gets NaN coordinates,
+    so the asset is reported as INVALID_STATUS.
+    """
+    vertices = _vertices((feature.get('geometry') or {}).get('coordinates') or [])
+    if vertices and all(_is_position(vertex) for vertex in vertices):
+        longitude, latitude = np.mean([vertex[:2] for vertex in vertices], axis=0)
+    else:
+        longitude, latitude = np.nan, np.nan
+    row = dict(feature.get('properties') or {})
+    row['latitude'], row['longitude'] = latitude, longitude
+    if 'asset_id' not in row and 'id' in feature:
+        row['asset_id'] = feature['id']
+    return row
+
+def iter_feature_collection(f, block_size=GEOJSON_BLOCK):
+    """
+    Features of a GeoJSON FeatureCollection, decoded one at a time.
+
+    The file is read in blocks and each top-level member is decoded with
+    json.JSONDecoder.raw_decode; members other than "features" are skipped.
+    Memory holds one block and one feature, not the whole collection. When a
+    value spans the buffer, the read size doubles on every retry so a large
+    feature is decoded O(log size) times rather than once per block.
+    """
+    decoder = json.JSONDecoder()
+    state = {'buffer': '', 'position': 0, 'read_size': block_size}
+
+    def refill():
+        block = f.read(state['read_size'])
+        state['buffer'] = state['buffer'][state['position']:] + block
+        state['position'] = 0
+        return bool(block)
+
+    def peek():
+        while True:
+            buffer, position = state['buffer'], state['position']
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                position += 1
+            state['position'] = position
+            if position < len(buffer):
+                return buffer[position]
+            if not refill():
+                raise ValueError("Unexpected end of GeoJSON file")
+
+    def expect(characters):
+        character = peek()
+        if character not in characters:
+            raise ValueError(f"Malformed GeoJSON: expected one of {characters!r}, got {character!r}")
+        state['position'] += 1
+        return character
+
+    def value():
+        peek()
+        while True:
+            try:
+                decoded, end = decoder.raw_decode(state['buffer'], state['position'])
+            except json.JSONDecodeError:
+                if refill():
+                    state['read_size'] *= 2
+                    continue
+                raise
+            # A number may continue in the next block
+            if end == len(state['buffer']) and refill():
+                state['read_size'] *= 2
+                continue
+            state['position'] = end
+            state['read_size'] = block_size
+            return decoded
+
+    expect('{')
+    if peek() == '}':
+        return
+    while True:
+        key = value()
+        expect(':')
+        if key == 'features':
+            expect('[')
+            if peek() == ']':
+                state['position'] += 1
+            else:
+                while True:
+                    yield value()
+                    if expect(',]') == ']':
+                        break
+        else:
+            value()
+        if expect(',}') == '}':
+            return
+
+def _row_chunks(rows, chunk_size):
+    """DataFrames of at most chunk_size rows from an iterable of dicts."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield pd.DataFrame(chunk)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk)
+
+def read_inventory_chunks(inventory_file, chunk_size=ASSET_CHUNK):
+    """
+    Yield the inventory as DataFrames of at most chunk_size assets.
+
+    CSV files, line-delimited GeoJSON (.geojsonl/.geojsons/.ndjson, one
+    feature per line) and regular .geojson FeatureCollections are all
+    streamed, so memory is bounded by the chunk size.
+    """
+    extension = os.path.splitext(inventory_file)[1].lower()
+    if extension in ('.geojsonl', '.geojsons', '.ndjson'):
+        with open(inventory_file, 'r', encoding='utf-8') as f:
+            lines = (line.strip().lstrip('\x1e') for line in f)
+            yield from _row_chunks((_feature_row(json.loads(line)) for line in lines if line), chunk_size)
+    elif extension in ('.geojson', '.json'):
+        with open(inventory_file, 'r', encoding='utf-8') as f:
+            yield from _row_chunks((_feature_row(feature) for feature in iter_feature_collection(f)),
+                                   chunk_size)
+    else:
+        yield from pd.read_csv(inventory_file, chunksize=chunk_size)
+
+def check_inventory_columns(assets):
+    """Raise if an inventory chunk lacks a required column."""
+    missing = [column for column in REQUIRED_COLUMNS if column not in assets]
+    if missing:
+        raise ValueError(f"Asset inventory is missing column(s): {', '.join(missing)}")
+
+def assess_asset_chunk(assets, projection_values, keys, index, k=NEAREST_STATIONS, power=IDW_POWER):
+    """
+    Risk of one inventory chunk for every projection key.
+
+    Args:
+        assets: Inventory chunk
+        projection_values: Dict of column -> (stations, keys) matrix
+        keys: DataFrame of projection keys (year, optional scenario)
+        index: Station index matching the matrix rows
+
+    Yields:
+        (key position, risk DataFrame of the chunk for that key)
+    """
+    check_inventory_columns(assets)
+
+    # Missing or non-finite coordinates and elevations get the INVALID status
+    elevation, latitude, longitude = (pd.to_numeric(assets[column], errors='coerce').values.astype(float)
+                                      for column in REQUIRED_COLUMNS)
+    valid = (np.isfinite(elevation) & np.isfinite(latitude) & np.isfinite(longitude)
+             & (np.abs(latitude) <= 90) & (np.abs(longitude) <= 180))
+
+    n_assets = len(assets)
+    values = {column: np.full((n_assets, len(keys)), np.nan) for column in projection_values}
+    nearest_station = np.full(n_assets, None, dtype=object)
+    nearest_km = np.full(n_assets, np.nan)
+    if valid.any():
+        positions, weights, distances = idw_neighbors(index, latitude[valid], longitude[valid], k, power)
+        for column, matrix in projection_values.items():
+            values[column][valid] = idw_gather(matrix, positions, weights)
+        nearest_station[valid] = np.array(index['stations'], dtype=object)[positions[:, 0]]
+        nearest_km[valid] = distances[:, 0]
+
+    base = {column: assets[column].values for column in PASSTHROUGH_COLUMNS if column in assets}
+    base.update({
+        'elevation_ft': elevation,
+        'latitude': latitude,
+        'longitude': longitude,
+        'nearest_station': nearest_station,
+        'nearest_station_km': nearest_km
+    })
+    for j, key in enumerate(keys.itertuples(index=False)):
+        water_level = values['prediction_ft'][:, j]
+        ci_upper = values['ci_upper_ft'][:, j]
+        risk = classify_flood_risk(water_level, elevation)
+        worst_case = classify_flood_risk(ci_upper, elevation)
+        for result in (risk, worst_case):
+            result['flood_status'][~valid] = INVALID_STATUS
+            result['estimated_percent_flooded'][~valid] = np.nan
+        yield j, pd.DataFrame({
+            **key._asdict(),
+            **base,
+            'projected_water_level_ft': water_level,
+            'ci_lower_ft': values['ci_lower_ft'][:, j],
+            'ci_upper_ft': ci_upper,
+            'water_depth_ft': risk['water_depth_ft'],
+            'flood_status': risk['flood_status'],
+            'estimated_percent_flooded': risk['estimated_percent_flooded'],
+            'worst_case_status': worst_case['flood_status'],
+            'worst_case_percent_flooded': worst_case['estimated_percent_flooded']
+        })
+
+def _clear_partitions(output_dir):
+    """Remove partitions of a previous run (only year=* folders and the summary)."""
+    for folder in glob.glob(os.path.join(output_dir, 'year=*')):
+        shutil.rmtree(folder)
+    summary_file = os.path.join(output_dir, 'summary.csv')
+    if os.path.exists(summary_file):
+        os.remove(summary_file)
+
+def assess_asset_inventory(inventory_file, projections_df, output_dir=ASSET_RISK_DIR, chunk_size=ASSET_CHUNK,
+                           k=NEAREST_STATIONS, power=IDW_POWER):
+    """
+    Stream an asset inventory through the flood risk evaluation.
+
+    Args:
+        inventory_file: CSV or GeoJSON inventory with elevation_ft and coordinates
+        projections_df: Long-format projections (station, year, optional scenario)
+        output_dir: Partitioned output directory
+        chunk_size: Assets per chunk
+        k, power: Nearest stations and inverse-distance power
+
+    Returns:
+        Summary DataFrame of asset counts per year (and scenario) and status
+    """
+    # Station x key matrices are built once and reused for every chunk
+    index, keys, projection_values = station_projection_matrices(projections_df)
+    keys['year'] = keys['year'].astype(int)
+
+    counts = np.zeros((len(keys), 2, len(SUMMARY_STATUSES)), dtype=np.int64)
+    n_assets = 0
+    for part, assets in enumerate(read_inventory_chunks(inventory_file, chunk_size)):
+        if part == 0:
+            # Previous results are removed only once the inventory is readable
+            check_inventory_columns(assets)
+            _clear_partitions(output_dir)
+        n_assets += len(assets)
+        for j, risk in assess_asset_chunk(assets, projection_values, keys, index, k, power):
+            folder = os.path.join(output_dir, f"year={keys['year'].iloc[j]}")
+            os.makedirs(folder, exist_ok=True)
+            part_file = os.path.join(folder, f"part-{part:05d}.csv")
+            risk.to_csv(part_file, mode='a', header=not os.path.exists(part_file), index=False)
+            for column, status_counts in enumerate([risk['flood_status'], risk['worst_case_status']]):
+                counts[j, column] += status_counts.value_counts().reindex(SUMMARY_STATUSES, fill_value=0).values
+        print(f"  Chunk {part}: {n_assets:,} assets assessed")
+    n_invalid = int(counts[0, 0, SUMMARY_STATUSES.index(INVALID_STATUS)]) if len(keys) else 0
+    if n_invalid:
+        print(f"  Warning: {n_invalid:,} asset(s) without finite coordinates or elevation marked {INVALID_STATUS}")
+
+    rows = []
+    for j, key in enumerate(keys.to_dict('records')):
+        for s, status in enumerate(SUMMARY_STATUSES):
+            rows.append({**key, 'flood_status': status, 'n_assets': int(counts[j, 0, s]),
+                         'n_assets_worst_case': int(counts[j, 1, s])})
+    summary_df = pd.DataFrame(rows)
+    os.makedirs(output_dir, exist_ok=True)
+    summary_file = os.path.join(output_dir, 'summary.csv')
+    summary_df.to_csv(summary_file, index=False)
+    print(f"[OK] Asset risk partitions saved to: {output_dir}/year=*/")
+    print(f"[OK] Asset risk summary saved to: {summary_file}")
+    return summary_df
+
+def main():
+    """Assess an asset inventory against the saved projections."""
+    parser = argparse.ArgumentParser(description='Flood risk for an asset inventory (CSV or GeoJSON).')
+    parser.add_argument('inventory', nargs='?', default=ASSET_INVENTORY_FILE,
+                        help='inventory file with elevation_ft, latitude and longitude')
+    parser.add_argument('--projections', default='output/water_level_projections.csv',
+                        help='long-format projection table (e.g. output/projection_curves.csv)')
+    parser.add_argument('--chunk-size', type=int, default=ASSET_CHUNK, help='assets per chunk')
+    parser.add_argument('--output-dir', default=ASSET_RISK_DIR, help='partitioned output directory')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Asset Inventory Flood Risk")
+    print("=" * 60)
+
+    for path, hint in [(args.inventory, "Provide an asset inventory file."),
+                       (args.projections, "Please run projection_models.py first.")]:
+        if not os.path.exists(path):
+            print(f"Error: {path} not found!")
+            print(hint)
+            return
+
+    assess_asset_inventory(args.inventory, pd.read_csv(args.projections), args.output_dir, args.chunk_size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Rolling-origin backtesting of the projection models.
+For every origin year the models are fitted on all earlier years and scored
+on the following years up to BACKTEST_HORIZON years ahead. Linear fits for
+every origin come from prefix sums (no refitting per origin), so a station
+is scored with a few matrix operations. Stations run in a process pool.
+Output: RMSE, MAE, bias and 95% interval coverage by model and horizon.
+"""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.fitting_core import t_quantile
+from models.government_rate import GOVERNMENT_SLR_RATE_FT_YEAR, GOVERNMENT_SLR_RATE_FT_YEAR_STD
+
+# Longest forecast horizon scored, in years
+BACKTEST_HORIZON = 10
+
+# Minimum training years before the first origin
+MIN_TRAIN_YEARS = 10
+
+# Government weights of the blended model to score
+BACKTEST_WEIGHTS = [0.1, 0.2, 0.3, 0.4, 0.5]
+
+BACKTEST_FILE = 'output/backtest_skill.csv'
+
+ALL_STATIONS = 'All stations'
+
+def prefix_line_fits(x, y):
+    """
+    Straight-line fit of every prefix (first k points, k = 1..n) from cumulative sums.
+
+    Returns:
+        Dict of arrays indexed by k - 1: n, slope, x_mean and y_mean (in
+        centered coordinates), mse and sxx, plus the centering offsets
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x_offset, y_offset = x.mean(), y.mean()
+    xc, yc = x - x_offset, y - y_offset
+
+    n = np.arange(1, len(x) + 1, dtype=float)
+    sx, sy = np.cumsum(xc), np.cumsum(yc)
+    sxx, sxy, syy = np.cumsum(xc * xc), np.cumsum(xc * yc), np.cumsum(yc * yc)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cxx = sxx - sx * sx / n
+        cxy = sxy - sx * sy / n
+        cyy = syy - sy * sy / n
+        slope = cxy / cxx
+        rss = np.maximum(cyy - slope * cxy, 0.0)
+
+    return {
+        'n': n,
+        'slope': slope,
+        'x_mean': sx / n,
+        'y_mean': sy / n,
+        'mse': rss / n,
+        'sxx': cxx,
+        'x_offset': x_offset,
+        'y_offset': y_offset
+    }
+
+def _skill_sums(errors, covered, horizons, mask, max_horizon):
+    """Per-horizon (count, sum of errors, squared errors, absolute errors, covered)."""
+    h = horizons[mask]
+    e = errors[mask]
+    length = max_horizon + 1
+    return np.stack([
+        np.bincount(h, minlength=length).astype(float),
+        np.bincount(h, weights=e, minlength=length),
+        np.bincount(h, weights=e * e, minlength=length),
+        np.bincount(h, weights=np.abs(e), minlength=length),
+        np.bincount(h, weights=covered[mask].astype(float), minlength=length)
+    ])
+
+def backtest_station(years, values, weights=BACKTEST_WEIGHTS, max_horizon=BACKTEST_HORIZON,
+                     min_train=MIN_TRAIN_YEARS):
+    """
+    Rolling-origin skill sums for one station.
+
+    Origin k trains on the first k years; every later year within
+    max_horizon of the last training year is a forecast target.
+
+    Returns:
+        Dict of (model, weight_gov) -> (5, max_horizon + 1) skill sums
+    """
+    order = np.argsort(years)
+    years = np.asarray(years, dtype=float)[order]
+    values = np.asarray(values, dtype=float)[order]
+    n = len(years)
+    if n <= min_train:
+        return {}
+
+    fits = prefix_line_fits(years, values)
+    k = np.arange(min_train, n)  # training sizes of the origins
+    last = k - 1                 # index of each origin's last training year
+
+    # Origins x targets
+    horizons = years[None, :] - years[last][:, None]
+    target = np.arange(n)[None, :] >= k[:, None]
+    mask = target & (horizons >= 1) & (horizons <= max_horizon)
+    horizons = np.where(mask, horizons, 0).astype(int)
+    observed = values[None, :]
+
+    # Linear model from the prefix fit of each origin
+    xc = years[None, :] - fits['x_offset']
+    slope = fits['slope'][last][:, None]
+    x_mean = fits['x_mean'][last][:, None]
+    linear = fits['y_offset'] + fits['y_mean'][last][:, None] + slope * (xc - x_mean)
+    n_train = fits['n'][last][:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        se_pred = np.sqrt(fits['mse'][last][:, None]
+                          * (1 + 1 / n_train + (xc - x_mean) ** 2 / fits['sxx'][last][:, None]))
+    linear_half = t_quantile(0.975, n_train - 2) * se_pred
+
+    # Government baseline from each origin's last observed value
+    government = values[last][:, None] + GOVERNMENT_SLR_RATE_FT_YEAR * horizons
+    government_half = 1.96 * GOVERNMENT_SLR_RATE_FT_YEAR_STD * horizons
+
+    results = {
+        ('linear', None): _skill_sums(observed - linear, np.abs(observed - linear) <= linear_half,
+                                      horizons, mask, max_horizon),
+        ('government', None): _skill_sums(observed - government,
+                                          np.abs(observed - government) <= government_half,
+                                          horizons, mask, max_horizon)
+    }
+    for weight_gov in weights:
+        blended = (1 - weight_gov) * linear + weight_gov * government
+        # Same interval combination as projection_models.blend_projections
+        blended_half = np.sqrt((1 - weight_gov) ** 2 * linear_half ** 2 + weight_gov ** 2 * government_half ** 2)
+        results[('blended', weight_gov)] = _skill_sums(observed - blended,
+                                                       np.abs(observed - blended) <= blended_half,
+                                                       horizons, mask, max_horizon)
+    return results
+
+def _backtest_task(task):
+    """Worker: backtest one station (top level so it pickles)."""
+    station, years, values, weights, max_horizon, min_train = task
+    return station, backtest_station(years, values, weights, max_horizon, min_train)
+
+def _skill_rows(station, sums_by_model):
+    rows = []
+    for (model, weight_gov), sums in sums_by_model.items():
+        count, total, squares, absolute, covered = sums
+        for horizon in np.flatnonzero(count):
+            rows.append({
+                'station': station,
+                'model': model,
+                'weight_gov': weight_gov,
+                'horizon_years': int(horizon),
+                'n_forecasts': int(count[horizon]),
+                'rmse_ft': np.sqrt(squares[horizon] / count[horizon]),
+                'mae_ft': absolute[horizon] / count[horizon],
+                'bias_ft': total[horizon] / count[horizon],
+                'coverage_95': covered[horizon] / count[horizon]
+            })
+    return rows
+
+def run_backtests(annual_data, weights=BACKTEST_WEIGHTS, max_horizon=BACKTEST_HORIZON,
+                  min_train=MIN_TRAIN_YEARS, workers=1):
+    """
+    Backtest every station and pool the results.
+
+    Args:
+        annual_data: Annual data for all stations
+        weights: Government weights of the blended model to score
+        max_horizon: Longest forecast horizon in years
+        min_train: Minimum training years
+        workers: Worker processes (1 = run in this process)
+
+    Returns:
+        Skill DataFrame with one row per (station, model, weight_gov, horizon),
+        including pooled 'All stations' rows
+    """
+    tasks = [(station, group['year'].values, group['mean_ft'].values, list(weights), max_horizon, min_train)
+             for station, group in annual_data.groupby('station', sort=False)]
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(executor.map(_backtest_task, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    else:
+        results = [_backtest_task(task) for task in tasks]
+
+    rows = []
+    pooled = {}
+    for station, sums_by_model in results:
+        rows.extend(_skill_rows(station, sums_by_model))
+        for key, sums in sums_by_model.items():
+            pooled[key] = pooled[key] + sums if key in pooled else sums.copy()
+    rows.extend(_skill_rows(ALL_STATIONS, pooled))
+    return pd.DataFrame(rows)
+
+def save_backtest_skill(skill_df, output_file=BACKTEST_FILE):
+    """Write the skill table to CSV."""
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    skill_df.to_csv(output_file, index=False)
+    print(f"[OK] Backtest skill table saved to: {output_file}")
+    return output_file
+
+def print_skill_summary(skill_df, horizons=(1, 5, 10)):
+    """Pooled RMSE and coverage at a few horizons for each model."""
+    pooled = skill_df[skill_df['station'] == ALL_STATIONS]
+    print(f"\n  {'Model':<22}" + ''.join(f"{f'h={h} RMSE/cov':>20}" for h in horizons))
+    for (model, weight_gov), group in pooled.groupby(['model', 'weight_gov'], sort=False, dropna=False):
+        label = model if np.isnan(weight_gov) else f"{model} (w={weight_gov:.1f})"
+        cells = []
+        for h in horizons:
+            row = group[group['horizon_years'] == h]
+            cells.append(f"{row['rmse_ft'].iloc[0]:.3f} / {row['coverage_95'].iloc[0]:.0%}"
+                         if len(row) else 'n/a')
+        print(f"  {label:<22}" + ''.join(f"{cell:>20}" for cell in cells))
+
+def main():
+    """Backtest the projection models for all stations."""
+    print("=" * 60)
+    print("Rolling-Origin Backtesting")
+    print("=" * 60)
+
+    annual_file = 'output/annual_water_levels.csv'
+    if not os.path.exists(annual_file):
+        print(f"Error: {annual_file} not found!")
+        print("Please run aggregate_data.py first.")
+        return
+
+    annual_data = pd.read_csv(annual_file)
+    skill_df = run_backtests(annual_data, workers=os.cpu_count() or 1)
+    print_skill_summary(skill_df)
+    save_backtest_skill(skill_df)
+
+if __name__ == "__main__":
+    # Run through the importable module so pool workers can unpickle _backtest_task
+    from models import backtesting
+    backtesting.main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Batched closed-form least squares for many stations at once.
+Series are padded into (groups x years) matrices with a validity mask, and
+every fit statistic is computed with a handful of vectorized operations, so
+fitting hundreds of stations costs about the same as fitting one.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.fitting_core import t_quantile, t_survival
+
+def pad_groups(keys, *columns):
+    """
+    Pad ragged per-group series into rectangular matrices.
+
+    Args:
+        keys: Group key of each row (rows keep their order within a group)
+        *columns: Value arrays aligned with keys
+
+    Returns:
+        (unique keys in order of first appearance, list of (groups, width)
+        float matrices with zeros in padding, boolean mask of real entries)
+    """
+    codes, uniques = pd.factorize(np.asarray(keys))
+    counts = np.bincount(codes, minlength=len(uniques))
+    width = int(counts.max()) if len(counts) else 0
+
+    order = np.argsort(codes, kind='stable')
+    rows = codes[order]
+    positions = np.arange(len(order)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    mask = np.zeros((len(uniques), width), dtype=bool)
+    mask[rows, positions] = True
+    matrices = []
+    for column in columns:
+        matrix = np.zeros((len(uniques), width))
+        matrix[rows, positions] = np.asarray(column, dtype=float)[order]
+        matrices.append(matrix)
+    return list(uniques), matrices, mask
+
+def pad_station_series(annual_data, x_column='years_since_start', y_column='mean_ft', weights=None):
+    """
+    Padded x/y (and optional weight) matrices, one row per station.
+
+    Returns:
+        Dict with 'stations', 'x', 'y', 'weights' (None if not given) and 'mask'
+    """
+    columns = [annual_data[x_column].values, annual_data[y_column].values]
+    if weights is not None:
+        columns.append(weights)
+    stations, matrices, mask = pad_groups(annual_data['station'].values, *columns)
+    return {
+        'stations': stations,
+        'x': matrices[0],
+        'y': matrices[1],
+        'weights': matrices[2] if weights is not None else None,
+        'mask': mask
+    }
+
+def _row_weights(mask, weights):
+    """Per-entry weights rescaled to average 1 over each row's real entries."""
+    n = mask.sum(axis=1)
+    if weights is None:
+        return mask.astype(float), n
+    w = np.where(mask, weights, 0.0)
+    return w * (n / w.sum(axis=1))[:, None], n
+
+def batched_ols(x, y, mask, weights=None):
+    """
+    Straight-line least squares for every row of padded matrices.
+
+    Matches scipy.stats.linregress per row; with weights it is weighted
+    least squares (weights are relative, rescaled to average 1 per row).
+
+    Args:
+        x, y: (groups, width) matrices
+        mask: Boolean matrix of real entries
+        weights: Optional (groups, width) weight matrix
+
+    Returns:
+        Dict of per-row arrays: slope, intercept, std_err, r_squared, p_value,
+        n, mse (mean squared residual), x_mean and sxx
+    """
+    w, n = _row_weights(mask, weights)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = (w * x).sum(axis=1) / n
+        y_mean = (w * y).sum(axis=1) / n
+        dx = np.where(mask, x - x_mean[:, None], 0.0)
+        dy = np.where(mask, y - y_mean[:, None], 0.0)
+
+        sxx = (w * dx * dx).sum(axis=1)
+        sxy = (w * dx * dy).sum(axis=1)
+        syy = (w * dy * dy).sum(axis=1)
+        slope = sxy / sxx
+        intercept = y_mean - slope * x_mean
+
+        residuals = dy - slope[:, None] * dx
+        ss_res = np.maximum((w * residuals * residuals).sum(axis=1), 0.0)
+        dof = n - 2
+        std_err = np.where(dof > 0, np.sqrt(ss_res / np.maximum(dof, 1) / sxx), np.nan)
+        t_stat = np.abs(slope) / std_err
+        p_value = np.where(dof > 0, 2 * t_survival(t_stat, np.maximum(dof, 1)), np.nan)
+        r_squared = np.where(syy > 0, 1 - ss_res / syy, np.nan)
+
+    return {
+        'slope': slope,
+        'intercept': intercept,
+        'std_err': std_err,
+        'r_squared': r_squared,
+        'p_value': p_value,
+        'n': n,
+        'mse': ss_res / n,
+        'x_mean': x_mean,
+        'sxx': sxx
+    }
+
+def batched_prediction_interval(fit, x_new, confidence=0.95, t_value=None):
+    """
+    Predictions and prediction intervals of batched_ols() fits.
+
+    Uses the mean squared residual with a t quantile on n - 2 degrees of
+    freedom.
+
+    Args:
+        fit: Dict from batched_ols() (or arrays with the same keys)
+        x_new: (groups, k) matrix of x values to predict
+        t_value: Optional precomputed per-row t quantile for the confidence
+            level (skips the scipy lookup)
+
+    Returns:
+        (predictions, ci_lower, ci_upper), each (groups, k)
+    """
+    x_new = np.asarray(x_new, dtype=float)
+    n = fit['n'][:, None]
+    predictions = fit['intercept'][:, None] + fit['slope'][:, None] * x_new
+    se_pred = np.sqrt(fit['mse'][:, None] * (1 + 1 / n + (x_new - fit['x_mean'][:, None]) ** 2
+                                               / fit['sxx'][:, None]))
+    if t_value is None:
+        t_value = t_quantile(0.5 + confidence / 2, fit['n'] - 2)
+    t_val = np.asarray(t_value, dtype=float)[:, None]
+    return predictions, predictions - t_val * se_pred, predictions + t_val * se_pred
+
+def batched_polyfit(x, y, mask, degree=2):
+    """
+    Polynomial least squares for every row of padded matrices.
+
+    Solved on centered and scaled x for conditioning, then expanded back to
+    raw-x coefficients.
+
+    Returns:
+        Dict with 'coefficients' ((groups, degree + 1), highest power first
+        like np.polyfit) and 'r_squared'
+    """
+    n = mask.sum(axis=1)
+    n_groups = len(n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        center = np.where(mask, x, 0.0).sum(axis=1) / n
+        scale = np.sqrt(np.where(mask, (x - center[:, None]) ** 2, 0.0).sum(axis=1) / n)
+        scale = np.where(scale > 0, scale, 1.0)
+        u = np.where(mask, (x - center[:, None]) / scale[:, None], 0.0)
+
+    # Vandermonde rows (lowest power first) with padding zeroed out
+    vander = np.where(mask[:, :, None], u[:, :, None] ** np.arange(degree + 1), 0.0)
+    gram = np.einsum('gtj,gtk->gjk', vander, vander)
+    moments = np.einsum('gtj,gt->gj', vander, np.where(mask, y, 0.0))
+
+    solvable = n > degree
+    coeffs_u = np.full((n_groups, degree + 1), np.nan)
+    if solvable.any():
+        coeffs_u[solvable] = np.linalg.solve(gram[solvable], moments[solvable][:, :, None])[:, :, 0]
+
+    # Expand sum_k a_k ((x - c) / s)^k into raw powers of x
+    coeffs_x = np.zeros((n_groups, degree + 1))
+    for k in range(degree + 1):
+        for j in range(k + 1):
+            binom = float(np.prod(np.arange(k - j + 1, k + 1)) / np.prod(np.arange(1, j + 1)))
+            coeffs_x[:, j] += coeffs_u[:, k] * binom * (-center) ** (k - j) / scale ** k
+
+    fitted = np.einsum('gtj,gj->gt', vander, coeffs_u)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y_mean = np.where(mask, y, 0.0).sum(axis=1) / n
+        ss_res = np.where(mask, (y - fitted) ** 2, 0.0).sum(axis=1)
+        ss_tot = np.where(mask, (y - y_mean[:, None]) ** 2, 0.0).sum(axis=1)
+        r_squared = 1 - ss_res / ss_tot
+
+    return {
+        'coefficients': coeffs_x[:, ::-1],
+        'r_squared': r_squared
+    }
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for the projection stage.
+Imports models.projection_models in fresh interpreters and reports the
+median wall time, plus whether sklearn or scipy were loaded by the import
+(scipy should only load on the first fit).
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy modules the projection stage must not import at load time
+HEAVY_MODULES = ['sklearn', 'scipy', 'matplotlib']
+
+DEFAULT_RUNS = 7
+
+_PROBE = """
+import sys, time
+sys.path.insert(0, {project_dir!r})
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = [name for name in {heavy!r} if name in sys.modules]
+print(elapsed, ','.join(loaded))
+"""
+
+def time_import(module, runs=DEFAULT_RUNS):
+    """
+    Median import time of a module in fresh interpreters.
+
+    Returns:
+        (median seconds, list of heavy modules loaded by the import)
+    """
+    code = _PROBE.format(project_dir=PROJECT_DIR, module=module, heavy=HEAVY_MODULES)
+    timings = []
+    loaded = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                check=True, cwd=PROJECT_DIR).stdout.split()
+        timings.append(float(output[0]))
+        loaded = output[1].split(',') if len(output) > 1 else []
+    return statistics.median(timings), loaded
+
+def main():
+    """Benchmark projection-stage startup."""
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RUNS
+
+    print("=" * 60)
+    print(f"Import-Time Benchmark ({runs} fresh interpreters per module)")
+    print("=" * 60)
+
+    for module in ['numpy', 'pandas', 'models.projection_models']:
+        median, loaded = time_import(module, runs)
+        heavy = ', '.join(loaded) if loaded else 'none'
+        print(f"{module:<28} {median * 1000:8.1f} ms   heavy modules loaded: {heavy}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Bootstrap confidence intervals for station trend rates.
+Two resampling schemes, both robust to autocorrelated annual means:
+- block: moving blocks of (year, value) pairs are resampled
+- residual: the linear fit is kept and moving blocks of its residuals are resampled
+All replicates of a chunk are built as one index matrix and solved with a
+single batched least-squares call; stations are spread across a process pool.
+"""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.batch_regression import batched_ols
+from models.government_rate import GOVERNMENT_SLR_RATE_FT_YEAR, GOVERNMENT_SLR_RATE_FT_YEAR_STD
+
+BOOTSTRAP_METHODS = ['block', 'residual']
+BOOTSTRAP_REPLICATES = 10_000
+BOOTSTRAP_CONFIDENCE = 0.95
+BOOTSTRAP_SEED = 42
+
+# Replicates solved per batched call (bounds memory to chunk x years)
+BOOTSTRAP_CHUNK = 2_500
+
+def default_block_length(n):
+    """Block length ~ n^(1/3), the usual rule for moving-block bootstraps."""
+    return max(2, int(round(n ** (1 / 3))))
+
+def block_indices(n, n_replicates, block_length, rng):
+    """
+    Moving-block resample indices.
+
+    Returns:
+        (n_replicates, n) int matrix built from random blocks of consecutive indices
+    """
+    block_length = min(block_length, n)
+    n_blocks = -(-n // block_length)
+    starts = rng.integers(0, n - block_length + 1, size=(n_replicates, n_blocks))
+    indices = starts[:, :, None] + np.arange(block_length)
+    return indices.reshape(n_replicates, -1)[:, :n]
+
+def bootstrap_slopes(x, y, method='block', n_replicates=BOOTSTRAP_REPLICATES, block_length=None,
+                     rng=None, chunk_size=BOOTSTRAP_CHUNK):
+    """
+    Bootstrap distribution of the least-squares slope of one series.
+
+    Args:
+        x, y: Series to fit
+        method: 'block' (resample pairs) or 'residual' (resample fit residuals)
+        n_replicates: Number of bootstrap replicates
+        block_length: Block length (default n^(1/3); 1 gives the iid bootstrap)
+        rng: numpy Generator
+        chunk_size: Replicates per batched least-squares call
+
+    Returns:
+        Array of n_replicates slopes
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    rng = rng if rng is not None else np.random.default_rng(BOOTSTRAP_SEED)
+    block_length = block_length or default_block_length(n)
+
+    if method == 'residual':
+        fit = batched_ols(x[None, :], y[None, :], np.ones((1, n), dtype=bool))
+        fitted = fit['intercept'][0] + fit['slope'][0] * x
+        residuals = y - fitted
+    elif method != 'block':
+        raise ValueError(f"Unknown bootstrap method: {method}")
+
+    slopes = np.empty(n_replicates)
+    for start in range(0, n_replicates, chunk_size):
+        size = min(chunk_size, n_replicates - start)
+        indices = block_indices(n, size, block_length, rng)
+        if method == 'block':
+            xb, yb = x[indices], y[indices]
+        else:
+            xb, yb = np.broadcast_to(x, indices.shape), fitted + residuals[indices]
+        slopes[start:start + size] = batched_ols(xb, yb, np.ones(indices.shape, dtype=bool))['slope']
+    return slopes
+
+def summarize_slopes(slopes, confidence=BOOTSTRAP_CONFIDENCE, rng=None):
+    """
+    Percentile interval of bootstrap slopes and comparison with the government rate.
+
+    The government rate uncertainty is sampled alongside, so the comparison
+    makes no normality assumption about the station trend.
+    """
+    rng = rng if rng is not None else np.random.default_rng(BOOTSTRAP_SEED)
+    alpha = (1 - confidence) / 2
+    ci_lower, ci_upper = np.nanquantile(slopes, [alpha, 1 - alpha])
+
+    gov = rng.normal(GOVERNMENT_SLR_RATE_FT_YEAR, GOVERNMENT_SLR_RATE_FT_YEAR_STD, size=len(slopes))
+    diff_lower, diff_upper = np.nanquantile(slopes - gov, [alpha, 1 - alpha])
+
+    return {
+        'ci_lower': ci_lower,
+        'ci_upper': ci_upper,
+        'std_err': np.nanstd(slopes, ddof=1),
+        'within_gov_interval': bool(diff_lower <= 0 <= diff_upper)
+    }
+
+def _bootstrap_station(task):
+    """Worker: every bootstrap method for one station (top level so it pickles)."""
+    station, x, y, methods, n_replicates, block_length, seed = task
+    rng = np.random.default_rng(seed)
+    results = {}
+    for method in methods:
+        slopes = bootstrap_slopes(x, y, method, n_replicates, block_length, rng)
+        results[method] = summarize_slopes(slopes, rng=rng)
+    return station, results
+
+def bootstrap_station_trends(annual_data, methods=BOOTSTRAP_METHODS, n_replicates=BOOTSTRAP_REPLICATES,
+                             block_length=None, workers=1, seed=BOOTSTRAP_SEED):
+    """
+    Bootstrap trend intervals for every station.
+
+    Args:
+        annual_data: Annual data for one or more stations
+        methods: Bootstrap methods to run
+        n_replicates: Replicates per station and method
+        block_length: Block length (default n^(1/3) per station)
+        workers: Worker processes (1 = run in this process)
+        seed: Base seed; each station gets its own stream, so results do
+            not depend on the number of workers
+
+    Returns:
+        Dict of station -> method -> summarize_slopes() result
+    """
+    tasks = []
+    for i, station in enumerate(annual_data['station'].unique()):
+        station_data = annual_data[annual_data['station'] == station]
+        tasks.append((station, station_data['years_since_start'].values, station_data['mean_ft'].values,
+                      list(methods), n_replicates, block_length, [seed, i]))
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            return dict(executor.map(_bootstrap_station, tasks))
+    return dict(map(_bootstrap_station, tasks))
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Changepoint detection for sea level rates (piecewise-linear trends).
+A segment's cost is the residual sum of squares of its own straight-line fit,
+computed in O(1) from prefix sums of n, x, y, x^2, xy and y^2. Segmentations
+are found with PELT (exact, pruned dynamic programming) or binary
+segmentation, penalized by a BIC-style term per extra segment.
+Reports breakpoint dates and the rate of each segment.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_cleaning.rollup import load_cube
+
+# Shortest segment allowed, in years (short segments give meaningless rates)
+MIN_SEGMENT_YEARS = 8
+
+# Upper bound on breakpoints for binary segmentation
+MAX_CHANGEPOINTS = 4
+
+CHANGEPOINT_METHODS = ['pelt', 'binseg']
+
+CHANGEPOINTS_FILE = 'output/changepoints.csv'
+
+def prefix_sums(x, y):
+    """Prefix sums of the centered series for O(1) segment statistics."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    xc = x - x.mean()
+    yc = y - y.mean()
+    columns = np.stack([np.ones_like(xc), xc, yc, xc * xc, xc * yc, yc * yc])
+    return np.concatenate([np.zeros((6, 1)), np.cumsum(columns, axis=1)], axis=1)
+
+def segment_stats(sums, start, stop):
+    """
+    Line fit of segments [start, stop) (scalars or arrays) from prefix sums.
+
+    Returns:
+        (n, slope, residual sum of squares, centered sum of squares of x)
+    """
+    upper, lower = sums[:, stop], sums[:, start]
+    if upper.ndim < lower.ndim:
+        upper = upper[:, None]
+    elif lower.ndim < upper.ndim:
+        lower = lower[:, None]
+    n, sx, sy, sxx, sxy, syy = upper - lower
+    cxx = sxx - sx * sx / n
+    cxy = sxy - sx * sy / n
+    cyy = syy - sy * sy / n
+    slope = cxy / cxx
+    rss = np.maximum(cyy - slope * cxy, 0.0)
+    return n, slope, rss, cxx
+
+def segment_cost(sums, start, stop):
+    """Residual sum of squares of the line fit on [start, stop)."""
+    return segment_stats(sums, start, stop)[2]
+
+def noise_variance(y):
+    """Robust noise variance from first differences (insensitive to trends and shifts)."""
+    diffs = np.diff(np.asarray(y, dtype=float))
+    if len(diffs) < 2:
+        return 0.0
+    mad = np.median(np.abs(diffs - np.median(diffs)))
+    return (1.4826 * mad) ** 2 / 2
+
+def bic_penalty(y):
+    """Penalty per extra segment: slope, intercept and location, each sigma^2 log(n)."""
+    return 3 * noise_variance(y) * np.log(len(y))
+
+def pelt(sums, n, penalty, min_size):
+    """
+    Optimal segmentation by PELT.
+
+    Each step evaluates every surviving candidate at once; candidates that
+    can never be optimal again are pruned.
+
+    Returns:
+        Sorted list of breakpoint indices (segment starts, excluding 0)
+    """
+    best = np.full(n + 1, np.inf)
+    best[0] = -penalty
+    previous = np.zeros(n + 1, dtype=int)
+    candidates = np.zeros(n + 1, dtype=int)
+    n_candidates = 0
+
+    for t in range(min_size, n + 1):
+        newest = t - min_size
+        if np.isfinite(best[newest]):
+            candidates[n_candidates] = newest
+            n_candidates += 1
+        if not n_candidates:
+            continue
+        active = candidates[:n_candidates]
+        totals = best[active] + segment_cost(sums, active, t)
+        choice = np.argmin(totals)
+        best[t] = totals[choice] + penalty
+        previous[t] = active[choice]
+        keep = active[totals <= best[t]]
+        n_candidates = len(keep)
+        candidates[:n_candidates] = keep
+
+    breakpoints = []
+    t = n
+    while t > 0:
+        t = previous[t]
+        if t > 0:
+            breakpoints.append(int(t))
+    return sorted(breakpoints)
+
+def binary_segmentation(sums, n, penalty, min_size, max_changepoints=MAX_CHANGEPOINTS):
+    """
+    Greedy segmentation: repeatedly split the segment with the largest gain.
+
+    Every split position of a segment is scored in one vectorized call.
+
+    Returns:
+        Sorted list of breakpoint indices (segment starts, excluding 0)
+    """
+    bounds = [0, n]
+    for _ in range(max_changepoints):
+        best_gain, best_split = penalty, None
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            splits = np.arange(start + min_size, stop - min_size + 1)
+            if not len(splits):
+                continue
+            gains = (segment_cost(sums, start, stop)
+                     - segment_cost(sums, start, splits) - segment_cost(sums, splits, stop))
+            i = np.argmax(gains)
+            if gains[i] > best_gain:
+                best_gain, best_split = gains[i], int(splits[i])
+        if best_split is None:
+            break
+        bounds = sorted(bounds + [best_split])
+    return bounds[1:-1]
+
+def detect_changepoints(x, y, min_size, method='pelt', penalty=None):
+    """
+    Piecewise-linear segmentation of one series.
+
+    Args:
+        x: Decimal years (ascending)
+        y: Values
+        min_size: Minimum points per segment
+        method: 'pelt' or 'binseg'
+        penalty: Cost per extra segment (default bic_penalty(y))
+
+    Returns:
+        List of segment dicts: start, stop (indices), n, rate_ft_per_year, std_err
+    """
+    n = len(x)
+    penalty = bic_penalty(y) if penalty is None else penalty
+    sums = prefix_sums(x, y)
+
+    if n < 2 * min_size:
+        breakpoints = []
+    elif method == 'pelt':
+        breakpoints = pelt(sums, n, penalty, min_size)
+    elif method == 'binseg':
+        breakpoints = binary_segmentation(sums, n, penalty, min_size)
+    else:
+        raise ValueError(f"Unknown changepoint method: {method}")
+
+    starts = np.array([0] + breakpoints)
+    stops = np.array(breakpoints + [n])
+    count, slope, rss, cxx = segment_stats(sums, starts, stops)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std_err = np.where(count > 2, np.sqrt(rss / (count - 2) / cxx), np.nan)
+
+    return [{'start': int(a), 'stop': int(b), 'n': int(c), 'rate_ft_per_year': r, 'std_err': e}
+            for a, b, c, r, e in zip(starts, stops, count, slope, std_err)]
+
+def remove_monthly_climatology(months, values):
+    """
+    Subtract each calendar month's mean (seasonal cycle) from monthly values.
+
+    Args:
+        months: Calendar month of each value (1-12)
+        values: Monthly means
+
+    Returns:
+        Deseasonalized values (anomalies plus the overall mean)
+    """
+    months = np.asarray(months, dtype=int)
+    values = np.asarray(values, dtype=float)
+    counts = np.bincount(months, minlength=13)
+    sums = np.bincount(months, weights=values, minlength=13)
+    climatology = np.divide(sums, counts, out=np.zeros(13), where=counts > 0)
+    return values - climatology[months] + values.mean()
+
+def _segment_rows(station, resolution, labels, segments):
+    rows = []
+    for number, segment in enumerate(segments, start=1):
+        rows.append({
+            'station': station,
+            'resolution': resolution,
+            'segment': number,
+            'start': labels[segment['start']],
+            'end': labels[segment['stop'] - 1],
+            'n_obs': segment['n'],
+            'rate_ft_per_year': segment['rate_ft_per_year'],
+            'std_err_ft_per_year': segment['std_err'],
+            'rate_mm_per_year': segment['rate_ft_per_year'] * 304.8
+        })
+    return rows
+
+def station_changepoints(annual_data, monthly_cube=None, method='pelt'):
+    """
+    Changepoint segments for every station at annual and (if available) monthly resolution.
+
+    Monthly means are deseasonalized first so the seasonal cycle is not
+    mistaken for rate changes.
+
+    Returns:
+        DataFrame with one row per (station, resolution, segment)
+    """
+    rows = []
+    for station in annual_data['station'].unique():
+        station_data = annual_data[annual_data['station'] == station]
+        years = station_data['year'].values
+        segments = detect_changepoints(years + 0.5, station_data['mean_ft'].values,
+                                       MIN_SEGMENT_YEARS, method)
+        rows.extend(_segment_rows(station, 'annual', years.astype(str), segments))
+
+        if monthly_cube is not None and station in monthly_cube.index.get_level_values('station'):
+            station_cube = monthly_cube.xs(station, level='station')
+            months = pd.to_datetime(station_cube['period_start']).values.astype('datetime64[M]')
+            month_index = months.astype(np.int64)
+            values = remove_monthly_climatology(month_index % 12 + 1, station_cube['mean_ft'].values)
+            segments = detect_changepoints(1970 + (month_index + 0.5) / 12, values,
+                                           MIN_SEGMENT_YEARS * 12, method)
+            rows.extend(_segment_rows(station, 'monthly', np.datetime_as_string(months), segments))
+    return pd.DataFrame(rows)
+
+def breakpoint_summary(changepoints_df, resolution='annual'):
+    """Breakpoint labels per station ('' when the series has a single segment)."""
+    segments = changepoints_df[changepoints_df['resolution'] == resolution]
+    later = segments[segments['segment'] > 1]
+    return later.groupby('station')['start'].agg(';'.join).reindex(
+        segments['station'].unique(), fill_value='')
+
+def save_changepoints(changepoints_df, output_file=CHANGEPOINTS_FILE):
+    """Write changepoint segments to CSV."""
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    changepoints_df.to_csv(output_file, index=False)
+    print(f"[OK] Changepoint segments saved to: {output_file}")
+    return output_file
+
+def main():
+    """Detect rate changepoints for all stations."""
+    print("=" * 60)
+    print("Sea Level Rate Changepoints")
+    print("=" * 60)
+
+    annual_file = 'output/annual_water_levels.csv'
+    if not os.path.exists(annual_file):
+        print(f"Error: {annual_file} not found!")
+        print("Please run aggregate_data.py first.")
+        return
+
+    annual_data = pd.read_csv(annual_file)
+    changepoints_df = station_changepoints(annual_data, load_cube(resolution='monthly'))
+    print(changepoints_df.to_string(index=False))
+    save_changepoints(changepoints_df)
+
+if __name__ == "__main__":
+    main()
@@ -116,9 +116,9 @@ def create_town_predictions_csv():
     
     # Print preview
     print(f"\n{'='*80}")
-    print("PREVIEW: First 5 towns, 2030 predictions")
+    print(f"PREVIEW: First 5 towns, {years[0]} predictions")
     print(f"{'='*80}")
-    preview = predictions_df[predictions_df['year'] == 2030].head(5)
+    preview = predictions_df[predictions_df['year'] == years[0]].head(5)
     print(preview[['town', 'elevation_ft', 'projected_water_level_ft', 
                    'water_depth_ft', 'flood_status']].to_string(index=False))
     
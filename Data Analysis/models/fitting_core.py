@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Dependency-light fitting helpers: validation metrics in pure NumPy and
+Student-t functions with scipy imported only on first use.
+Keeps the projection stage free of sklearn and fast to start.
+"""
+
+import numpy as np
+
+_t_distribution = None
+
+def _student_t():
+    """scipy.stats.t, imported on first use."""
+    global _t_distribution
+    if _t_distribution is None:
+        from scipy.stats import t
+        _t_distribution = t
+    return _t_distribution
+
+def t_quantile(q, dof):
+    """Student-t quantile (scipy.stats.t.ppf), vectorized over dof."""
+    return _student_t().ppf(q, dof)
+
+def t_survival(t_stat, dof):
+    """Student-t survival function (scipy.stats.t.sf), vectorized."""
+    return _student_t().sf(t_stat, dof)
+
+def mean_squared_error(y_true, y_pred):
+    """Mean squared error (same as sklearn.metrics.mean_squared_error)."""
+    errors = np.asarray(y_true, dtype=float) - np.asarray(y_pred, dtype=float)
+    return np.mean(errors ** 2)
+
+def rmse(y_true, y_pred):
+    """Root mean squared error."""
+    return np.sqrt(mean_squared_error(y_true, y_pred))
+
+def mae(y_true, y_pred):
+    """Mean absolute error (same as sklearn.metrics.mean_absolute_error)."""
+    errors = np.asarray(y_true, dtype=float) - np.asarray(y_pred, dtype=float)
+    return np.mean(np.abs(errors))
+
+def r2(y_true, y_pred):
+    """
+    Coefficient of determination (same as sklearn.metrics.r2_score).
+
+    A constant y_true gives 1.0 for a perfect prediction and 0.0 otherwise.
+    """
+    y_true = np.asarray(y_true, dtype=float)
+    ss_res = np.sum((y_true - np.asarray(y_pred, dtype=float)) ** 2)
+    ss_tot = np.sum((y_true - np.mean(y_true)) ** 2)
+    if ss_tot == 0:
+        return 1.0 if ss_res == 0 else 0.0
+    return 1 - ss_res / ss_tot
@@ -4,9 +4,15 @@ Flood risk assessment for Louisiana coastal cities.
 Maps projected water levels to city elevations to determine flood risk.
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.spatial_index import (STATION_COORDINATES, build_station_index, idw_neighbors, idw_gather,
+                                  interpolate_projections, located_stations)
 
 # Louisiana coastal cities with approximate average elevations (feet above sea level)
 # Data from various sources - may need adjustment based on actual elevation data
@@ -33,6 +39,13 @@ COASTAL_CITIES = {
     'Bayou Cane': {'elevation_ft': 9.0, 'latitude': 29.6244, 'longitude': -90.7511},
 }
 
+# How cities get their projections: 'spatial' (inverse-distance weighting of
+# the nearest stations) or 'all_stations' (every city paired with every station)
+FLOOD_ASSIGNMENT_MODE = 'spatial'
+
+# Most projection years written to the wide flood_risk_summary.csv layout
+WIDE_SUMMARY_MAX_YEARS = 10
+
 def calculate_flood_risk(projected_water_level, city_elevation):
     """
     Calculate flood risk metrics.
@@ -75,8 +88,133 @@ def calculate_flood_risk(projected_water_level, city_elevation):
         'estimated_percent_flooded': max(0, min(100, percent_flooded))
     }
 
-def assess_all_cities(projections_df, output_dir='output'):
-    """Assess flood risk for all cities at each projection year."""
+# Status tiers by water depth (ft), checked in order: (status, depth above, percent per ft of margin)
+FLOOD_STATUS_TIERS = [
+    ('CRITICAL', -1, 50),       # Within 1 foot of flooding
+    ('HIGH RISK', -3, 25),      # Within 3 feet
+    ('MODERATE RISK', -5, 10),
+]
+
+def classify_flood_risk(projected_water_level, city_elevation):
+    """
+    Array version of calculate_flood_risk() (same tiers and percentages).
+    
+    Inputs broadcast against each other, so every (projection x city) pair
+    can be classified in one call.
+    
+    Args:
+        projected_water_level: Projected water levels in feet
+        city_elevation: City elevations in feet above sea level
+        
+    Returns:
+        Dictionary of arrays: water_depth_ft, flood_status, estimated_percent_flooded
+    """
+    water_level, elevation = np.broadcast_arrays(np.asarray(projected_water_level, dtype=float),
+                                                 np.asarray(city_elevation, dtype=float))
+    water_depth = water_level - elevation
+    margin = np.abs(water_depth)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        underwater_percent = np.where(elevation > 0, np.minimum(100, water_depth / elevation * 100), 100)
+    
+    conditions = [water_depth > 0] + [water_depth > depth for _, depth, _ in FLOOD_STATUS_TIERS]
+    flood_status = np.select(conditions, ['UNDERWATER'] + [status for status, _, _ in FLOOD_STATUS_TIERS],
+                             default='LOW RISK').astype(object)
+    percent_flooded = np.select(conditions,
+                                [underwater_percent] + [margin * rate for _, _, rate in FLOOD_STATUS_TIERS],
+                                default=0.0)
+    
+    return {
+        'water_depth_ft': water_depth,
+        'flood_status': flood_status,
+        'estimated_percent_flooded': np.maximum(0, np.minimum(100, percent_flooded))
+    }
+
+def _risk_columns(keys, city_names, elevations, latitudes, longitudes, water_level, ci_lower, ci_upper):
+    """Classified risk table columns for aligned per-row arrays."""
+    # Mean projection, plus the worst case using the upper CI
+    risk = classify_flood_risk(water_level, elevations)
+    worst_case = classify_flood_risk(ci_upper, elevations)
+    return pd.DataFrame({
+        **keys,
+        'city': city_names,
+        'city_elevation_ft': elevations,
+        'projected_water_level_ft': water_level,
+        'ci_lower_ft': ci_lower,
+        'ci_upper_ft': ci_upper,
+        'water_depth_ft': risk['water_depth_ft'],
+        'flood_status': risk['flood_status'],
+        'estimated_percent_flooded': risk['estimated_percent_flooded'],
+        'worst_case_status': worst_case['flood_status'],
+        'worst_case_percent_flooded': worst_case['estimated_percent_flooded'],
+        'latitude': latitudes,
+        'longitude': longitudes
+    })
+
+def city_risk_frame(projections, cities=COASTAL_CITIES, mode=FLOOD_ASSIGNMENT_MODE):
+    """
+    Flood risk of every city for every projection year (and scenario, if present).
+    
+    Args:
+        projections: Long-format projections (station, year, prediction_ft,
+            ci_lower_ft, ci_upper_ft, optional scenario)
+        cities: Dict of city -> info with elevation_ft, latitude and longitude
+        mode: 'spatial' interpolates each city's projection from its nearest
+            stations (inverse-distance weighting; 'station' is the nearest
+            one); 'all_stations' pairs every city with every station
+        
+    Returns:
+        Risk DataFrame (flood_risk_assessment.csv columns; spatial mode adds
+        nearest_station_km)
+    """
+    names = np.array(list(cities), dtype=object)
+    elevations = np.array([info['elevation_ft'] for info in cities.values()], dtype=float)
+    latitudes = np.array([info['latitude'] for info in cities.values()], dtype=float)
+    longitudes = np.array([info['longitude'] for info in cities.values()], dtype=float)
+    n_cities = len(names)
+    
+    if mode == 'all_stations':
+        # Every (projection x city) pair, projection-major like the original row-by-row loop
+        n_projections = len(projections)
+        keys = {}
+        if 'scenario' in projections:
+            keys['scenario'] = np.repeat(projections['scenario'].values, n_cities)
+        keys['station'] = np.repeat(projections['station'].values, n_cities)
+        keys['year'] = np.repeat(projections['year'].values.astype(int), n_cities)
+        return _risk_columns(keys, np.tile(names, n_projections), np.tile(elevations, n_projections),
+                             np.tile(latitudes, n_projections), np.tile(longitudes, n_projections),
+                             np.repeat(projections['prediction_ft'].values, n_cities),
+                             np.repeat(projections['ci_lower_ft'].values, n_cities),
+                             np.repeat(projections['ci_upper_ft'].values, n_cities))
+    if mode != 'spatial':
+        raise ValueError(f"Unknown flood assignment mode: {mode}")
+    
+    # One interpolated projection per city and key, key-major
+    interpolated = interpolate_projections(projections, latitudes, longitudes)
+    key_df = interpolated['keys']
+    n_keys = len(key_df)
+    keys = {}
+    if 'scenario' in key_df:
+        keys['scenario'] = np.repeat(key_df['scenario'].values, n_cities)
+    keys['station'] = np.tile(interpolated['nearest_station'], n_keys)
+    keys['year'] = np.repeat(key_df['year'].values.astype(int), n_cities)
+    values = interpolated['values']
+    risk_df = _risk_columns(keys, np.tile(names, n_keys), np.tile(elevations, n_keys),
+                            np.tile(latitudes, n_keys), np.tile(longitudes, n_keys),
+                            values['prediction_ft'].T.ravel(), values['ci_lower_ft'].T.ravel(),
+                            values['ci_upper_ft'].T.ravel())
+    risk_df['nearest_station_km'] = np.tile(interpolated['nearest_km'], n_keys)
+    return risk_df
+
+def assess_all_cities(projections_df, output_dir='output', mode=FLOOD_ASSIGNMENT_MODE):
+    """
+    Assess flood risk for all cities at each projection year.
+    
+    Args:
+        projections_df: Long-format projections
+        output_dir: Output directory
+        mode: Station-to-city assignment ('spatial' or legacy 'all_stations')
+    """
     
     print("=" * 60)
     print("Flood Risk Assessment for Louisiana Coastal Cities")
@@ -89,43 +227,7 @@ def assess_all_cities(projections_df, output_dir='output'):
         print("Error: No projections found!")
         return None
     
-    risk_assessments = []
-    
-    for _, proj_row in projections.iterrows():
-        station = proj_row['station']
-        year = int(proj_row['year'])
-        water_level = proj_row['prediction_ft']
-        ci_lower = proj_row['ci_lower_ft']
-        ci_upper = proj_row['ci_upper_ft']
-        
-        # For each city, assess flood risk
-        for city_name, city_info in COASTAL_CITIES.items():
-            elevation = city_info['elevation_ft']
-            
-            # Use mean projection (could also use upper CI for worst case)
-            risk = calculate_flood_risk(water_level, elevation)
-            
-            # Also calculate worst case using upper CI
-            worst_case = calculate_flood_risk(ci_upper, elevation)
-            
-            risk_assessments.append({
-                'station': station,
-                'year': year,
-                'city': city_name,
-                'city_elevation_ft': elevation,
-                'projected_water_level_ft': water_level,
-                'ci_lower_ft': ci_lower,
-                'ci_upper_ft': ci_upper,
-                'water_depth_ft': risk['water_depth_ft'],
-                'flood_status': risk['flood_status'],
-                'estimated_percent_flooded': risk['estimated_percent_flooded'],
-                'worst_case_status': worst_case['flood_status'],
-                'worst_case_percent_flooded': worst_case['estimated_percent_flooded'],
-                'latitude': city_info['latitude'],
-                'longitude': city_info['longitude']
-            })
-    
-    risk_df = pd.DataFrame(risk_assessments)
+    risk_df = city_risk_frame(projections, mode=mode)
     
     # Save results
     output_file = os.path.join(output_dir, 'flood_risk_assessment.csv')
@@ -183,59 +285,189 @@ def assess_all_cities(projections_df, output_dir='output'):
     return risk_df
 
 def create_risk_summary_table(risk_df, output_dir='output'):
-    """Create a summary table of cities at risk."""
-    
-    # Group by city and year, get worst case across stations
-    summary_data = []
+    """
+    Create a summary table of cities at risk.
     
-    for city in sorted(risk_df['city'].unique()):
-        city_data = risk_df[risk_df['city'] == city]
-        elevation = city_data['city_elevation_ft'].iloc[0]
-        
-        city_summary = {'city': city, 'elevation_ft': elevation}
-        
-        for year in sorted(city_data['year'].unique()):
-            year_data = city_data[city_data['year'] == year]
-            
-            # Get worst case (highest water level)
-            max_water_level = year_data['projected_water_level_ft'].max()
-            max_ci_upper = year_data['ci_upper_ft'].max()
-            
-            worst_case = calculate_flood_risk(max_ci_upper, elevation)
-            
-            city_summary[f'{year}_status'] = worst_case['flood_status']
-            city_summary[f'{year}_water_level'] = max_water_level
-            city_summary[f'{year}_worst_case'] = max_ci_upper
-        
-        summary_data.append(city_summary)
+    The summary is long format (one row per city and year), so any number of
+    projection years fits. The wide flood_risk_summary.csv layout (three
+    columns per year) is also written while there are at most
+    WIDE_SUMMARY_MAX_YEARS years; otherwise a wide table left by an earlier
+    run is removed so it cannot be mistaken for these results.
+    """
     
-    summary_df = pd.DataFrame(summary_data)
+    # Worst case across stations for each city and year
+    summary_df = (risk_df.groupby(['city', 'year'], sort=True)
+                  .agg(elevation_ft=('city_elevation_ft', 'first'),
+                       water_level=('projected_water_level_ft', 'max'),
+                       worst_case=('ci_upper_ft', 'max'))
+                  .reset_index())
+    summary_df['status'] = classify_flood_risk(summary_df['worst_case'].values,
+                                               summary_df['elevation_ft'].values)['flood_status']
+    summary_df = summary_df[['city', 'elevation_ft', 'year', 'status', 'water_level', 'worst_case']]
     
-    output_file = os.path.join(output_dir, 'flood_risk_summary.csv')
+    output_file = os.path.join(output_dir, 'flood_risk_summary_long.csv')
     summary_df.to_csv(output_file, index=False)
-    print(f"\n[OK] Risk summary table saved to: {output_file}")
+    print(f"\n[OK] Risk summary (long format) saved to: {output_file}")
+    
+    n_years = summary_df['year'].nunique()
+    wide_file = os.path.join(output_dir, 'flood_risk_summary.csv')
+    if n_years <= WIDE_SUMMARY_MAX_YEARS:
+        risk_summary_wide(summary_df).to_csv(wide_file, index=False)
+        print(f"[OK] Risk summary table saved to: {wide_file}")
+    else:
+        print(f"  {n_years} projection years: wide summary table skipped "
+              f"(more than {WIDE_SUMMARY_MAX_YEARS} years)")
+        if os.path.exists(wide_file):
+            os.remove(wide_file)
+            print(f"  Removed stale {wide_file} from an earlier run; use {output_file}")
+    
+    return summary_df
+
+def risk_summary_wide(summary_df):
+    """Pivot the long risk summary to one row per city with {year}_status/_water_level/_worst_case columns."""
+    wide = summary_df.pivot(index='city', columns='year', values=['status', 'water_level', 'worst_case'])
+    columns = {}
+    for year in sorted(summary_df['year'].unique()):
+        for field in ['status', 'water_level', 'worst_case']:
+            columns[f'{year}_{field}'] = wide[(field, year)]
+    elevation = summary_df.groupby('city', sort=True)['elevation_ft'].first()
+    return pd.DataFrame({'elevation_ft': elevation, **columns}).rename_axis('city').reset_index()
+
+def assess_scenarios(tensor, cities=COASTAL_CITIES, mode=FLOOD_ASSIGNMENT_MODE):
+    """
+    City risk summary for every scenario, straight from a scenario tensor.
+    
+    Same numbers as create_risk_summary_table() per scenario: each city's
+    projection (interpolated from its nearest stations in spatial mode, the
+    worst case across stations in all_stations mode) for each year,
+    classified on the upper CI against the city's elevation.
+    
+    Args:
+        tensor: scenarios.scenario_tensor() result
+        cities: Dict of city -> info with elevation_ft, latitude and longitude
+        mode: Station-to-city assignment ('spatial' or 'all_stations')
+        
+    Returns:
+        DataFrame with columns scenario, city, elevation_ft, year, status,
+        water_level, worst_case
+    """
+    names = sorted(cities)
+    elevations = np.array([cities[city]['elevation_ft'] for city in names])
+    n_scenarios, _, n_years = tensor['predictions'].shape
+    shape = (n_scenarios, len(names), n_years)
     
+    if mode == 'all_stations':
+        # (scenario, year) worst cases across stations, the same for every city
+        water_level = np.broadcast_to(tensor['predictions'].max(axis=1)[:, None, :], shape)
+        worst_case = np.broadcast_to(tensor['ci_upper'].max(axis=1)[:, None, :], shape)
+    elif mode == 'spatial':
+        # (scenario, city, year) from each city's nearest stations
+        located = located_stations(tensor['stations'])
+        index = build_station_index({tensor['stations'][i]: STATION_COORDINATES[tensor['stations'][i]]
+                                     for i in located})
+        positions, weights, _ = idw_neighbors(index, [cities[city]['latitude'] for city in names],
+                                              [cities[city]['longitude'] for city in names])
+        water_level = idw_gather(tensor['predictions'][:, located], positions, weights, axis=1)
+        worst_case = idw_gather(tensor['ci_upper'][:, located], positions, weights, axis=1)
+    else:
+        raise ValueError(f"Unknown flood assignment mode: {mode}")
+    
+    summary_df = pd.DataFrame({
+        'scenario': np.repeat(tensor['scenarios'], len(names) * n_years),
+        'city': np.tile(np.repeat(names, n_years), n_scenarios),
+        'elevation_ft': np.broadcast_to(elevations[None, :, None], shape).ravel(),
+        'year': np.tile(tensor['years'], n_scenarios * len(names)),
+        'water_level': water_level.ravel(),
+        'worst_case': worst_case.ravel()
+    })
+    summary_df.insert(4, 'status', classify_flood_risk(summary_df['worst_case'].values,
+                                                       summary_df['elevation_ft'].values)['flood_status'])
     return summary_df
 
-def main():
-    """Main function for flood risk assessment."""
+def run_scenario_sweep(target_years, output_dir='output', mode=FLOOD_ASSIGNMENT_MODE):
+    """
+    Scenario flood summary for the given years from the model registry and
+    scenario table (skipped if either is missing).
+    """
+    from models.model_registry import REGISTRY_FILE, load_registry
+    from models.scenarios import SCENARIOS_FILE, load_scenarios, scenario_tensor
+    
+    if not (os.path.exists(REGISTRY_FILE) and os.path.exists(SCENARIOS_FILE)):
+        print(f"\nScenario sweep skipped ({REGISTRY_FILE} or {SCENARIOS_FILE} not found)")
+        return None
+    
+    tensor = scenario_tensor(load_registry(), load_scenarios(), target_years)
+    scenario_df = assess_scenarios(tensor, mode=mode)
+    
+    output_file = os.path.join(output_dir, 'flood_risk_scenarios.csv')
+    scenario_df.to_csv(output_file, index=False)
+    print(f"\n[OK] Scenario risk summary saved to: {output_file}")
+    
+    # Cities underwater in the worst case, by scenario and year
+    counts = (scenario_df[scenario_df['status'] == 'UNDERWATER']
+              .groupby(['scenario', 'year']).size()
+              .unstack(fill_value=0)
+              .reindex(index=tensor['scenarios'], columns=tensor['years'], fill_value=0))
+    print("\nCities underwater (worst case) by scenario:")
+    print(counts.to_string())
+    
+    return scenario_df
+
+def main(projections_file='output/water_level_projections.csv', target_years=None,
+         mode=FLOOD_ASSIGNMENT_MODE):
+    """
+    Main function for flood risk assessment.
+    
+    Args:
+        projections_file: Long-format projection table (station, year,
+            prediction_ft, ci_lower_ft, ci_upper_ft), e.g.
+            output/projection_curves.csv for annual curves
+        target_years: If given, project these years from the stored model
+            registry instead of reading projections_file
+        mode: Station-to-city assignment ('spatial' or legacy 'all_stations')
+    """
     
     # Load projections
-    projections_file = 'output/water_level_projections.csv'
-    if not os.path.exists(projections_file):
+    if target_years is not None:
+        from models.model_registry import REGISTRY_FILE, load_registry, project_from_registry
+        if not os.path.exists(REGISTRY_FILE):
+            print(f"Error: {REGISTRY_FILE} not found!")
+            print("Please run projection_models.py first.")
+            return
+        projections_df = project_from_registry(load_registry(), target_years)
+    elif not os.path.exists(projections_file):
         print(f"Error: {projections_file} not found!")
         print("Please run projection_models.py first.")
         return
-    
-    projections_df = pd.read_csv(projections_file)
+    else:
+        projections_df = pd.read_csv(projections_file)
     
     # Assess flood risk
-    risk_df = assess_all_cities(projections_df)
+    risk_df = assess_all_cities(projections_df, mode=mode)
     
     if risk_df is not None:
         # Create summary table
         summary_df = create_risk_summary_table(risk_df)
         
+        # Same summary across the sea-level-rise scenarios
+        run_scenario_sweep(sorted(risk_df['year'].unique()), mode=mode)
+        
+        # Asset inventory (parcels, roads, facilities), streamed in chunks if one is provided
+        from models.asset_risk import ASSET_INVENTORY_FILE, assess_asset_inventory
+        if os.path.exists(ASSET_INVENTORY_FILE):
+            print(f"\nAssessing asset inventory: {ASSET_INVENTORY_FILE}")
+            assess_asset_inventory(ASSET_INVENTORY_FILE, projections_df)
+        
+        # Inundation of a local elevation grid, tiled across worker processes if one is provided
+        from models.inundation_raster import DEM_FILE, dem_metadata_file, inundation_analysis, save_inundation
+        if os.path.exists(DEM_FILE):
+            if os.path.exists(dem_metadata_file(DEM_FILE)):
+                print(f"\nMapping inundation on elevation grid: {DEM_FILE}")
+                save_inundation(*inundation_analysis(DEM_FILE, projections_df, workers=os.cpu_count() or 1))
+            else:
+                print(f"\nSkipping inundation mapping: {dem_metadata_file(DEM_FILE)} not found "
+                      f"(the geotransform sidecar of {DEM_FILE})")
+        
         print("\n" + "=" * 60)
         print("Flood Risk Assessment Complete")
         print("=" * 60)
@@ -244,7 +476,7 @@ def main():
         print("\nKey Findings:")
         print("-" * 60)
         
-        for year in [2030, 2035, 2040, 2045, 2050]:
+        for year in sorted(risk_df['year'].unique()):
             year_data = risk_df[risk_df['year'] == year]
             underwater = len(year_data[year_data['flood_status'] == 'UNDERWATER'])
             critical = len(year_data[year_data['flood_status'] == 'CRITICAL'])
@@ -254,7 +486,14 @@ def main():
                 print(f"{year}: {underwater} cities projected underwater: {', '.join(cities[:5])}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Flood risk assessment for the coastal cities.')
+    parser.add_argument('--projections', default='output/water_level_projections.csv',
+                        help='long-format projection table (e.g. output/projection_curves.csv)')
+    parser.add_argument('--all-stations', action='store_true',
+                        help='pair every city with every station instead of interpolating from the '
+                             'nearest stations (legacy)')
+    args = parser.parse_args()
+    main(args.projections, mode='all_stations' if args.all_stations else FLOOD_ASSIGNMENT_MODE)
 
 
 
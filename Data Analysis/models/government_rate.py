@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+"""
+Government baseline sea-level-rise rate shared by the trend, bootstrap,
+backtesting, Monte Carlo and projection stages.
+Kept free of imports so any stage can use it without import cycles.
+"""
+
+# Government baseline rate: 6.2 mm/year = 0.0203 ft/year
+GOVERNMENT_SLR_RATE_FT_YEAR = 0.0203
+GOVERNMENT_SLR_RATE_FT_YEAR_STD = 0.0032  # 0.97 mm/year = 0.0032 ft/year
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Inundation mapping on a local elevation grid (DEM).
+The grid is a 2-D NumPy array saved with np.save (a GeoTIFF can be exported
+to one band of .npy once) plus a JSON sidecar with its geotransform. It is
+memory-mapped and cut into tiles that worker processes read independently,
+so only a few tiles are in RAM at a time. For every projection year and
+bound (ci_lower, prediction, ci_upper) each tile gets an inundation mask,
+its flooded area and depth statistics; water levels come per pixel from the
+nearest stations by inverse-distance weighting. Town summaries are summed
+from the tiles.
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.flood_risk_assessment import COASTAL_CITIES
+from models.spatial_index import (EARTH_RADIUS_KM, NEAREST_STATIONS, IDW_POWER, build_station_index,
+                                  idw_neighbors, idw_gather, station_projection_matrices, unit_vectors)
+
+DEM_FILE = 'data/dem.npy'
+INUNDATION_TILES_FILE = 'output/inundation_tiles.csv'
+INUNDATION_SUMMARY_FILE = 'output/inundation_summary.csv'
+INUNDATION_MASK_DIR = 'output/inundation'
+
+# Tile edge in pixels (a 1024 x 1024 float32 tile is 4 MB)
+INUNDATION_TILE = 1024
+
+# Pixels within this distance of a town center count towards that town
+TOWN_RADIUS_KM = 5.0
+
+# Water level bounds from low to high; the mask value of a pixel is the
+# number of bounds under which it is flooded (0 dry ... 3 flooded even at ci_lower)
+WATER_LEVEL_BOUNDS = {'ci_lower': 'ci_lower_ft', 'prediction': 'prediction_ft', 'ci_upper': 'ci_upper_ft'}
+MASK_NODATA = 255
+
+FT_PER_M = 3.28084
+KM_PER_DEGREE = EARTH_RADIUS_KM * np.pi / 180
+
+def dem_metadata_file(dem_file):
+    """JSON sidecar of a DEM (data/dem.npy -> data/dem.json)."""
+    return os.path.splitext(dem_file)[0] + '.json'
+
+def load_dem(dem_file):
+    """
+    Memory-map a DEM and read its geotransform.
+
+    The sidecar holds origin_lon and origin_lat (outer corner of the
+    top-left pixel), pixel_width_deg and pixel_height_deg (rows run south),
+    and optionally nodata and units ('ft' or 'm', default 'ft'). Elevations
+    must use the datum of the water level projections.
+
+    Returns:
+        (read-only memmap of shape (rows, cols), geotransform dict)
+    """
+    grid = np.load(dem_file, mmap_mode='r')
+    if grid.ndim != 2:
+        raise ValueError(f"{dem_file} must be a 2-D elevation grid, got shape {grid.shape}")
+
+    with open(dem_metadata_file(dem_file), 'r', encoding='utf-8') as f:
+        geo = json.load(f)
+    missing = {'origin_lon', 'origin_lat', 'pixel_width_deg', 'pixel_height_deg'} - set(geo)
+    if missing:
+        raise ValueError(f"{dem_metadata_file(dem_file)} is missing key(s): {', '.join(sorted(missing))}")
+    geo.setdefault('nodata', None)
+    geo.setdefault('units', 'ft')
+    if geo['units'] not in ('ft', 'm'):
+        raise ValueError(f"Unknown DEM units: {geo['units']}")
+    return grid, geo
+
+def tile_windows(shape, tile_size=INUNDATION_TILE):
+    """(row0, row1, col0, col1) of every tile, row-major."""
+    rows, cols = shape
+    return [(row0, min(row0 + tile_size, rows), col0, min(col0 + tile_size, cols))
+            for row0 in range(0, rows, tile_size) for col0 in range(0, cols, tile_size)]
+
+def pixel_centers(geo, window):
+    """Latitudes of the window's rows and longitudes of its columns."""
+    row0, row1, col0, col1 = window
+    latitude = geo['origin_lat'] - (np.arange(row0, row1) + 0.5) * geo['pixel_height_deg']
+    longitude = geo['origin_lon'] + (np.arange(col0, col1) + 0.5) * geo['pixel_width_deg']
+    return latitude, longitude
+
+def pixel_area_km2(geo, latitude):
+    """Area of one pixel in each row (pixels shrink towards the poles)."""
+    return (geo['pixel_height_deg'] * KM_PER_DEGREE
+            * geo['pixel_width_deg'] * KM_PER_DEGREE * np.cos(np.radians(latitude)))
+
+def read_tile(grid, geo, window):
+    """Tile elevations in feet as float64, NaN where there is no data."""
+    row0, row1, col0, col1 = window
+    elevation = np.array(grid[row0:row1, col0:col1], dtype=float)
+    if geo['nodata'] is not None:
+        elevation[elevation == geo['nodata']] = np.nan
+    if geo['units'] == 'm':
+        elevation *= FT_PER_M
+    return elevation
+
+def assign_towns(town_index, latitude, longitude, radius_km=TOWN_RADIUS_KM):
+    """
+    Nearest town of every point within radius_km.
+
+    Returns:
+        Town position in town_index['stations'] plus one (0 = no town)
+    """
+    # Chord length on the unit sphere of the great-circle radius
+    chord = 2 * np.sin(radius_km / (2 * EARTH_RADIUS_KM))
+    distance, position = town_index['tree'].query(unit_vectors(latitude, longitude), k=1,
+                                                  distance_upper_bound=chord)
+    return np.where(np.isfinite(distance), position + 1, 0)
+
+def inundate_tile(task):
+    """
+    Worker: inundation statistics of one tile (top level so it pickles).
+
+    Every statistic is an (keys, bounds, towns + 1) array summed over the
+    tile's pixels, with town 0 collecting pixels outside every town.
+    """
+    (dem_file, window, station_coordinates, matrices, town_coordinates, radius_km, k, power,
+     mask_files) = task
+    grid, geo = load_dem(dem_file)
+    elevation = read_tile(grid, geo, window)
+    valid = ~np.isnan(elevation)
+
+    n_towns = len(town_coordinates) + 1
+    n_keys = matrices['prediction_ft'].shape[1]
+    shape = (n_keys, len(WATER_LEVEL_BOUNDS), n_towns)
+    result = {
+        'window': window,
+        'valid_area_km2': np.zeros(n_towns),
+        'flooded_area_km2': np.zeros(shape),
+        'depth_area': np.zeros(shape),
+        'max_depth_ft': np.full(shape, np.nan)
+    }
+    masks = (np.full((n_keys,) + elevation.shape, MASK_NODATA, dtype=np.uint8)
+             if mask_files is not None else None)
+
+    if valid.any():
+        latitude, longitude = pixel_centers(geo, window)
+        rows, cols = np.nonzero(valid)
+        pixel_lat, pixel_lon = latitude[rows], longitude[cols]
+        area = pixel_area_km2(geo, latitude)[rows]
+        pixel_elevation = elevation[rows, cols]
+
+        town = (assign_towns(build_station_index(town_coordinates), pixel_lat, pixel_lon, radius_km)
+                if town_coordinates else np.zeros(len(rows), dtype=int))
+        result['valid_area_km2'] = np.bincount(town, weights=area, minlength=n_towns)
+        if masks is not None:
+            masks[:, rows, cols] = 0
+
+        # Interpolated levels are weighted means of station values, so pixels
+        # above the highest station bound can never flood
+        candidate = pixel_elevation < np.nanmax(matrices['ci_upper_ft'])
+        if candidate.any():
+            positions, weights, _ = idw_neighbors(build_station_index(station_coordinates),
+                                                  pixel_lat[candidate], pixel_lon[candidate], k, power)
+            candidate_elevation = pixel_elevation[candidate]
+            candidate_area = area[candidate]
+            candidate_town = town[candidate]
+            candidate_rows, candidate_cols = rows[candidate], cols[candidate]
+            for j in range(n_keys):
+                for b, column in enumerate(WATER_LEVEL_BOUNDS.values()):
+                    depth = idw_gather(matrices[column][:, j], positions, weights) - candidate_elevation
+                    flooded = depth > 0
+                    if not flooded.any():
+                        continue
+                    flooded_town = candidate_town[flooded]
+                    result['flooded_area_km2'][j, b] = np.bincount(flooded_town, weights=candidate_area[flooded],
+                                                                   minlength=n_towns)
+                    result['depth_area'][j, b] = np.bincount(flooded_town,
+                                                             weights=candidate_area[flooded] * depth[flooded],
+                                                             minlength=n_towns)
+                    max_depth = np.zeros(n_towns)
+                    np.maximum.at(max_depth, flooded_town, depth[flooded])
+                    result['max_depth_ft'][j, b] = np.where(result['flooded_area_km2'][j, b] > 0, max_depth,
+                                                            np.nan)
+                    if masks is not None:
+                        masks[j, candidate_rows[flooded], candidate_cols[flooded]] += 1
+
+    if masks is not None:
+        # Tiles cover disjoint windows, so workers can write the shared files directly
+        row0, row1, col0, col1 = window
+        for j, mask_file in enumerate(mask_files):
+            mask = np.load(mask_file, mmap_mode='r+')
+            mask[row0:row1, col0:col1] = masks[j]
+            mask.flush()
+            del mask
+    return result
+
+def _mask_files(keys, output_dir):
+    """One mask file per projection key (year, or scenario and year)."""
+    names = ['_'.join(str(value) for value in key) for key in keys.itertuples(index=False)]
+    return [os.path.join(output_dir, f"mask_{name}.npy") for name in names]
+
+def _create_masks(mask_files, shape, geo):
+    """Allocate the mask files on disk (written tile by tile by the workers)."""
+    for mask_file in mask_files:
+        os.makedirs(os.path.dirname(mask_file) or '.', exist_ok=True)
+        np.lib.format.open_memmap(mask_file, mode='w+', dtype=np.uint8, shape=shape).flush()
+        with open(dem_metadata_file(mask_file), 'w', encoding='utf-8') as f:
+            json.dump({**geo, 'nodata': MASK_NODATA, 'units': 'flooded bounds'}, f, indent=2)
+
+def _area_statistics(key, bound, flooded_area, depth_area, max_depth, valid_area):
+    """Flooded area and depth statistics of one area (tile or town)."""
+    return {
+        **key,
+        'bound': bound,
+        'valid_area_km2': valid_area,
+        'flooded_area_km2': flooded_area,
+        'percent_flooded': 100 * flooded_area / valid_area if valid_area > 0 else np.nan,
+        'mean_depth_ft': depth_area / flooded_area if flooded_area > 0 else np.nan,
+        'max_depth_ft': max_depth
+    }
+
+def inundation_analysis(dem_file, projections_df, towns=COASTAL_CITIES, tile_size=INUNDATION_TILE,
+                        radius_km=TOWN_RADIUS_KM, k=NEAREST_STATIONS, power=IDW_POWER, workers=1,
+                        mask_dir=None):
+    """
+    Inundation of a DEM for every projection key and water level bound.
+
+    Args:
+        dem_file: .npy elevation grid with a JSON geotransform sidecar
+        projections_df: Long-format projections (station, year, optional scenario)
+        towns: Dict of town -> {'latitude', 'longitude', ...}
+        tile_size: Tile edge in pixels
+        radius_km: Town radius for the per-town summaries
+        k, power: Nearest stations and inverse-distance power
+        workers: Worker processes (1 = run in this process)
+        mask_dir: Directory for per-key mask grids (None = no masks)
+
+    Returns:
+        (per-tile DataFrame, per-town DataFrame)
+    """
+    grid, geo = load_dem(dem_file)
+    index, keys, matrices = station_projection_matrices(projections_df,
+                                                        value_columns=tuple(WATER_LEVEL_BOUNDS.values()))
+    keys['year'] = keys['year'].astype(int)
+    station_coordinates = {station: (lat, lon) for station, lat, lon in
+                           zip(index['stations'], index['latitude'], index['longitude'])}
+    town_names = list(towns)
+    town_coordinates = {town: (towns[town]['latitude'], towns[town]['longitude']) for town in town_names}
+
+    mask_files = None
+    if mask_dir is not None:
+        mask_files = _mask_files(keys, mask_dir)
+        _create_masks(mask_files, grid.shape, geo)
+
+    windows = tile_windows(grid.shape, tile_size)
+    tasks = [(dem_file, window, station_coordinates, matrices, town_coordinates, radius_km, k, power, mask_files)
+             for window in windows]
+    print(f"DEM {grid.shape[0]:,} x {grid.shape[1]:,} pixels in {len(tasks)} tile(s) of {tile_size} px, "
+          f"{len(keys)} projection key(s) x {len(WATER_LEVEL_BOUNDS)} bounds")
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = executor.map(inundate_tile, tasks)
+            tile_rows, town_totals = _collect_tiles(results, keys)
+    else:
+        tile_rows, town_totals = _collect_tiles(map(inundate_tile, tasks), keys)
+
+    town_rows = []
+    for j, key in enumerate(keys.to_dict('records')):
+        for b, bound in enumerate(WATER_LEVEL_BOUNDS):
+            for t, town in enumerate(town_names, start=1):
+                if town_totals['valid_area_km2'][t] > 0:
+                    town_rows.append({'town': town, **_area_statistics(
+                        key, bound, town_totals['flooded_area_km2'][j, b, t], town_totals['depth_area'][j, b, t],
+                        town_totals['max_depth_ft'][j, b, t], town_totals['valid_area_km2'][t])})
+    return pd.DataFrame(tile_rows), pd.DataFrame(town_rows)
+
+def _collect_tiles(results, keys):
+    """Per-tile rows and the town totals summed over all tiles."""
+    key_records = keys.to_dict('records')
+    tile_rows, totals = [], None
+    for result in results:
+        if totals is None:
+            totals = {name: (np.zeros_like(result[name]) if name != 'max_depth_ft'
+                             else np.full_like(result[name], np.nan))
+                      for name in ['valid_area_km2', 'flooded_area_km2', 'depth_area', 'max_depth_ft']}
+        for name in ['valid_area_km2', 'flooded_area_km2', 'depth_area']:
+            totals[name] += result[name]
+        totals['max_depth_ft'] = np.fmax(totals['max_depth_ft'], result['max_depth_ft'])
+
+        valid_area = result['valid_area_km2'].sum()
+        if valid_area == 0:
+            continue
+        row0, _, col0, _ = result['window']
+        max_depth = np.fmax.reduce(result['max_depth_ft'], axis=2)
+        for j, key in enumerate(key_records):
+            for b, bound in enumerate(WATER_LEVEL_BOUNDS):
+                tile_rows.append({'row0': row0, 'col0': col0, **_area_statistics(
+                    key, bound, result['flooded_area_km2'][j, b].sum(), result['depth_area'][j, b].sum(),
+                    max_depth[j, b], valid_area)})
+    return tile_rows, totals
+
+def save_inundation(tiles_df, towns_df, tiles_file=INUNDATION_TILES_FILE, summary_file=INUNDATION_SUMMARY_FILE):
+    """Write the per-tile and per-town inundation tables to CSV."""
+    for df, output_file, label in [(tiles_df, tiles_file, 'tile'), (towns_df, summary_file, 'town')]:
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        df.to_csv(output_file, index=False)
+        print(f"[OK] Inundation {label} statistics saved to: {output_file}")
+
+def print_inundation_summary(towns_df):
+    """Flooded share of each town under the central projection."""
+    central = towns_df[towns_df['bound'] == 'prediction']
+    if central.empty:
+        print("No town lies within the DEM.")
+        return
+    print("\nFlooded share of town area (prediction):")
+    table = central.pivot_table(index='town', columns='year', values='percent_flooded', sort=False)
+    print(table.round(1).to_string())
+
+def main():
+    """Inundation mapping of a DEM against the saved projections."""
+    parser = argparse.ArgumentParser(description='Inundation statistics of an elevation grid (.npy + .json).')
+    parser.add_argument('dem', nargs='?', default=DEM_FILE, help='elevation grid saved with np.save')
+    parser.add_argument('--projections', default='output/water_level_projections.csv',
+                        help='long-format projection table (e.g. output/projection_curves.csv)')
+    parser.add_argument('--tile-size', type=int, default=INUNDATION_TILE, help='tile edge in pixels')
+    parser.add_argument('--radius-km', type=float, default=TOWN_RADIUS_KM, help='town radius in km')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--masks', action='store_true',
+                        help=f'write per-year mask grids to {INUNDATION_MASK_DIR}/')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Inundation Mapping")
+    print("=" * 60)
+
+    for path, hint in [(args.dem, "Provide an elevation grid (.npy) with a JSON geotransform sidecar."),
+                       (dem_metadata_file(args.dem), "Provide the DEM geotransform sidecar."),
+                       (args.projections, "Please run projection_models.py first.")]:
+        if not os.path.exists(path):
+            print(f"Error: {path} not found!")
+            print(hint)
+            return
+
+    tiles_df, towns_df = inundation_analysis(args.dem, pd.read_csv(args.projections), tile_size=args.tile_size,
+                                             radius_km=args.radius_km, workers=args.workers,
+                                             mask_dir=INUNDATION_MASK_DIR if args.masks else None)
+    save_inundation(tiles_df, towns_df)
+    if args.masks:
+        print(f"[OK] Inundation masks saved to: {INUNDATION_MASK_DIR}/")
+    print_inundation_summary(towns_df)
+
+if __name__ == "__main__":
+    # Run through the importable module so pool workers can unpickle inundate_tile
+    from models import inundation_raster
+    inundation_raster.main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Registry of fitted projection models.
+Each station's linear-trend coefficients and covariance, the statistics its
+prediction interval needs, the tuned weight_gov, the training window and a
+fingerprint of its input data are stored in one JSON file. Later stages
+project any year from the stored numbers without refitting, and a station is
+refitted only when its fingerprint changes.
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.batch_regression import pad_station_series, batched_ols, batched_prediction_interval
+from models.fitting_core import t_quantile
+from models.projection_models import (GOVERNMENT_SLR_RATE_FT_YEAR, GOVERNMENT_SLR_RATE_FT_YEAR_STD,
+                                      WEIGHT_GOV_BOUNDS, tune_all_stations, blend_projections,
+                                      blended_projection_table)
+
+REGISTRY_FILE = 'output/model_registry.json'
+
+# Bump when the fitting code changes so every station is refitted
+REGISTRY_VERSION = 1
+
+HOLDOUT_START_YEAR = 2015
+
+def registry_settings():
+    """Settings every stored model depends on (part of each fingerprint)."""
+    return {
+        'version': REGISTRY_VERSION,
+        'holdout_start_year': HOLDOUT_START_YEAR,
+        'weight_gov_bounds': list(WEIGHT_GOV_BOUNDS),
+        'government_rate_ft_per_year': GOVERNMENT_SLR_RATE_FT_YEAR,
+        'government_rate_std_ft_per_year': GOVERNMENT_SLR_RATE_FT_YEAR_STD
+    }
+
+def station_fingerprint(station_data, station_weights=None):
+    """Hash of a station's annual series, its weights and the registry settings."""
+    digest = hashlib.sha256(json.dumps(registry_settings(), sort_keys=True).encode('utf-8'))
+    for column in ['year', 'years_since_start', 'mean_ft']:
+        digest.update(np.ascontiguousarray(station_data[column].values, dtype=float).tobytes())
+    if station_weights is not None:
+        digest.update(np.ascontiguousarray(station_weights, dtype=float).tobytes())
+    return digest.hexdigest()
+
+def fit_station_models(annual_data, weights=None):
+    """
+    Fit and tune every station in annual_data.
+
+    Returns:
+        Dict of station -> registry entry (without the fingerprint)
+    """
+    series = pad_station_series(annual_data, weights=weights)
+    fit = batched_ols(series['x'], series['y'], series['mask'], series['weights'])
+    t_975 = t_quantile(0.975, fit['n'] - 2)
+    tuned = tune_all_stations(annual_data, holdout_start_year=HOLDOUT_START_YEAR, weights=weights)
+
+    grouped = annual_data.groupby('station', sort=False)
+    first = grouped[['year']].min()
+    last = grouped[['years_since_start', 'year']].max()
+    origin = grouped[['year', 'mean_ft']].last()
+
+    entries = {}
+    for i, station in enumerate(series['stations']):
+        n = fit['n'][i]
+        # Coefficient covariance with the unbiased residual variance
+        s2 = fit['mse'][i] * n / (n - 2) if n > 2 else np.nan
+        x_mean, sxx = fit['x_mean'][i], fit['sxx'][i]
+        covariance = [[s2 * (1 / n + x_mean ** 2 / sxx), -s2 * x_mean / sxx],
+                      [-s2 * x_mean / sxx, s2 / sxx]]
+        weight_gov, metrics = tuned[station]
+        entries[station] = {
+            'training_window': [int(first.loc[station, 'year']), int(last.loc[station, 'year'])],
+            'weighted': weights is not None,
+            'intercept': float(fit['intercept'][i]),
+            'slope': float(fit['slope'][i]),
+            'covariance': [[float(value) for value in row] for row in covariance],
+            'n': float(n),
+            'mse': float(fit['mse'][i]),
+            'x_mean': float(x_mean),
+            'sxx': float(sxx),
+            't_975': float(t_975[i]),
+            'x_last': float(last.loc[station, 'years_since_start']),
+            'year_last': float(last.loc[station, 'year']),
+            'gov_origin_year': float(origin.loc[station, 'year']),
+            'gov_origin_value': float(origin.loc[station, 'mean_ft']),
+            'weight_gov': float(weight_gov),
+            'validation': ({key: float(metrics[key]) for key in ['rmse', 'mae', 'r2']}
+                           if metrics else None)
+        }
+    return entries
+
+def _finite_or_none(value):
+    """Copy of a registry value with NaN/inf floats replaced by None (JSON null)."""
+    if isinstance(value, dict):
+        return {key: _finite_or_none(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_finite_or_none(item) for item in value]
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+def _none_to_nan(entry):
+    """Restore NaN for the numeric fields of a loaded registry entry stored as null."""
+    for key, value in entry.items():
+        if value is None and key != 'validation':
+            entry[key] = np.nan
+    entry['covariance'] = [[np.nan if value is None else value for value in row]
+                           for row in entry.get('covariance', [])]
+    if entry.get('validation'):
+        entry['validation'] = {key: np.nan if value is None else value
+                               for key, value in entry['validation'].items()}
+    return entry
+
+def load_registry(registry_file=REGISTRY_FILE):
+    """Stored registry, or an empty one if the file does not exist."""
+    if os.path.exists(registry_file):
+        with open(registry_file, 'r', encoding='utf-8') as f:
+            registry = json.load(f)
+        for entry in registry.get('stations', {}).values():
+            _none_to_nan(entry)
+        return registry
+    return {'settings': registry_settings(), 'stations': {}}
+
+def save_registry(registry, registry_file=REGISTRY_FILE):
+    """Write the registry as strict JSON (non-finite statistics become null)."""
+    os.makedirs(os.path.dirname(registry_file) or '.', exist_ok=True)
+    with open(registry_file, 'w', encoding='utf-8') as f:
+        json.dump(_finite_or_none(registry), f, indent=2, allow_nan=False)
+    print(f"[OK] Model registry saved to: {registry_file}")
+    return registry_file
+
+def update_registry(annual_data, weights=None, registry_file=REGISTRY_FILE):
+    """
+    Bring the registry up to date, refitting only stations whose data changed.
+
+    Args:
+        annual_data: Annual data for all stations
+        weights: Optional per-row completeness weights aligned with annual_data
+        registry_file: Registry JSON file
+
+    Returns:
+        (registry dict, list of refitted stations)
+    """
+    registry = load_registry(registry_file)
+    stored = registry.get('stations', {})
+
+    fingerprints = {}
+    changed_rows = np.zeros(len(annual_data), dtype=bool)
+    for station in annual_data['station'].unique():
+        in_station = (annual_data['station'] == station).values
+        station_weights = weights[in_station] if weights is not None else None
+        fingerprints[station] = station_fingerprint(annual_data[in_station], station_weights)
+        if stored.get(station, {}).get('fingerprint') != fingerprints[station]:
+            changed_rows |= in_station
+
+    refitted = []
+    if changed_rows.any():
+        entries = fit_station_models(annual_data[changed_rows],
+                                     weights[changed_rows] if weights is not None else None)
+        for station, entry in entries.items():
+            stored[station] = {'fingerprint': fingerprints[station], **entry}
+            refitted.append(station)
+
+    # Keep only stations present in the current data, in data order
+    registry = {'settings': registry_settings(),
+                'stations': {station: stored[station] for station in fingerprints}}
+    if refitted or not os.path.exists(registry_file):
+        save_registry(registry, registry_file)
+    return registry, refitted
+
+def registry_linear_bands(registry, target_years, stations=None):
+    """
+    Station linear-trend predictions and 95% bands from stored coefficients.
+
+    Returns:
+        (stations, dict of per-station arrays from the registry,
+        (predictions, ci_lower, ci_upper) each (stations, years))
+    """
+    stations = list(registry['stations']) if stations is None else list(stations)
+    entries = [registry['stations'][station] for station in stations]
+    fit = {key: np.array([entry[key] for entry in entries], dtype=float)
+           for key in ['intercept', 'slope', 'n', 'mse', 'x_mean', 'sxx', 't_975', 'x_last', 'year_last',
+                       'gov_origin_year', 'gov_origin_value', 'weight_gov']}
+
+    target_years = np.asarray(target_years)
+    x_predict = fit['x_last'][:, None] + (target_years[None, :] - fit['year_last'][:, None])
+    return stations, fit, batched_prediction_interval(fit, x_predict, t_value=fit['t_975'])
+
+def registry_blend(registry, target_years, stations=None, rate=GOVERNMENT_SLR_RATE_FT_YEAR,
+                   rate_std=GOVERNMENT_SLR_RATE_FT_YEAR_STD, acceleration=0.0):
+    """
+    Blended projections and bands from stored coefficients, without refitting.
+
+    The defaults give the government baseline; (scenarios, 1, 1) arrays of
+    rate, rate_std and acceleration give every scenario at once (see
+    projection_models.blend_projections).
+
+    Returns:
+        (stations, dict of per-station arrays from the registry,
+        (predictions, ci_lower, ci_upper) each (stations, years) or
+        (scenarios, stations, years))
+    """
+    stations, fit, bands = registry_linear_bands(registry, target_years, stations)
+    blended = blend_projections(bands, fit['weight_gov'], target_years, fit['gov_origin_year'].astype(int),
+                                fit['gov_origin_value'], rate, rate_std, acceleration)
+    return stations, fit, blended
+
+def project_from_registry(registry, target_years, stations=None):
+    """
+    Blended projections from stored coefficients, without refitting.
+
+    This is the projection path of the pipeline (water_level_projections.csv
+    and projection_curves.csv), i.e. the baseline scenario of
+    scenarios.scenario_tensor().
+
+    Args:
+        registry: Registry dict (update_registry() or load_registry())
+        target_years: Calendar years to project (any array)
+        stations: Stations to project (default all)
+
+    Returns:
+        Long-format DataFrame with the water_level_projections.csv columns
+    """
+    stations, fit, blended = registry_blend(registry, target_years, stations)
+    return blended_projection_table(stations, target_years, blended, fit['weight_gov'])
+
+def main():
+    """Update the model registry for all stations."""
+    from data_cleaning.completeness import load_annual_weights, completeness_weights
+
+    print("=" * 60)
+    print("Model Registry")
+    print("=" * 60)
+
+    annual_file = 'output/annual_water_levels.csv'
+    if not os.path.exists(annual_file):
+        print(f"Error: {annual_file} not found!")
+        print("Please run aggregate_data.py first.")
+        return
+
+    annual_data = pd.read_csv(annual_file)
+    weights = completeness_weights(annual_data, load_annual_weights())
+    registry, refitted = update_registry(annual_data, weights)
+    print(f"Refitted {len(refitted)} of {len(registry['stations'])} station(s)")
+
+if __name__ == "__main__":
+    main()
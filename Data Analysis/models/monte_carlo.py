@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo ensembles for the blended projection model.
+Each path draws the station trend (mean level, slope and residual variance
+of the least-squares fit) and the government rate jointly, and blends the
+two projected paths, so the projection bands are sampled rather than built
+from root-sum-square interval widths. Paths are generated in chunks and fed
+into fixed-bin histograms per station-year, so memory stays bounded by the
+chunk size no matter how many paths are run; any percentile is read back
+from the histograms at the end.
+"""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.batch_regression import pad_station_series, batched_ols
+from models.government_rate import GOVERNMENT_SLR_RATE_FT_YEAR, GOVERNMENT_SLR_RATE_FT_YEAR_STD
+
+MC_PATHS = 100_000
+MC_SEED = 42
+
+# Paths generated per vectorized step (bounds memory to chunk x target years)
+MC_CHUNK = 25_000
+
+# Percentiles written for every station-year
+MC_PERCENTILES = [2.5, 5, 10, 25, 50, 75, 90, 95, 97.5]
+
+# Histogram per station-year: bins spanning +/- MC_HISTOGRAM_SPAN analytic
+# standard deviations around the point projection (paths outside are counted
+# in the edge bins)
+MC_HISTOGRAM_BINS = 4_000
+MC_HISTOGRAM_SPAN = 12.0
+
+MONTE_CARLO_FILE = 'output/monte_carlo_projections.csv'
+
+def station_parameters(annual_data, target_years, weights=None):
+    """
+    Fit statistics each station's paths are sampled from.
+
+    Args:
+        annual_data: Annual data for all stations
+        target_years: Calendar years to project
+        weights: Optional per-row completeness weights aligned with annual_data
+
+    Returns:
+        Dict of station -> parameter dict (n, dof, y_mean, slope, x_mean,
+        sxx, s2, x_predict, last_value, years_ahead)
+    """
+    series = pad_station_series(annual_data, weights=weights)
+    fit = batched_ols(series['x'], series['y'], series['mask'], series['weights'])
+    target_years = np.asarray(target_years, dtype=float)
+
+    ordered = annual_data.sort_values(['station', 'year'], kind='stable')
+    last = ordered.groupby('station', sort=False)[['years_since_start', 'year', 'mean_ft']].last()
+
+    parameters = {}
+    for i, station in enumerate(series['stations']):
+        n = fit['n'][i]
+        years_ahead = target_years - last.loc[station, 'year']
+        parameters[station] = {
+            'n': n,
+            'dof': n - 2,
+            'y_mean': fit['intercept'][i] + fit['slope'][i] * fit['x_mean'][i],
+            'slope': fit['slope'][i],
+            'x_mean': fit['x_mean'][i],
+            'sxx': fit['sxx'][i],
+            # Unbiased residual variance (batched_ols reports ss_res / n)
+            's2': fit['mse'][i] * n / (n - 2) if n > 2 else np.nan,
+            'x_predict': last.loc[station, 'years_since_start'] + years_ahead,
+            'last_value': last.loc[station, 'mean_ft'],
+            'years_ahead': years_ahead
+        }
+    return parameters
+
+def can_simulate(params):
+    """Whether a station has residual degrees of freedom to draw its variance from."""
+    return params['dof'] >= 1 and np.isfinite(params['s2']) and params['sxx'] > 0
+
+def _nan_summary(n_years, n_percentiles):
+    """simulate_station()-style summary of a station that cannot be simulated."""
+    return {
+        'mean': np.full(n_years, np.nan),
+        'std': np.full(n_years, np.nan),
+        'min': np.full(n_years, np.nan),
+        'max': np.full(n_years, np.nan),
+        'percentiles': np.full((n_years, n_percentiles), np.nan)
+    }
+
+def _histogram_range(params, weight_gov):
+    """Per-year histogram bounds from the analytic mean and spread of the blended paths."""
+    dx = params['x_predict'] - params['x_mean']
+    linear = params['y_mean'] + params['slope'] * dx
+    government = params['last_value'] + GOVERNMENT_SLR_RATE_FT_YEAR * params['years_ahead']
+    center = (1 - weight_gov) * linear + weight_gov * government
+
+    # Student-t variance of the linear prediction plus the government rate spread
+    dof = params['dof']
+    t_scale = dof / (dof - 2) if dof > 2 else 3.0
+    linear_var = params['s2'] * t_scale * (1 + 1 / params['n'] + dx ** 2 / params['sxx'])
+    gov_var = (GOVERNMENT_SLR_RATE_FT_YEAR_STD * params['years_ahead']) ** 2
+    spread = np.sqrt((1 - weight_gov) ** 2 * linear_var + weight_gov ** 2 * gov_var)
+    spread = np.where(spread > 0, spread, 1e-6)
+    return center - MC_HISTOGRAM_SPAN * spread, center + MC_HISTOGRAM_SPAN * spread
+
+def sample_paths(params, weight_gov, size, rng):
+    """
+    Blended projection paths for one station.
+
+    The residual variance is drawn from its scaled inverse chi-square
+    distribution, then the mean level and slope are drawn given it (they are
+    independent in centered coordinates, which carries the intercept-slope
+    covariance of the fit). Each target year also gets one year of residual
+    noise, so the linear paths follow the t prediction interval (with the
+    unbiased residual variance). The government rate is drawn once per path.
+
+    Returns:
+        (size, target years) matrix of projected water levels (ft)
+    """
+    n, dof = params['n'], params['dof']
+    sigma2 = params['s2'] * dof / rng.chisquare(dof, size)
+    sigma = np.sqrt(sigma2)
+
+    level = params['y_mean'] + sigma * np.sqrt(1 / n) * rng.standard_normal(size)
+    slope = params['slope'] + sigma / np.sqrt(params['sxx']) * rng.standard_normal(size)
+    dx = params['x_predict'] - params['x_mean']
+    noise = sigma[:, None] * rng.standard_normal((size, len(dx)))
+    linear = level[:, None] + slope[:, None] * dx + noise
+
+    gov_rate = rng.normal(GOVERNMENT_SLR_RATE_FT_YEAR, GOVERNMENT_SLR_RATE_FT_YEAR_STD, size)
+    government = params['last_value'] + gov_rate[:, None] * params['years_ahead']
+
+    return (1 - weight_gov) * linear + weight_gov * government
+
+def histogram_quantiles(counts, lower, width, quantiles):
+    """
+    Quantiles from fixed-bin histograms, interpolating linearly within a bin.
+
+    Args:
+        counts: (rows, bins) histogram counts
+        lower: Lower edge of each row's first bin
+        width: Bin width of each row
+        quantiles: Quantiles in [0, 1]
+
+    Returns:
+        (rows, len(quantiles)) matrix
+    """
+    total = counts.sum(axis=1, keepdims=True)
+    cdf = np.cumsum(counts, axis=1) / total
+    result = np.empty((len(counts), len(quantiles)))
+    rows = np.arange(len(counts))
+    for j, q in enumerate(quantiles):
+        bins = np.minimum((cdf < q).sum(axis=1), counts.shape[1] - 1)
+        below = np.where(bins > 0, cdf[rows, np.maximum(bins - 1, 0)], 0.0)
+        inside = counts[rows, bins] / total[:, 0]
+        fraction = np.divide(q - below, inside, out=np.full(len(counts), 0.5), where=inside > 0)
+        result[:, j] = lower + width * (bins + np.clip(fraction, 0.0, 1.0))
+    return result
+
+def simulate_station(params, weight_gov, n_paths=MC_PATHS, percentiles=MC_PERCENTILES,
+                     chunk_size=MC_CHUNK, rng=None):
+    """
+    Streaming Monte Carlo summary of one station's blended projections.
+
+    Only per-year histograms and running sums are kept between chunks.
+
+    Returns:
+        Dict with 'mean', 'std', 'min', 'max' (per target year) and
+        'percentiles' ((target years, len(percentiles)) matrix)
+    """
+    rng = rng if rng is not None else np.random.default_rng(MC_SEED)
+    lower, upper = _histogram_range(params, weight_gov)
+    n_years = len(lower)
+    width = (upper - lower) / MC_HISTOGRAM_BINS
+    offsets = np.arange(n_years) * MC_HISTOGRAM_BINS
+
+    counts = np.zeros(n_years * MC_HISTOGRAM_BINS)
+    total = np.zeros(n_years)
+    squares = np.zeros(n_years)
+    minimum = np.full(n_years, np.inf)
+    maximum = np.full(n_years, -np.inf)
+
+    for start in range(0, n_paths, chunk_size):
+        paths = sample_paths(params, weight_gov, min(chunk_size, n_paths - start), rng)
+        # Accumulate deviations from the histogram center to keep the running sums well conditioned
+        deviations = paths - (lower + upper) / 2
+        total += deviations.sum(axis=0)
+        squares += (deviations * deviations).sum(axis=0)
+        minimum = np.minimum(minimum, paths.min(axis=0))
+        maximum = np.maximum(maximum, paths.max(axis=0))
+
+        bins = np.clip(((paths - lower) / width).astype(np.int64), 0, MC_HISTOGRAM_BINS - 1)
+        counts += np.bincount((bins + offsets).ravel(), minlength=len(counts))
+
+    mean_deviation = total / n_paths
+    variance = np.maximum(squares / n_paths - mean_deviation ** 2, 0.0) * n_paths / max(n_paths - 1, 1)
+    return {
+        'mean': (lower + upper) / 2 + mean_deviation,
+        'std': np.sqrt(variance),
+        'min': minimum,
+        'max': maximum,
+        'percentiles': histogram_quantiles(counts.reshape(n_years, MC_HISTOGRAM_BINS), lower, width,
+                                           np.asarray(percentiles, dtype=float) / 100)
+    }
+
+def _simulate_task(task):
+    """Worker: simulate one station (top level so it pickles)."""
+    station, params, weight_gov, n_paths, percentiles, chunk_size, seed = task
+    return station, simulate_station(params, weight_gov, n_paths, percentiles, chunk_size,
+                                     np.random.default_rng(seed))
+
+def monte_carlo_projections(annual_data, target_years, weight_gov, weights=None, n_paths=MC_PATHS,
+                            percentiles=MC_PERCENTILES, chunk_size=MC_CHUNK, workers=1, seed=MC_SEED):
+    """
+    Monte Carlo percentiles of the blended projections for every station.
+
+    Args:
+        annual_data: Annual data for all stations
+        target_years: Calendar years to project
+        weight_gov: Dict of station -> government weight of the blend
+        weights: Optional per-row completeness weights aligned with annual_data
+        n_paths: Paths per station (1e5-1e6 is typical)
+        percentiles: Percentiles (0-100) to report
+        chunk_size: Paths generated per vectorized step
+        workers: Worker processes (1 = run in this process)
+        seed: Base seed; each station gets its own stream, so results do
+            not depend on the number of workers
+
+    Returns:
+        DataFrame with one row per station and target year
+    """
+    parameters = station_parameters(annual_data, target_years, weights)
+    tasks = [(station, params, weight_gov[station], n_paths, list(percentiles), chunk_size, [seed, i])
+             for i, (station, params) in enumerate(parameters.items()) if can_simulate(params)]
+
+    # Stations with two or fewer years have no residual variance to sample (NaN rows, like their intervals)
+    skipped = [station for station, params in parameters.items() if not can_simulate(params)]
+    if skipped:
+        print(f"  Warning: too few years for Monte Carlo, writing NaN for: {', '.join(skipped)}")
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = dict(executor.map(_simulate_task, tasks))
+    else:
+        results = dict(_simulate_task(task) for task in tasks)
+
+    rows = []
+    for station in parameters:
+        summary = results.get(station, _nan_summary(len(target_years), len(percentiles)))
+        for j, year in enumerate(target_years):
+            row = {
+                'station': station,
+                'year': year,
+                'weight_gov': weight_gov[station],
+                'n_paths': n_paths if station in results else 0,
+                'mean_ft': summary['mean'][j],
+                'std_ft': summary['std'][j],
+                'min_ft': summary['min'][j],
+                'max_ft': summary['max'][j]
+            }
+            for k, percentile in enumerate(percentiles):
+                row[f"p{percentile:g}_ft"] = summary['percentiles'][j, k]
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+def save_monte_carlo(mc_df, output_file=MONTE_CARLO_FILE):
+    """Write the Monte Carlo percentiles to CSV."""
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    mc_df.to_csv(output_file, index=False)
+    print(f"[OK] Monte Carlo projections saved to: {output_file}")
+    return output_file
+
+def main():
+    """Monte Carlo projections with the projection stage's tuned weights."""
+    from data_cleaning.completeness import load_annual_weights, completeness_weights
+    from models.projection_models import TARGET_YEARS, tune_all_stations
+
+    n_paths = int(sys.argv[1]) if len(sys.argv) > 1 else MC_PATHS
+
+    print("=" * 60)
+    print(f"Monte Carlo Projections ({n_paths:,} paths per station)")
+    print("=" * 60)
+
+    annual_file = 'output/annual_water_levels.csv'
+    if not os.path.exists(annual_file):
+        print(f"Error: {annual_file} not found!")
+        print("Please run aggregate_data.py first.")
+        return
+
+    annual_data = pd.read_csv(annual_file)
+    weights = completeness_weights(annual_data, load_annual_weights())
+    weight_gov = {station: best for station, (best, _) in tune_all_stations(annual_data, weights=weights).items()}
+
+    mc_df = monte_carlo_projections(annual_data, TARGET_YEARS, weight_gov, weights, n_paths=n_paths,
+                                    workers=os.cpu_count() or 1)
+    save_monte_carlo(mc_df)
+
+if __name__ == "__main__":
+    # Run through the importable module so pool workers can unpickle _simulate_task
+    from models import monte_carlo
+    monte_carlo.main()
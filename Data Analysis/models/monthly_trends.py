@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Monthly-resolution trend analysis (about 12x more points than annual means).
+Uses NOAA's seasonally adjusted monthly means (<station id>_meantrend.csv)
+where the station folder has one; otherwise the monthly means of the
+aggregate cube are deseasonalized by subtracting their monthly climatology.
+Linear and quadratic fits for all stations run in one batched call each.
+"""
+
+import glob
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_cleaning.rollup import load_cube
+from models.batch_regression import pad_groups, batched_ols, batched_polyfit
+from models.changepoint import remove_monthly_climatology
+
+METERS_TO_FEET = 3.28084
+
+MONTHLY_TREND_FILE = 'output/monthly_trend_summary.csv'
+
+# Same rule as trend_analysis.detect_acceleration
+ACCELERATION_R2_IMPROVEMENT = 0.01
+
+def find_meantrend_file(folder_name):
+    """NOAA mean-trend file in a station folder, or None."""
+    matches = sorted(glob.glob(os.path.join(folder_name, '*_meantrend.csv')))
+    return matches[0] if matches else None
+
+def read_noaa_meantrend(filepath):
+    """
+    Read a NOAA CO-OPS mean sea level trend file.
+
+    The file starts with a free-text preamble; the table begins at the
+    'Year, Month, ...' header. Values are in meters and converted to feet.
+
+    Returns:
+        DataFrame with year, month, monthly_msl_ft and linear_trend_ft
+    """
+    with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+        for header_line, line in enumerate(f):
+            if line.lstrip().lower().startswith('year'):
+                break
+        else:
+            raise ValueError(f"No 'Year, Month, ...' header found in {filepath}")
+
+    # Rows end with a trailing comma; index_col=False keeps Year as a column
+    table = pd.read_csv(filepath, skiprows=header_line, index_col=False, skipinitialspace=True)
+    table = table.dropna(subset=['Year', 'Month', 'Monthly_MSL'])
+
+    return pd.DataFrame({
+        'year': table['Year'].astype(int).values,
+        'month': table['Month'].astype(int).values,
+        'monthly_msl_ft': table['Monthly_MSL'].values * METERS_TO_FEET,
+        'linear_trend_ft': table['Linear_Trend'].values * METERS_TO_FEET
+    })
+
+def monthly_from_cube(station_cube):
+    """Deseasonalized monthly means (year, month, value) from a station's cube rows."""
+    months = pd.to_datetime(station_cube['period_start']).values.astype('datetime64[M]').astype(np.int64)
+    return pd.DataFrame({
+        'year': months // 12 + 1970,
+        'month': months % 12 + 1,
+        'monthly_msl_ft': remove_monthly_climatology(months % 12 + 1, station_cube['mean_ft'].values)
+    })
+
+def load_monthly_series(station_folders, monthly_cube=None):
+    """
+    Deseasonalized monthly series for every station.
+
+    Args:
+        station_folders: Dict of station name -> raw data folder
+        monthly_cube: Monthly rows of the aggregate cube, or None
+
+    Returns:
+        DataFrame with station, source, year, month, decimal_year and monthly_msl_ft
+    """
+    frames = []
+    cube_stations = (set(monthly_cube.index.get_level_values('station'))
+                     if monthly_cube is not None else set())
+
+    for station, folder_name in station_folders.items():
+        meantrend_file = find_meantrend_file(folder_name) if folder_name else None
+        if meantrend_file:
+            series = read_noaa_meantrend(meantrend_file)[['year', 'month', 'monthly_msl_ft']]
+            source = 'noaa_meantrend'
+        elif station in cube_stations:
+            series = monthly_from_cube(monthly_cube.xs(station, level='station'))
+            source = 'hourly_deseasonalized'
+        else:
+            continue
+
+        series.insert(0, 'source', source)
+        series.insert(0, 'station', station)
+        frames.append(series)
+
+    if not frames:
+        return None
+    monthly = pd.concat(frames, ignore_index=True)
+    monthly['decimal_year'] = monthly['year'] + (monthly['month'] - 0.5) / 12
+    return monthly
+
+def _lag1_autocorrelation(residuals, mask):
+    """Lag-1 autocorrelation of each row's residuals (adjacent real entries only)."""
+    pairs = mask[:, 1:] & mask[:, :-1]
+    products = np.where(pairs, residuals[:, 1:] * residuals[:, :-1], 0.0).sum(axis=1)
+    squares = np.where(mask, residuals ** 2, 0.0).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.clip(products / squares, 0.0, 0.99)
+
+def monthly_trend_summary(monthly):
+    """
+    Linear and quadratic trend of every station's monthly series.
+
+    Monthly residuals are autocorrelated, so an AR(1)-adjusted standard error
+    (effective sample size n(1 - r1)/(1 + r1)) is reported alongside the OLS one.
+
+    Returns:
+        DataFrame with one row per station
+    """
+    keys = monthly['station'].values
+    stations, (x, y), mask = pad_groups(keys, monthly['decimal_year'].values, monthly['monthly_msl_ft'].values)
+    linear = batched_ols(x, y, mask)
+    quadratic = batched_polyfit(x, y, mask, degree=2)
+
+    residuals = y - (linear['intercept'][:, None] + linear['slope'][:, None] * x)
+    r1 = _lag1_autocorrelation(np.where(mask, residuals, 0.0), mask)
+    std_err_ar1 = linear['std_err'] * np.sqrt((1 + r1) / (1 - r1))
+
+    first = monthly.groupby('station', sort=False).first().loc[stations]
+    last = monthly.groupby('station', sort=False).last().loc[stations]
+    improvement = quadratic['r_squared'] - linear['r_squared']
+
+    return pd.DataFrame({
+        'station': stations,
+        'source': first['source'].values,
+        'data_period': [f"{a.year}-{a.month:02d} to {b.year}-{b.month:02d}"
+                        for a, b in zip(first.itertuples(), last.itertuples())],
+        'n_months': linear['n'].astype(int),
+        'rate_ft_per_year': linear['slope'],
+        'rate_mm_per_year': linear['slope'] * 304.8,
+        'std_err': linear['std_err'],
+        'std_err_ar1': std_err_ar1,
+        'lag1_autocorrelation': r1,
+        'r_squared': linear['r_squared'],
+        'p_value': linear['p_value'],
+        'acceleration_ft_per_year2': 2 * quadratic['coefficients'][:, 0],
+        'quadratic_r_squared': quadratic['r_squared'],
+        'acceleration_detected': improvement > ACCELERATION_R2_IMPROVEMENT
+    })
+
+def save_monthly_trends(summary_df, output_file=MONTHLY_TREND_FILE):
+    """Write the monthly trend summary to CSV."""
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    summary_df.to_csv(output_file, index=False)
+    print(f"[OK] Monthly trend summary saved to: {output_file}")
+    return output_file
+
+def run_monthly_trends(station_folders):
+    """Load, fit and save monthly trends; returns the summary or None."""
+    monthly = load_monthly_series(station_folders, load_cube(resolution='monthly'))
+    if monthly is None:
+        print("No monthly data available (run aggregate_data.py first)")
+        return None
+
+    summary_df = monthly_trend_summary(monthly)
+    for _, row in summary_df.iterrows():
+        print(f"{row['station']} ({row['source']}, {row['n_months']} months): "
+              f"{row['rate_ft_per_year']:.4f} ft/year "
+              f"(±{row['std_err']:.4f} OLS, ±{row['std_err_ar1']:.4f} AR(1)-adjusted), "
+              f"acceleration {row['acceleration_ft_per_year2']:.6f} ft/year²")
+    save_monthly_trends(summary_df)
+    return summary_df
+
+if __name__ == "__main__":
+    from data_cleaning.stations import STATION_DATA_FOLDERS
+
+    print("=" * 60)
+    print("Monthly Trend Analysis")
+    print("=" * 60)
+    run_monthly_trends(STATION_DATA_FOLDERS)
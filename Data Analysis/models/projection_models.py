@@ -10,276 +10,206 @@ Model Type: Weighted Ensemble / Hybrid Model
 
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-from scipy import stats
 import os
+import sys
 
-# Government baseline rate: 6.2 mm/year = 0.0203 ft/year
-GOVERNMENT_SLR_RATE_FT_YEAR = 0.0203
-GOVERNMENT_SLR_RATE_FT_YEAR_STD = 0.0032
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_cleaning.completeness import load_annual_weights, completeness_weights
+from models.batch_regression import pad_station_series, batched_ols
+from models.backtesting import run_backtests, print_skill_summary, save_backtest_skill
+from models.monte_carlo import MC_PATHS, monte_carlo_projections, save_monte_carlo
+from models.government_rate import GOVERNMENT_SLR_RATE_FT_YEAR, GOVERNMENT_SLR_RATE_FT_YEAR_STD
 
 # Target years for projections
 TARGET_YEARS = [2030, 2035, 2040, 2045, 2050]
 
-def linear_model_predict(years_train, values_train, years_predict):
-    """Linear regression model for station-specific trend."""
-    X_train = years_train.reshape(-1, 1)
-    X_predict = years_predict.reshape(-1, 1)
-    
-    model = LinearRegression()
-    model.fit(X_train, values_train)
-    
-    predictions = model.predict(X_predict)
-    
-    # Calculate confidence intervals
-    y_pred_train = model.predict(X_train)
-    residuals = values_train - y_pred_train
-    mse = np.mean(residuals**2)
-    n = len(years_train)
-    
-    # Standard error for predictions
-    X_mean = np.mean(X_train)
-    Sxx = np.sum((X_train - X_mean)**2)
-    se_pred = np.sqrt(mse * (1 + 1/n + (X_predict - X_mean)**2 / Sxx))
-    
-    # 95% confidence interval
-    t_val = stats.t.ppf(0.975, n - 2)
-    ci_lower = predictions - t_val * se_pred.flatten()
-    ci_upper = predictions + t_val * se_pred.flatten()
-    
-    return {
-        'predictions': predictions,
-        'ci_lower': ci_lower,
-        'ci_upper': ci_upper,
-        'model': model,
-        'rate_ft_per_year': model.coef_[0]
-    }
+# Annual planning curves (start, stop, step; stop inclusive)
+CURVE_YEARS = (2025, 2100, 1)
+PROJECTION_CURVES_FILE = 'output/projection_curves.csv'
 
-def government_baseline_model(years_train, values_train, years_predict):
-    """Model using government baseline rate."""
-    # Use last observed value as starting point
-    last_value = values_train[-1]
-    last_year = years_train[-1]
-    
-    # Calculate cumulative rise using government rate
-    years_since_last = years_predict - last_year
-    cumulative_rise = GOVERNMENT_SLR_RATE_FT_YEAR * years_since_last
-    
-    predictions = last_value + cumulative_rise
-    
-    # Confidence intervals based on government rate uncertainty
-    cumulative_std = GOVERNMENT_SLR_RATE_FT_YEAR_STD * np.abs(years_since_last)
-    ci_lower = predictions - 1.96 * cumulative_std
-    ci_upper = predictions + 1.96 * cumulative_std
-    
-    return {
-        'predictions': predictions,
-        'ci_lower': ci_lower,
-        'ci_upper': ci_upper,
-        'model': {'type': 'government_baseline', 'rate': GOVERNMENT_SLR_RATE_FT_YEAR}
-    }
+# Allowed range of weight_gov (the span of the former 0.05-step grid search)
+WEIGHT_GOV_BOUNDS = (0.1, 0.55)
 
-def blend_models_with_government_rate(station_result, years_train, values_train, years_predict, 
-                                     weight_gov=0.3):
-    """Blend station-specific trend with government baseline rate."""
-    # Get station trend
-    station_trend = station_result['linear']['predictions']
-    
-    # Get government baseline
-    gov_result = government_baseline_model(years_train, values_train, years_predict)
-    gov_trend = gov_result['predictions']
-    
-    # Weighted blend
-    blended = (1 - weight_gov) * station_trend + weight_gov * gov_trend
+# Fine grid for the reported holdout RMSE curve
+WEIGHT_GOV_GRID = np.linspace(WEIGHT_GOV_BOUNDS[0], WEIGHT_GOV_BOUNDS[1], 91)
+
+def target_year_range(start, stop, step=1):
+    """
+    Target years from start to stop (inclusive) every step years.
     
-    # Combine confidence intervals
-    station_ci_range = station_result['linear']['ci_upper'] - station_result['linear']['ci_lower']
-    gov_ci_range = gov_result['ci_upper'] - gov_result['ci_lower']
-    combined_ci_range = np.sqrt((1 - weight_gov)**2 * station_ci_range**2 + 
-                                weight_gov**2 * gov_ci_range**2)
+    Any array of calendar years works as target years; this is the usual
+    shorthand for annual or 5-year curves, e.g. target_year_range(2025, 2100).
+    """
+    return np.arange(start, stop + 1, step)
+
+def blend_projections(linear_bands, weight_gov, target_years, gov_origin_year, gov_origin_value,
+                      rate=GOVERNMENT_SLR_RATE_FT_YEAR, rate_std=GOVERNMENT_SLR_RATE_FT_YEAR_STD,
+                      acceleration=0.0):
+    """
+    Blend station linear trends with a sea-level-rise baseline.
     
-    ci_lower = blended - combined_ci_range / 2
-    ci_upper = blended + combined_ci_range / 2
+    The blend is (1 - weight_gov) * linear + weight_gov * baseline, and the
+    two interval widths are combined in quadrature with the same weights.
+    The baseline rises rate * t + acceleration * t^2 / 2 from each station's
+    origin, with a 95% range of 2 * 1.96 * rate_std * |t|. The defaults are
+    the government rate; rate, rate_std and acceleration may be arrays of
+    shape (scenarios, 1, 1) to evaluate every scenario at once.
     
-    return {
-        'predictions': blended,
-        'ci_lower': ci_lower,
-        'ci_upper': ci_upper,
-        'weight_gov': weight_gov
-    }
+    Args:
+        linear_bands: (predictions, ci_lower, ci_upper), each (stations, years)
+        weight_gov: Government weight of each station
+        target_years: Calendar years (columns of the band matrices)
+        gov_origin_year, gov_origin_value: Year and value the baseline
+            starts from for each station
+        rate, rate_std, acceleration: Baseline rate (ft/year), its standard
+            deviation and acceleration (ft/year^2)
+        
+    Returns:
+        (blended, ci_lower, ci_upper), each (stations, years) or
+        (scenarios, stations, years)
+    """
+    linear, linear_lower, linear_upper = linear_bands
+    weight_gov = np.asarray(weight_gov, dtype=float)[:, None]
+    
+    years_since_last = np.asarray(target_years)[None, :] - np.asarray(gov_origin_year)[:, None]
+    gov = (np.asarray(gov_origin_value, dtype=float)[:, None] + rate * years_since_last
+           + 0.5 * acceleration * years_since_last * years_since_last)
+    gov_range = 2 * 1.96 * rate_std * np.abs(years_since_last)
+    
+    blended = (1 - weight_gov) * linear + weight_gov * gov
+    combined_range = np.sqrt((1 - weight_gov) ** 2 * (linear_upper - linear_lower) ** 2
+                             + weight_gov ** 2 * gov_range ** 2)
+    return blended, blended - combined_range / 2, blended + combined_range / 2
 
-def tune_blended_model_weight(years_train, values_train, holdout_start_year=2015):
+def blended_projection_table(stations, target_years, blended_bands, weight_gov):
     """
-    Tune the weight_gov hyperparameter using holdout validation.
+    Long-format table of blend_projections() output.
     
     Args:
-        years_train: Training years
-        values_train: Training values
-        holdout_start_year: Year to start holdout validation
+        stations: Station names (rows of the band matrices)
+        target_years: Calendar years (columns of the band matrices)
+        blended_bands: (predictions, ci_lower, ci_upper), each (stations, years)
+        weight_gov: Government weight of each station
         
     Returns:
-        Best weight_gov value and validation metrics
+        DataFrame with one row per station and year
     """
-    # Split data into train and validation sets
-    mask = years_train < holdout_start_year
-    years_train_split = years_train[mask]
-    values_train_split = values_train[mask]
-    years_val = years_train[~mask]
-    values_val = values_train[~mask]
-    
-    if len(years_val) == 0:
-        print(f"  Not enough data for tuning (holdout starts at {holdout_start_year})")
-        # Return default based on data length
-        if len(years_train) < 25:
-            return 0.4, None
-        else:
-            return 0.2, None
-    
-    # Convert to years since start for modeling
-    years_train_relative = years_train_split - years_train_split.min()
-    years_val_relative = years_val - years_train_split.min()
-    
-    # Get linear model predictions for validation
-    linear_result = linear_model_predict(years_train_relative, values_train_split, years_val_relative)
-    
-    # Get government baseline predictions for validation
-    gov_result = government_baseline_model(years_train_split, values_train_split, years_val)
-    
-    # Test different weight values
-    weight_candidates = np.arange(0.1, 0.6, 0.05)  # Test weights from 0.1 to 0.55
-    best_weight = 0.3
-    best_rmse = float('inf')
-    best_metrics = None
+    target_years = np.asarray(target_years)
+    blended, ci_lower, ci_upper = blended_bands
+    n_years = len(target_years)
+    return pd.DataFrame({
+        'station': np.repeat(stations, n_years),
+        'year': np.tile(target_years, len(stations)),
+        'model': 'blended',
+        'prediction_ft': blended.ravel(),
+        'ci_lower_ft': ci_lower.ravel(),
+        'ci_upper_ft': ci_upper.ravel(),
+        'optimal_weight_gov': np.repeat(np.asarray(weight_gov, dtype=float), n_years)
+    })
+
+def optimal_blend_weight(values_val, linear_preds, gov_preds, mask=None, bounds=WEIGHT_GOV_BOUNDS,
+                         grid=WEIGHT_GOV_GRID):
+    """
+    Closed-form RMSE-optimal weight_gov for blended holdout predictions.
     
-    results = []
+    The blend is L + w * (G - L), so the holdout squared error is quadratic
+    in w and minimized at w* = sum((y - L) * (G - L)) / sum((G - L)^2).
+    Clipping w* to the bounds gives the constrained optimum. Works on the
+    last axis, so a (stations x years) matrix tunes every station at once.
     
-    for weight_gov in weight_candidates:
-        # Blend predictions
-        blended_preds = (1 - weight_gov) * linear_result['predictions'] + weight_gov * gov_result['predictions']
-        
-        # Calculate metrics
-        rmse = np.sqrt(mean_squared_error(values_val, blended_preds))
-        mae = mean_absolute_error(values_val, blended_preds)
-        r2 = r2_score(values_val, blended_preds)
-        
-        results.append({
-            'weight_gov': weight_gov,
-            'rmse': rmse,
-            'mae': mae,
-            'r2': r2
-        })
+    Args:
+        values_val: Observed holdout values
+        linear_preds: Station linear model predictions for the holdout
+        gov_preds: Government baseline predictions for the holdout
+        mask: Optional boolean mask of real entries (for padded matrices)
+        bounds: (lower, upper) allowed weight_gov
+        grid: Weights at which to report the RMSE curve
         
-        if rmse < best_rmse:
-            best_rmse = rmse
-            best_weight = weight_gov
-            best_metrics = {'rmse': rmse, 'mae': mae, 'r2': r2}
-    
-    return best_weight, best_metrics
+    Returns:
+        (optimal weight(s), RMSE curve over grid with shape (..., len(grid)))
+    """
+    values_val = np.asarray(values_val, dtype=float)
+    mask = np.ones(values_val.shape, dtype=bool) if mask is None else mask
+    residual = np.where(mask, values_val - linear_preds, 0.0)
+    spread = np.where(mask, np.asarray(gov_preds) - linear_preds, 0.0)
+    
+    sdd = np.sum(spread * spread, axis=-1)
+    srd = np.sum(residual * spread, axis=-1)
+    # With identical models every weight ties; keep the lower bound like the old grid search
+    weight = np.divide(srd, sdd, out=np.full(np.shape(sdd), float(bounds[0])), where=sdd > 0)
+    weight = np.clip(weight, bounds[0], bounds[1])
+    
+    errors = residual[..., None, :] - grid[:, None] * spread[..., None, :]
+    n = np.sum(mask, axis=-1)[..., None]
+    rmse_curve = np.sqrt(np.sum(np.where(mask[..., None, :], errors ** 2, 0.0), axis=-1) / n)
+    return weight, rmse_curve
 
-def project_station(station_name, annual_data, tune_hyperparameters=True):
+def default_weight_gov(n_years):
+    """Fallback weight_gov when there is no holdout data."""
+    return 0.4 if n_years < 25 else 0.2
+
+def tune_all_stations(annual_data, holdout_start_year=2015, weights=None):
     """
-    Generate projections for a station using the optimized blended model.
+    Tune weight_gov for every station at once.
+    
+    Each station's linear trend is fitted on the years before
+    holdout_start_year and blended with the government baseline from its
+    last training year; weight_gov minimizes the holdout RMSE. Stations
+    without holdout years get default_weight_gov().
     
     Args:
-        station_name: Name of the station
-        annual_data: DataFrame with annual water level data
-        tune_hyperparameters: If True, tune weight_gov using validation data
+        annual_data: Annual data for all stations
+        holdout_start_year: Year to start holdout validation
+        weights: Optional per-row completeness weights aligned with annual_data
+        
+    Returns:
+        Dict of station -> (best weight_gov, validation metrics or None)
     """
-    print(f"\n{'='*60}")
-    print(f"Projections for {station_name}")
-    print(f"{'='*60}")
-    
-    years = annual_data['years_since_start'].values
-    values = annual_data['mean_ft'].values
-    actual_years = annual_data['year'].values
-    
-    # For projection, use years since start of data period
-    last_year = actual_years.max()
-    years_since_last = TARGET_YEARS - last_year
-    
-    # Convert target years to years since start
-    years_predict = years.max() + years_since_last
-    
-    print(f"Training period: {actual_years.min()} to {actual_years.max()}")
-    print(f"Projection years: {TARGET_YEARS}")
-    
-    # Get linear model for station trend
-    linear_result = linear_model_predict(years, values, years_predict)
-    print(f"\nStation Linear Trend: {linear_result['rate_ft_per_year']:.4f} ft/year")
-    
-    # Tune hyperparameter if requested
-    if tune_hyperparameters:
-        print("\n--- Hyperparameter Tuning ---")
-        best_weight, metrics = tune_blended_model_weight(actual_years, values)
-        if metrics:
-            print(f"  Best weight_gov: {best_weight:.3f}")
-            print(f"  Validation RMSE: {metrics['rmse']:.4f} ft")
-            print(f"  Validation MAE: {metrics['mae']:.4f} ft")
-            print(f"  Validation R²: {metrics['r2']:.4f}")
-        else:
-            # Use default based on data length
-            if len(years) < 25:
-                best_weight = 0.4
-            else:
-                best_weight = 0.2
-            print(f"  Using default weight_gov: {best_weight:.3f} (insufficient data for tuning)")
-    else:
-        # Use default based on data length
-        if len(years) < 25:
-            best_weight = 0.4
+    series = pad_station_series(annual_data, x_column='year', weights=weights)
+    years, values, mask = series['x'], series['y'], series['mask']
+    train = mask & (years < holdout_start_year)
+    val = mask & (years >= holdout_start_year)
+    
+    # Linear fits on the training years only (years relative to each station's start)
+    relative = years - np.where(mask, years, np.inf).min(axis=1)[:, None]
+    fit = batched_ols(relative, values, train, series['weights'])
+    linear_preds = fit['intercept'][:, None] + fit['slope'][:, None] * relative
+    
+    # Government baseline from each station's last training year
+    positions = np.arange(years.shape[1])
+    last = np.where(train, positions, -1).max(axis=1)
+    rows = np.arange(len(years))
+    gov_preds = (values[rows, last][:, None]
+                 + GOVERNMENT_SLR_RATE_FT_YEAR * (years - years[rows, last][:, None]))
+    
+    best, rmse_curve = optimal_blend_weight(values, linear_preds, gov_preds, val)
+    blended = (1 - best[:, None]) * linear_preds + best[:, None] * gov_preds
+    
+    n_val = val.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        errors = np.where(val, values - blended, 0.0)
+        val_mean = np.where(val, values, 0.0).sum(axis=1) / n_val
+        sst = np.where(val, (values - val_mean[:, None]) ** 2, 0.0).sum(axis=1)
+        rmse = np.sqrt((errors ** 2).sum(axis=1) / n_val)
+        mae = np.abs(errors).sum(axis=1) / n_val
+        r2 = 1 - (errors ** 2).sum(axis=1) / sst
+    
+    tuned = {}
+    for i, station in enumerate(series['stations']):
+        if n_val[i] == 0 or last[i] < 0:
+            tuned[station] = (default_weight_gov(int(mask[i].sum())), None)
         else:
-            best_weight = 0.2
-        print(f"\nUsing default weight_gov: {best_weight:.3f}")
-    
-    # Create blended model result
-    results = {'linear': linear_result}
-    blended_result = blend_models_with_government_rate(results, years, values, years_predict, best_weight)
-    
-    print(f"\n--- Blended Model (Ensemble) ---")
-    print(f"  Government weight: {best_weight:.1%}")
-    print(f"  Station weight: {1-best_weight:.1%}")
-    
-    # Store results
-    results['blended'] = blended_result
-    results['station'] = station_name
-    results['train_years'] = actual_years
-    results['train_values'] = values
-    results['target_years'] = TARGET_YEARS
-    results['optimal_weight_gov'] = best_weight
-    
-    return results
+            tuned[station] = (float(best[i]), {'rmse': rmse[i], 'mae': mae[i], 'r2': r2[i],
+                                               'weight_grid': WEIGHT_GOV_GRID,
+                                               'rmse_curve': rmse_curve[i]})
+    return tuned
 
-def save_projections(all_results, output_dir='output'):
-    """Save projection results to CSV."""
-    os.makedirs(output_dir, exist_ok=True)
-    
-    projection_data = []
-    
-    for result in all_results:
-        station = result['station']
-        target_years = result['target_years']
-        
-        # Only save blended model results
-        if 'blended' in result:
-            pred_result = result['blended']
-            for i, year in enumerate(target_years):
-                projection_data.append({
-                    'station': station,
-                    'year': year,
-                    'model': 'blended',
-                    'prediction_ft': pred_result['predictions'][i],
-                    'ci_lower_ft': pred_result['ci_lower'][i],
-                    'ci_upper_ft': pred_result['ci_upper'][i],
-                    'optimal_weight_gov': pred_result['weight_gov']
-                })
-    
-    df = pd.DataFrame(projection_data)
-    output_file = os.path.join(output_dir, 'water_level_projections.csv')
-    df.to_csv(output_file, index=False)
+def save_projection_table(projection_df, output_file='output/water_level_projections.csv'):
+    """Save a long-format projection table (project_from_registry()) to CSV."""
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    projection_df.to_csv(output_file, index=False)
     print(f"\n[OK] Projections saved to: {output_file}")
-    
-    return df
+    return projection_df
 
 def main():
     """Main function to generate projections."""
@@ -297,34 +227,68 @@ def main():
     
     annual_data = pd.read_csv(annual_file)
     
-    # Generate projections for each station
-    stations = annual_data['station'].unique()
-    all_results = []
+    # Per-year completeness weights (None if aggregate_data.py built no index)
+    weights = completeness_weights(annual_data, load_annual_weights())
+    
+    # Fitted models from the registry; only stations whose data changed are refitted
+    # (imported here because the registry builds on this module)
+    from models.model_registry import update_registry, project_from_registry
+    from models.scenarios import SCENARIOS_FILE, load_scenarios, scenario_tensor, save_scenario_projections
+    registry, refitted = update_registry(annual_data, weights)
+    print(f"\nModel registry: refitted {len(refitted)} of {len(registry['stations'])} station(s)")
+    
+    for station, entry in registry['stations'].items():
+        print(f"\n{station} ({entry['training_window'][0]}-{entry['training_window'][1]}):")
+        label = " (completeness-weighted)" if entry['weighted'] else ""
+        print(f"  Station Linear Trend{label}: {entry['slope']:.4f} ft/year")
+        print(f"  Government weight: {entry['weight_gov']:.1%}")
+        if entry['validation']:
+            print(f"  Validation RMSE: {entry['validation']['rmse']:.4f} ft")
+            print(f"  Validation MAE: {entry['validation']['mae']:.4f} ft")
+            print(f"  Validation R²: {entry['validation']['r2']:.4f}")
+        else:
+            print("  Default weight_gov (insufficient data for tuning)")
+    
+    # Save projections (all stations x target years in one vectorized pass)
+    projection_df = save_projection_table(project_from_registry(registry, TARGET_YEARS))
+    
+    # Annual planning curves
+    save_projection_table(project_from_registry(registry, target_year_range(*CURVE_YEARS)),
+                          PROJECTION_CURVES_FILE)
     
-    for station in stations:
-        station_data = annual_data[annual_data['station'] == station].copy()
-        result = project_station(station, station_data, tune_hyperparameters=True)
-        all_results.append(result)
+    # Annual curves under every sea-level-rise scenario (scenario x station x year)
+    if os.path.exists(SCENARIOS_FILE):
+        scenarios = load_scenarios()
+        print(f"\nScenario sweep: {', '.join(scenarios['scenario'])}")
+        save_scenario_projections(scenario_tensor(registry, scenarios, target_year_range(*CURVE_YEARS)))
     
-    # Save projections
-    projection_df = save_projections(all_results)
+    # Sampled percentiles of the same blended projections
+    print(f"\nRunning Monte Carlo ensembles ({MC_PATHS:,} paths per station)...")
+    weight_gov = {station: entry['weight_gov'] for station, entry in registry['stations'].items()}
+    mc_df = monte_carlo_projections(annual_data, TARGET_YEARS, weight_gov, weights,
+                                    workers=os.cpu_count() or 1)
+    save_monte_carlo(mc_df)
+    
+    # Rolling-origin skill of the linear, government and blended models
+    print("\n" + "=" * 60)
+    print("Rolling-Origin Backtest (pooled over stations)")
+    print("=" * 60)
+    skill_df = run_backtests(annual_data, workers=os.cpu_count() or 1)
+    print_skill_summary(skill_df)
+    save_backtest_skill(skill_df)
     
     # Print summary
     print("\n" + "=" * 60)
     print("Projection Summary")
     print("=" * 60)
     
-    for result in all_results:
-        station = result['station']
+    for station, station_df in projection_df.groupby('station', sort=False):
         print(f"\n{station}:")
         print(f"  {'Year':<10} {'Prediction (ft)':<20} {'95% CI (ft)':<30}")
         print(f"  {'-'*10} {'-'*20} {'-'*30}")
         
-        blended = result['blended']
-        for i, year in enumerate(result['target_years']):
-            pred = blended['predictions'][i]
-            ci_low = blended['ci_lower'][i]
-            ci_high = blended['ci_upper'][i]
+        for year, pred, ci_low, ci_high in zip(station_df['year'], station_df['prediction_ft'],
+                                               station_df['ci_lower_ft'], station_df['ci_upper_ft']):
             print(f"  {year:<10} {pred:>8.3f}{'':10} [{ci_low:>6.3f}, {ci_high:>6.3f}]")
     
     print("\n" + "=" * 60)
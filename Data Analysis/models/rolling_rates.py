@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Rolling-window rates of change from prefix sums.
+Every window's least-squares slope and standard error come from cumulative
+sums of n, x, y, x^2, xy and y^2, so all windows of a series cost O(n)
+instead of one regression per window. Works on annual means and on the
+monthly means of the aggregate cube; output feeds acceleration charts.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_cleaning.rollup import load_cube
+
+# Window lengths in years; 19 years is the National Tidal Datum Epoch
+ROLLING_WINDOWS_YEARS = [5, 10, 19]
+
+# Step between window starts, in periods (years or months)
+ROLLING_STRIDE = 1
+
+# Fraction of a window's periods that must have data
+MIN_WINDOW_COVERAGE = 0.8
+
+ROLLING_RATES_FILE = 'output/rolling_rates.csv'
+
+def _window_sums(values, starts, window):
+    """Sum of values over [start, start + window) for each start via one prefix sum."""
+    prefix = np.concatenate([[0.0], np.cumsum(values)])
+    return prefix[starts + window] - prefix[starts]
+
+def rolling_rates(x, y, valid, window, stride=ROLLING_STRIDE, min_coverage=MIN_WINDOW_COVERAGE):
+    """
+    Least-squares slope and standard error of every window of a regular series.
+
+    Args:
+        x: Time of each period (e.g. decimal year), regularly spaced
+        y: Value of each period (ignored where not valid)
+        valid: Boolean mask of periods with data
+        window: Window length in periods
+        stride: Step between window starts in periods
+        min_coverage: Minimum fraction of valid periods per window
+
+    Returns:
+        Dict of arrays: start (period index), n, slope, std_err
+    """
+    valid = np.asarray(valid, dtype=bool)
+    if len(valid) < window or not valid.any():
+        empty = np.zeros(0)
+        return {'start': empty.astype(int), 'n': empty.astype(int), 'slope': empty, 'std_err': empty}
+
+    # Centering keeps the prefix sums well conditioned
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    xc = np.where(valid, x - x[valid].mean(), 0.0)
+    yc = np.where(valid, y - y[valid].mean(), 0.0)
+
+    starts = np.arange(0, len(valid) - window + 1, stride)
+    n = _window_sums(valid.astype(float), starts, window)
+    sx = _window_sums(xc, starts, window)
+    sy = _window_sums(yc, starts, window)
+    sxx = _window_sums(xc * xc, starts, window)
+    sxy = _window_sums(xc * yc, starts, window)
+    syy = _window_sums(yc * yc, starts, window)
+
+    keep = n >= max(3, int(np.ceil(min_coverage * window)))
+    starts, n = starts[keep], n[keep]
+    sx, sy, sxx, sxy, syy = sx[keep], sy[keep], sxx[keep], sxy[keep], syy[keep]
+
+    cxx = sxx - sx * sx / n
+    cxy = sxy - sx * sy / n
+    cyy = syy - sy * sy / n
+    slope = cxy / cxx
+    ss_res = np.maximum(cyy - slope * cxy, 0.0)
+
+    return {
+        'start': starts,
+        'n': n.astype(int),
+        'slope': slope,
+        'std_err': np.sqrt(ss_res / (n - 2) / cxx)
+    }
+
+def annual_series(station_data):
+    """Regular annual grid (labels, decimal years, values, mask) for one station."""
+    years = station_data['year'].values.astype(int)
+    grid = np.arange(years.min(), years.max() + 1)
+    values = np.zeros(len(grid))
+    valid = np.zeros(len(grid), dtype=bool)
+    values[years - grid[0]] = station_data['mean_ft'].values
+    valid[years - grid[0]] = True
+    return grid.astype(str), grid + 0.5, values, valid
+
+def monthly_series(station_cube):
+    """Regular monthly grid (labels, decimal years, values, mask) from cube rows."""
+    months = pd.to_datetime(station_cube['period_start']).values.astype('datetime64[M]')
+    grid = np.arange(months.min(), months.max() + 1)
+    offsets = (months - grid[0]).astype(int)
+    values = np.zeros(len(grid))
+    valid = np.zeros(len(grid), dtype=bool)
+    values[offsets] = station_cube['mean_ft'].values
+    valid[offsets] = True
+    month_index = grid.astype(np.int64)
+    return np.datetime_as_string(grid), 1970 + (month_index + 0.5) / 12, values, valid
+
+def station_rolling_rates(station, resolution, labels, x, y, valid, periods_per_year,
+                          windows_years=ROLLING_WINDOWS_YEARS, stride=ROLLING_STRIDE):
+    """Rolling rates of one station series for every window length."""
+    frames = []
+    for window_years in windows_years:
+        window = window_years * periods_per_year
+        rates = rolling_rates(x, y, valid, window, stride)
+        start = rates['start']
+        frames.append(pd.DataFrame({
+            'station': station,
+            'resolution': resolution,
+            'window_years': window_years,
+            'window_start': labels[start],
+            'window_end': labels[start + window - 1],
+            'center_year': (x[start] + x[start + window - 1]) / 2,
+            'n_obs': rates['n'],
+            'rate_ft_per_year': rates['slope'],
+            'std_err_ft_per_year': rates['std_err'],
+            'rate_mm_per_year': rates['slope'] * 304.8
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+def calculate_rolling_rates(annual_data, monthly_cube=None, windows_years=ROLLING_WINDOWS_YEARS,
+                            stride=ROLLING_STRIDE):
+    """
+    Rolling rates for every station at annual and (if available) monthly resolution.
+
+    Args:
+        annual_data: DataFrame from annual_water_levels.csv
+        monthly_cube: Monthly rows of the aggregate cube, or None
+        windows_years: Window lengths in years
+        stride: Step between window starts in periods
+
+    Returns:
+        DataFrame with one row per (station, resolution, window, start)
+    """
+    frames = []
+    for station in annual_data['station'].unique():
+        station_data = annual_data[annual_data['station'] == station]
+        frames.append(station_rolling_rates(station, 'annual', *annual_series(station_data), 1,
+                                            windows_years, stride))
+
+        if monthly_cube is not None and station in monthly_cube.index.get_level_values('station'):
+            station_cube = monthly_cube.xs(station, level='station')
+            frames.append(station_rolling_rates(station, 'monthly', *monthly_series(station_cube), 12,
+                                                windows_years, stride))
+    return pd.concat(frames, ignore_index=True)
+
+def save_rolling_rates(rates_df, output_file=ROLLING_RATES_FILE):
+    """Write rolling rates to CSV."""
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    rates_df.to_csv(output_file, index=False)
+    print(f"[OK] Rolling rates saved to: {output_file} ({len(rates_df):,} windows)")
+    return output_file
+
+def main():
+    """Compute rolling-window rates for all stations."""
+    print("=" * 60)
+    print("Rolling-Window Rates of Change")
+    print("=" * 60)
+
+    annual_file = 'output/annual_water_levels.csv'
+    if not os.path.exists(annual_file):
+        print(f"Error: {annual_file} not found!")
+        print("Please run aggregate_data.py first.")
+        return
+
+    annual_data = pd.read_csv(annual_file)
+    rates_df = calculate_rolling_rates(annual_data, load_cube(resolution='monthly'))
+    save_rolling_rates(rates_df)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Sea-level-rise scenario sweeps for the blended projections.
+Scenarios (a rate with its uncertainty and an acceleration term) are read
+from a config table, and the blended model is evaluated for every
+scenario x station x year as one array operation: the station trends come
+from the model registry once, and only the government component changes
+between scenarios.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.model_registry import registry_blend
+
+SCENARIOS_FILE = 'data/slr_scenarios.csv'
+SCENARIO_PROJECTIONS_FILE = 'output/scenario_projections.csv'
+
+# Scenario reproducing the single-rate projections
+BASELINE_SCENARIO = 'baseline'
+
+def load_scenarios(scenarios_file=SCENARIOS_FILE):
+    """
+    Read the scenario table.
+
+    Required columns are scenario and rate_ft_per_year. The optional
+    rate_std_ft_per_year and acceleration_ft_per_year2 default to 0. The
+    rise after t years is rate * t + acceleration * t^2 / 2, counted from
+    each station's last observed year.
+
+    Returns:
+        DataFrame with one row per scenario
+    """
+    scenarios = pd.read_csv(scenarios_file, skipinitialspace=True)
+    missing = {'scenario', 'rate_ft_per_year'} - set(scenarios.columns)
+    if missing:
+        raise ValueError(f"{scenarios_file} is missing column(s): {', '.join(sorted(missing))}")
+    if scenarios['scenario'].duplicated().any():
+        raise ValueError(f"{scenarios_file} has duplicate scenario names")
+
+    for column in ['rate_std_ft_per_year', 'acceleration_ft_per_year2']:
+        scenarios[column] = scenarios[column].fillna(0.0) if column in scenarios else 0.0
+    return scenarios.reset_index(drop=True)
+
+def scenario_tensor(registry, scenarios, target_years, stations=None):
+    """
+    Blended projections for every scenario, station and year.
+
+    Uses the same kernel as model_registry.project_from_registry()
+    (model_registry.registry_blend), so a scenario with the government rate
+    and std and no acceleration reproduces it exactly.
+
+    Args:
+        registry: Model registry dict
+        scenarios: load_scenarios() table
+        target_years: Calendar years to project
+        stations: Stations to project (default all in the registry)
+
+    Returns:
+        Dict with 'scenarios', 'stations', 'years', 'weight_gov' and
+        (scenarios, stations, years) arrays 'predictions', 'ci_lower', 'ci_upper'
+    """
+    target_years = np.asarray(target_years)
+
+    # (scenario, 1, 1) parameters broadcast against the (station, year) bands
+    stations, fit, (blended, ci_lower, ci_upper) = registry_blend(
+        registry, target_years, stations,
+        rate=scenarios['rate_ft_per_year'].values.astype(float)[:, None, None],
+        rate_std=scenarios['rate_std_ft_per_year'].values.astype(float)[:, None, None],
+        acceleration=scenarios['acceleration_ft_per_year2'].values.astype(float)[:, None, None])
+
+    return {
+        'scenarios': list(scenarios['scenario']),
+        'stations': stations,
+        'years': target_years,
+        'weight_gov': fit['weight_gov'],
+        'predictions': blended,
+        'ci_lower': ci_lower,
+        'ci_upper': ci_upper
+    }
+
+def tensor_to_frame(tensor):
+    """Long-format table (scenario, then the water_level_projections.csv columns)."""
+    n_scenarios, n_stations, n_years = tensor['predictions'].shape
+    return pd.DataFrame({
+        'scenario': np.repeat(tensor['scenarios'], n_stations * n_years),
+        'station': np.tile(np.repeat(tensor['stations'], n_years), n_scenarios),
+        'year': np.tile(tensor['years'], n_scenarios * n_stations),
+        'model': 'blended',
+        'prediction_ft': tensor['predictions'].ravel(),
+        'ci_lower_ft': tensor['ci_lower'].ravel(),
+        'ci_upper_ft': tensor['ci_upper'].ravel(),
+        'optimal_weight_gov': np.tile(np.repeat(tensor['weight_gov'], n_years), n_scenarios)
+    })
+
+def save_scenario_projections(tensor, output_file=SCENARIO_PROJECTIONS_FILE):
+    """Write the scenario tensor in long format to CSV."""
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    scenario_df = tensor_to_frame(tensor)
+    scenario_df.to_csv(output_file, index=False)
+    print(f"[OK] Scenario projections saved to: {output_file}")
+    return scenario_df
+
+def main():
+    """Scenario sweep from the stored model registry."""
+    from models.model_registry import REGISTRY_FILE, load_registry
+    from models.projection_models import CURVE_YEARS, target_year_range
+
+    print("=" * 60)
+    print("Sea-Level-Rise Scenario Projections")
+    print("=" * 60)
+
+    if not os.path.exists(REGISTRY_FILE):
+        print(f"Error: {REGISTRY_FILE} not found!")
+        print("Please run projection_models.py first.")
+        return
+
+    scenarios = load_scenarios()
+    tensor = scenario_tensor(load_registry(), scenarios, target_year_range(*CURVE_YEARS))
+    print(f"{len(tensor['scenarios'])} scenarios x {len(tensor['stations'])} stations x "
+          f"{len(tensor['years'])} years")
+    save_scenario_projections(tensor)
+
+if __name__ == "__main__":
+    main()
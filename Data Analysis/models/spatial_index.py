@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Spatial index for assigning cities to water level stations.
+Station coordinates go into a k-d tree on the unit sphere (straight-line
+distance there ranks points like great-circle distance), each city is
+matched to its k nearest stations, and projections are interpolated to the
+city by inverse-distance weighting on haversine distances. Work grows with
+cities x k log(stations) instead of cities x stations.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_cleaning.stations import STATION_COORDINATES
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Stations interpolated to each city and the inverse-distance power
+NEAREST_STATIONS = 2
+IDW_POWER = 2.0
+
+def unit_vectors(latitude, longitude):
+    """Points on the unit sphere, shape (n, 3)."""
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km (inputs broadcast)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def build_station_index(station_coordinates=STATION_COORDINATES):
+    """
+    k-d tree over station locations.
+
+    Args:
+        station_coordinates: Dict of station -> (latitude, longitude)
+
+    Returns:
+        Dict with 'stations', 'latitude', 'longitude' and 'tree'
+    """
+    from scipy.spatial import cKDTree
+
+    stations = list(station_coordinates)
+    latitude = np.array([station_coordinates[station][0] for station in stations], dtype=float)
+    longitude = np.array([station_coordinates[station][1] for station in stations], dtype=float)
+    return {
+        'stations': stations,
+        'latitude': latitude,
+        'longitude': longitude,
+        'tree': cKDTree(unit_vectors(latitude, longitude))
+    }
+
+def located_stations(stations, station_coordinates=STATION_COORDINATES):
+    """
+    Positions of the stations that have coordinates.
+
+    Stations without coordinates are reported and left out, since they
+    cannot be interpolated to any point.
+
+    Returns:
+        List of positions in stations
+    """
+    missing = [station for station in stations if station not in station_coordinates]
+    if missing:
+        print(f"  Warning: no coordinates for {', '.join(missing)}; left out of the spatial flood results "
+              f"(add them to STATION_COORDINATES in data_cleaning/stations.py)")
+    located = [i for i, station in enumerate(stations) if station in station_coordinates]
+    if not located:
+        raise ValueError("No projected station has coordinates in the spatial index")
+    return located
+
+def nearest_stations(index, latitude, longitude, k=NEAREST_STATIONS):
+    """
+    The k nearest stations of every point.
+
+    Returns:
+        (station positions in index['stations'], haversine distances in km),
+        both (points, k) and sorted by distance
+    """
+    k = min(k, len(index['stations']))
+    _, positions = index['tree'].query(unit_vectors(latitude, longitude), k=k)
+    positions = np.asarray(positions).reshape(len(np.atleast_1d(latitude)), k)
+    distances = haversine_km(np.atleast_1d(latitude)[:, None], np.atleast_1d(longitude)[:, None],
+                             index['latitude'][positions], index['longitude'][positions])
+    return positions, distances
+
+def idw_weights(distances, power=IDW_POWER):
+    """
+    Inverse-distance weights per row (summing to 1).
+
+    A point that coincides with a station takes that station's value.
+    """
+    distances = np.asarray(distances, dtype=float)
+    exact = distances <= 0
+    with np.errstate(divide='ignore'):
+        weights = np.where(exact.any(axis=1, keepdims=True), exact.astype(float), distances ** -power)
+    return weights / weights.sum(axis=1, keepdims=True)
+
+def idw_neighbors(index, latitude, longitude, k=NEAREST_STATIONS, power=IDW_POWER):
+    """
+    Nearest stations of every point and their inverse-distance weights.
+
+    Returns:
+        (station positions (points, k), weights (points, k), distances in km (points, k))
+    """
+    positions, distances = nearest_stations(index, latitude, longitude, k)
+    return positions, idw_weights(distances, power), distances
+
+def idw_gather(station_values, positions, weights, axis=0):
+    """
+    Interpolate values stored per station (along axis) to points.
+
+    Args:
+        station_values: Array with one entry per station along axis
+        positions, weights: idw_neighbors() output
+
+    Returns:
+        Array with the station axis replaced by a points axis
+    """
+    values = np.moveaxis(np.asarray(station_values, dtype=float), axis, -1)
+    gathered = np.einsum('...pk,pk->...p', values[..., positions], weights)
+    return np.moveaxis(gathered, -1, axis)
+
+def station_projection_matrices(projections_df, index=None,
+                                value_columns=('prediction_ft', 'ci_lower_ft', 'ci_upper_ft')):
+    """
+    Projections as (stations, keys) matrices aligned with a station index.
+
+    Args:
+        projections_df: Long-format projections (station, year, optional
+            scenario, value columns)
+        index: build_station_index() result (stations without projections
+            are dropped from it)
+        value_columns: Columns to return
+
+    Returns:
+        (index of the projected stations, DataFrame of the non-station key
+        columns with one row per matrix column, dict of column -> matrix)
+    """
+    index = index if index is not None else build_station_index()
+    coordinates = {station: (lat, lon) for station, lat, lon in
+                   zip(index['stations'], index['latitude'], index['longitude'])}
+    projected = list(projections_df['station'].unique())
+    projected = [projected[i] for i in located_stations(projected, coordinates)]
+    stations = [station for station in index['stations'] if station in projected]
+    if stations != index['stations']:
+        index = build_station_index({station: coordinates[station] for station in stations})
+
+    key_columns = [column for column in ['scenario', 'year'] if column in projections_df]
+    known = projections_df[projections_df['station'].isin(stations)]
+    pivot = known.pivot(index='station', columns=key_columns, values=list(value_columns)).reindex(stations)
+    keys = pivot[value_columns[0]].columns.to_frame(index=False)
+    return index, keys, {column: pivot[column].values for column in value_columns}
+
+def interpolate_projections(projections_df, latitude, longitude, index=None, k=NEAREST_STATIONS,
+                            power=IDW_POWER, value_columns=('prediction_ft', 'ci_lower_ft', 'ci_upper_ft')):
+    """
+    Inverse-distance-weighted projections at arbitrary points.
+
+    Args:
+        projections_df: Long-format projections (station, year, optional
+            scenario, value columns)
+        latitude, longitude: Point coordinates
+        index: build_station_index() result
+        k: Nearest stations per point
+        power: Inverse-distance power
+        value_columns: Columns to interpolate
+
+    Returns:
+        Dict with 'keys' (DataFrame of the non-station key columns, one row
+        per key), 'values' (dict of column -> (points, keys) matrix),
+        'nearest_station' and 'nearest_km' (per point)
+    """
+    index, keys, matrices = station_projection_matrices(projections_df, index, value_columns)
+    positions, weights, distances = idw_neighbors(index, latitude, longitude, k, power)
+    return {
+        'keys': keys,
+        'values': {column: idw_gather(matrix, positions, weights) for column, matrix in matrices.items()},
+        'nearest_station': np.array(index['stations'], dtype=object)[positions[:, 0]],
+        'nearest_km': distances[:, 0]
+    }
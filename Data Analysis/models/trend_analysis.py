@@ -6,14 +6,19 @@ Detects linear, quadratic, exponential patterns and calculates rates of change.
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy import stats
-from scipy.optimize import curve_fit
 import os
+import sys
 
-# Government baseline rate: 6.2 mm/year = 0.0203 ft/year
-GOVERNMENT_SLR_RATE_FT_YEAR = 0.0203
-GOVERNMENT_SLR_RATE_FT_YEAR_STD = 0.0032  # 0.97 mm/year = 0.0032 ft/year
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_cleaning.completeness import load_annual_weights, completeness_weights
+from models.batch_regression import pad_groups, pad_station_series, batched_ols, batched_polyfit
+from models.bootstrap import BOOTSTRAP_METHODS, BOOTSTRAP_REPLICATES, bootstrap_station_trends
+from models.changepoint import station_changepoints, breakpoint_summary, save_changepoints
+from models.monthly_trends import run_monthly_trends
+from models.rolling_rates import calculate_rolling_rates, save_rolling_rates
+from data_cleaning.rollup import load_cube
+from models.government_rate import GOVERNMENT_SLR_RATE_FT_YEAR, GOVERNMENT_SLR_RATE_FT_YEAR_STD
+from data_cleaning.stations import STATION_DATA_FOLDERS
 
 def linear_trend(x, a, b):
     """Linear model: y = a + b*x"""
@@ -27,77 +32,110 @@ def exponential_trend(x, a, b):
     """Exponential model: y = a * exp(b*x)"""
     return a * np.exp(b * x)
 
-def calculate_linear_rate(years, values):
-    """Calculate linear rate of change using least squares."""
-    slope, intercept, r_value, p_value, std_err = stats.linregress(years, values)
+def _rate_result(fit, i):
+    """Rate dict for row i of a batched_ols() fit."""
+    return {
+        'slope_ft_per_year': fit['slope'][i],
+        'intercept': fit['intercept'][i],
+        'r_squared': fit['r_squared'][i],
+        'p_value': fit['p_value'][i],
+        'std_err': fit['std_err'][i],
+        'rate_mm_per_year': fit['slope'][i] * 304.8  # Convert feet to mm
+    }
+
+def _polynomial_result(fit, i, degree):
+    """Polynomial dict for row i of a batched_polyfit() fit."""
+    coeffs = fit['coefficients'][i]
     return {
-        'slope_ft_per_year': slope,
-        'intercept': intercept,
-        'r_squared': r_value**2,
-        'p_value': p_value,
-        'std_err': std_err,
-        'rate_mm_per_year': slope * 304.8  # Convert feet to mm
+        'coefficients': coeffs,
+        'polynomial': np.poly1d(coeffs),
+        'r_squared': fit['r_squared'][i],
+        'degree': degree
     }
 
+def _single_series(years, values):
+    x = np.asarray(years, dtype=float)[None, :]
+    y = np.asarray(values, dtype=float)[None, :]
+    return x, y, np.ones(x.shape, dtype=bool)
+
+def calculate_linear_rate(years, values):
+    """Calculate linear rate of change using least squares."""
+    x, y, mask = _single_series(years, values)
+    return _rate_result(batched_ols(x, y, mask), 0)
+
 def calculate_polynomial_fit(years, values, degree=2):
     """Fit polynomial model and return coefficients."""
-    coeffs = np.polyfit(years, values, degree)
-    poly = np.poly1d(coeffs)
-    
-    # Calculate R-squared
-    y_pred = poly(years)
-    ss_res = np.sum((values - y_pred) ** 2)
-    ss_tot = np.sum((values - np.mean(values)) ** 2)
-    r_squared = 1 - (ss_res / ss_tot)
+    x, y, mask = _single_series(years, values)
+    return _polynomial_result(batched_polyfit(x, y, mask, degree), 0, degree)
+
+def _acceleration_result(linear_result, quad_result):
+    """Compare linear vs quadratic fits; a significantly better quadratic means acceleration."""
+    improvement = quad_result['r_squared'] - linear_result['r_squared']
     
     return {
-        'coefficients': coeffs,
-        'polynomial': poly,
-        'r_squared': r_squared,
-        'degree': degree
+        'linear': linear_result,
+        'quadratic': quad_result,
+        'acceleration_detected': improvement > 0.01,  # Threshold for significant improvement
+        'acceleration_coefficient': quad_result['coefficients'][0]  # Coefficient of x^2
     }
 
 def detect_acceleration(years, values):
     """Detect if sea level rise is accelerating."""
-    results = {}
-    
-    # Linear trend
-    linear_result = calculate_linear_rate(years, values)
-    results['linear'] = linear_result
-    
-    # Quadratic trend (detects acceleration)
-    quad_result = calculate_polynomial_fit(years, values, degree=2)
-    results['quadratic'] = quad_result
-    
-    # Compare linear vs quadratic
-    # If quadratic has significantly better fit, there's acceleration
-    improvement = quad_result['r_squared'] - linear_result['r_squared']
-    
-    # Extract acceleration coefficient (coefficient of x^2)
-    acceleration_coeff = quad_result['coefficients'][0]  # Highest degree coefficient
-    
-    results['acceleration_detected'] = improvement > 0.01  # Threshold for significant improvement
-    results['acceleration_coefficient'] = acceleration_coeff
+    return _acceleration_result(calculate_linear_rate(years, values),
+                                calculate_polynomial_fit(years, values, degree=2))
+
+def _batched_decadal_rates(stations, years, values):
+    """Decadal rates of every station in one batched fit (decades with >= 3 years)."""
+    decades = (np.asarray(years) // 10) * 10
+    keys = pd.MultiIndex.from_arrays([np.asarray(stations), decades])
+    groups, (x, y), mask = pad_groups(keys, years, values)
+    fit = batched_ols(x, y, mask)
     
-    return results
+    decadal_rates = {station: [] for station in pd.unique(np.asarray(stations))}
+    for i in np.argsort([decade for _, decade in groups], kind='stable'):
+        station, decade = groups[i]
+        if fit['n'][i] >= 3:  # Need at least 3 years
+            rate = _rate_result(fit, i)
+            rate['decade'] = int(decade)
+            rate['num_years'] = int(fit['n'][i])
+            decadal_rates[station].append(rate)
+    return decadal_rates
 
 def calculate_decadal_rates(years, values):
     """Calculate rate of change for each decade."""
-    df = pd.DataFrame({'year': years, 'value': values})
-    df['decade'] = (df['year'] // 10) * 10
+    rates = _batched_decadal_rates(np.zeros(len(years), dtype=int), years, values)
+    return rates.get(0, [])
+
+def fit_station_trends(annual_data, weights=None):
+    """
+    Fit every trend model for all stations with one batched call per model.
     
-    decadal_rates = []
-    for decade in sorted(df['decade'].unique()):
-        decade_data = df[df['decade'] == decade]
-        if len(decade_data) >= 3:  # Need at least 3 years
-            decade_years = decade_data['year'].values
-            decade_values = decade_data['value'].values
-            rate = calculate_linear_rate(decade_years, decade_values)
-            rate['decade'] = int(decade)
-            rate['num_years'] = len(decade_data)
-            decadal_rates.append(rate)
+    Args:
+        annual_data: Annual data for one or more stations
+        weights: Optional per-row completeness weights aligned with annual_data
+        
+    Returns:
+        Dict of station -> {'linear', 'weighted', 'acceleration', 'decadal_rates'}
+    """
+    series = pad_station_series(annual_data, weights=weights)
+    x, y, mask = series['x'], series['y'], series['mask']
     
-    return decadal_rates
+    linear = batched_ols(x, y, mask)
+    weighted = batched_ols(x, y, mask, series['weights']) if weights is not None else None
+    quadratic = batched_polyfit(x, y, mask, degree=2)
+    decadal = _batched_decadal_rates(annual_data['station'].values, annual_data['year'].values,
+                                     annual_data['mean_ft'].values)
+    
+    fits = {}
+    for i, station in enumerate(series['stations']):
+        linear_result = _rate_result(linear, i)
+        fits[station] = {
+            'linear': linear_result,
+            'weighted': _rate_result(weighted, i) if weighted is not None else None,
+            'acceleration': _acceleration_result(linear_result, _polynomial_result(quadratic, i, 2)),
+            'decadal_rates': decadal[station]
+        }
+    return fits
 
 def compare_with_government_rate(calculated_rate, std_err):
     """Compare calculated rate with government baseline rate."""
@@ -113,8 +151,16 @@ def compare_with_government_rate(calculated_rate, std_err):
         'within_confidence_interval': abs(diff) < 2 * std_diff  # 95% CI
     }
 
-def analyze_station(station_name, annual_data):
-    """Perform comprehensive trend analysis for a station."""
+def analyze_station(station_name, annual_data, weights=None, fits=None):
+    """
+    Perform comprehensive trend analysis for a station.
+    
+    Args:
+        station_name: Name of the station
+        annual_data: DataFrame with the station's annual data
+        weights: Optional per-year completeness weights
+        fits: Precomputed fits from fit_station_trends() (fitted here if None)
+    """
     print(f"\n{'='*60}")
     print(f"Trend Analysis: {station_name}")
     print(f"{'='*60}")
@@ -127,14 +173,22 @@ def analyze_station(station_name, annual_data):
     print(f"Mean water level range: {values.min():.2f} to {values.max():.2f} ft")
     
     # Linear trend analysis
+    if fits is None:
+        fits = fit_station_trends(annual_data, weights)[station_name]
+    
     print(f"\n--- Linear Trend Analysis ---")
-    linear_result = calculate_linear_rate(years, values)
+    linear_result = fits['linear']
     print(f"Rate of change: {linear_result['slope_ft_per_year']:.4f} ft/year")
     print(f"  = {linear_result['rate_mm_per_year']:.2f} mm/year")
     print(f"R-squared: {linear_result['r_squared']:.4f}")
     print(f"P-value: {linear_result['p_value']:.6f}")
     print(f"Standard error: {linear_result['std_err']:.4f} ft/year")
     
+    weighted_result = fits['weighted']
+    if weighted_result is not None:
+        print(f"Completeness-weighted rate: {weighted_result['slope_ft_per_year']:.4f} ft/year "
+              f"(±{weighted_result['std_err']:.4f})")
+    
     # Compare with government rate
     print(f"\n--- Comparison with Government Baseline Rate ---")
     gov_comparison = compare_with_government_rate(
@@ -151,7 +205,7 @@ def analyze_station(station_name, annual_data):
     
     # Acceleration detection
     print(f"\n--- Acceleration Detection ---")
-    accel_result = detect_acceleration(years, values)
+    accel_result = fits['acceleration']
     print(f"Linear R-squared: {accel_result['linear']['r_squared']:.4f}")
     print(f"Quadratic R-squared: {accel_result['quadratic']['r_squared']:.4f}")
     if accel_result['acceleration_detected']:
@@ -162,7 +216,7 @@ def analyze_station(station_name, annual_data):
     
     # Decadal rates
     print(f"\n--- Decadal Rate Analysis ---")
-    decadal_rates = calculate_decadal_rates(actual_years, values)
+    decadal_rates = fits['decadal_rates']
     for rate in decadal_rates:
         print(f"{rate['decade']}s: {rate['slope_ft_per_year']:.4f} ft/year "
               f"({rate['rate_mm_per_year']:.2f} mm/year, R²={rate['r_squared']:.3f}, "
@@ -173,6 +227,7 @@ def analyze_station(station_name, annual_data):
         'station': station_name,
         'data_period': f"{actual_years.min()}-{actual_years.max()}",
         'linear_trend': linear_result,
+        'weighted_trend': weighted_result,
         'acceleration': accel_result,
         'decadal_rates': decadal_rates,
         'government_comparison': gov_comparison,
@@ -183,49 +238,6 @@ def analyze_station(station_name, annual_data):
     
     return results
 
-def plot_trends(all_results, output_dir='output'):
-    """Create visualization plots for all stations."""
-    os.makedirs(output_dir, exist_ok=True)
-    
-    fig, axes = plt.subplots(len(all_results), 1, figsize=(12, 5*len(all_results)))
-    if len(all_results) == 1:
-        axes = [axes]
-    
-    for idx, result in enumerate(all_results):
-        ax = axes[idx]
-        station = result['station']
-        years = result['actual_years']
-        values = result['values']
-        
-        # Plot data points
-        ax.scatter(years, values, alpha=0.6, s=50, label='Annual mean water level')
-        
-        # Plot linear trend
-        linear = result['linear_trend']
-        years_sorted = np.sort(years)
-        linear_fit = linear_trend(years_sorted - years.min(), linear['intercept'], linear['slope_ft_per_year'])
-        ax.plot(years_sorted, linear_fit, 'r--', linewidth=2, 
-                label=f"Linear trend: {linear['slope_ft_per_year']:.4f} ft/yr")
-        
-        # Plot quadratic trend if acceleration detected
-        if result['acceleration']['acceleration_detected']:
-            quad = result['acceleration']['quadratic']
-            quad_fit = quad['polynomial'](years_sorted - years.min())
-            ax.plot(years_sorted, quad_fit, 'g--', linewidth=2, 
-                    label=f"Quadratic trend (acceleration)")
-        
-        ax.set_xlabel('Year', fontsize=12)
-        ax.set_ylabel('Water Level (ft)', fontsize=12)
-        ax.set_title(f'{station} - Water Level Trends', fontsize=14, fontweight='bold')
-        ax.legend()
-        ax.grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    plot_file = os.path.join(output_dir, 'trend_analysis.png')
-    plt.savefig(plot_file, dpi=300, bbox_inches='tight')
-    print(f"\n[OK] Trend plots saved to: {plot_file}")
-    plt.close()
-
 def main():
     """Main function to perform trend analysis."""
     print("=" * 60)
@@ -241,21 +253,45 @@ def main():
     
     annual_data = pd.read_csv(annual_file)
     
-    # Analyze each station
+    # Per-year completeness weights (None if aggregate_data.py built no index)
+    weights = completeness_weights(annual_data, load_annual_weights())
+    
+    # Fit all stations at once, then report each
+    all_fits = fit_station_trends(annual_data, weights)
     stations = annual_data['station'].unique()
     all_results = []
     
     for station in stations:
         station_data = annual_data[annual_data['station'] == station].copy()
-        result = analyze_station(station, station_data)
+        result = analyze_station(station, station_data, fits=all_fits[station])
         all_results.append(result)
     
-    # Create visualizations
-    plot_trends(all_results)
+    # Bootstrap intervals (robust to autocorrelated annual means), one process per station
+    print(f"\n--- Bootstrap Confidence Intervals ({BOOTSTRAP_REPLICATES:,} replicates) ---")
+    bootstrap_results = bootstrap_station_trends(annual_data, workers=os.cpu_count() or 1)
+    for station in stations:
+        for method in BOOTSTRAP_METHODS:
+            boot = bootstrap_results[station][method]
+            print(f"{station} ({method}): 95% CI [{boot['ci_lower']:.4f}, {boot['ci_upper']:.4f}] ft/year, "
+                  f"bootstrap SE {boot['std_err']:.4f}")
+    
+    # Rate changepoints (PELT on annual and deseasonalized monthly means)
+    print(f"\n--- Rate Changepoints ---")
+    changepoints_df = station_changepoints(annual_data, load_cube(resolution='monthly'))
+    for _, segment in changepoints_df.iterrows():
+        print(f"{segment['station']} ({segment['resolution']}) {segment['start']} to {segment['end']}: "
+              f"{segment['rate_ft_per_year']:.4f} ft/year (±{segment['std_err_ft_per_year']:.4f})")
+    breakpoints = breakpoint_summary(changepoints_df)
+    
+    # Monthly trends: NOAA seasonally adjusted means, else deseasonalized hourly data
+    print(f"\n--- Monthly Trend Analysis ---")
+    run_monthly_trends({station: STATION_DATA_FOLDERS.get(station) for station in stations})
     
     # Save results summary
     summary_data = []
     for result in all_results:
+        weighted = result['weighted_trend'] or {}
+        boot = bootstrap_results[result['station']]
         summary_data.append({
             'station': result['station'],
             'data_period': result['data_period'],
@@ -263,8 +299,16 @@ def main():
             'rate_mm_per_year': result['linear_trend']['rate_mm_per_year'],
             'r_squared': result['linear_trend']['r_squared'],
             'p_value': result['linear_trend']['p_value'],
+            'weighted_rate_ft_per_year': weighted.get('slope_ft_per_year', np.nan),
+            'weighted_std_err': weighted.get('std_err', np.nan),
             'acceleration_detected': result['acceleration']['acceleration_detected'],
-            'within_gov_interval': result['government_comparison']['within_confidence_interval']
+            'within_gov_interval': result['government_comparison']['within_confidence_interval'],
+            'boot_block_ci_lower': boot['block']['ci_lower'],
+            'boot_block_ci_upper': boot['block']['ci_upper'],
+            'boot_residual_ci_lower': boot['residual']['ci_lower'],
+            'boot_residual_ci_upper': boot['residual']['ci_upper'],
+            'within_gov_interval_bootstrap': boot['block']['within_gov_interval'],
+            'changepoint_years': breakpoints.get(result['station'], '')
         })
     
     summary_df = pd.DataFrame(summary_data)
@@ -272,6 +316,11 @@ def main():
     summary_df.to_csv(summary_file, index=False)
     print(f"\n[OK] Trend analysis summary saved to: {summary_file}")
     
+    save_changepoints(changepoints_df)
+    
+    # Rolling 5/10/19-year rates at annual and monthly resolution
+    save_rolling_rates(calculate_rolling_rates(annual_data, load_cube(resolution='monthly')))
+    
     print("\n" + "=" * 60)
     print("Trend Analysis Complete")
     print("=" * 60)
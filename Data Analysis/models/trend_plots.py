@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Optional plotting stage for the trend analysis.
+Matplotlib is only imported inside the render worker, so analysis runs never
+pay for it. Each station is drawn as its own figure in a process pool, and a
+station is skipped when its fitted results match the last rendered ones.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_cleaning.station_cache import station_slug
+from models.trend_analysis import fit_station_trends
+
+PLOTS_DIR = 'output/plots'
+PLOT_DPI = 300
+
+# Bump when the figure layout changes so every station is redrawn
+PLOT_VERSION = 1
+
+def station_plot_payload(station, station_data, fits):
+    """Everything a station figure depends on, as plain JSON-serializable values."""
+    quad = fits['acceleration']['quadratic']
+    return {
+        'station': station,
+        'years': [int(year) for year in station_data['year'].values],
+        'values': [float(value) for value in station_data['mean_ft'].values],
+        'intercept': float(fits['linear']['intercept']),
+        'slope': float(fits['linear']['slope_ft_per_year']),
+        'acceleration_detected': bool(fits['acceleration']['acceleration_detected']),
+        'quadratic_coefficients': [float(c) for c in quad['coefficients']]
+    }
+
+def payload_fingerprint(payload):
+    """Hash of a station's plot inputs and the plot settings."""
+    content = json.dumps({'payload': payload, 'dpi': PLOT_DPI, 'version': PLOT_VERSION}, sort_keys=True)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def plot_file(station, output_dir=PLOTS_DIR):
+    return os.path.join(output_dir, f"trend_{station_slug(station)}.png")
+
+def render_station_plot(task):
+    """Worker: draw one station's trend figure (top level so it pickles)."""
+    payload, output_file = task
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    years = np.array(payload['years'])
+    values = np.array(payload['values'])
+    years_sorted = np.sort(years)
+
+    fig, ax = plt.subplots(figsize=(12, 5))
+    ax.scatter(years, values, alpha=0.6, s=50, label='Annual mean water level')
+
+    linear_fit = payload['intercept'] + payload['slope'] * (years_sorted - years.min())
+    ax.plot(years_sorted, linear_fit, 'r--', linewidth=2,
+            label=f"Linear trend: {payload['slope']:.4f} ft/yr")
+
+    if payload['acceleration_detected']:
+        quad_fit = np.poly1d(payload['quadratic_coefficients'])(years_sorted - years.min())
+        ax.plot(years_sorted, quad_fit, 'g--', linewidth=2, label="Quadratic trend (acceleration)")
+
+    ax.set_xlabel('Year', fontsize=12)
+    ax.set_ylabel('Water Level (ft)', fontsize=12)
+    ax.set_title(f"{payload['station']} - Water Level Trends", fontsize=14, fontweight='bold')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+
+    fig.tight_layout()
+    fig.savefig(output_file, dpi=PLOT_DPI, bbox_inches='tight')
+    plt.close(fig)
+    return payload['station'], output_file
+
+def _load_manifest(output_dir):
+    manifest_file = os.path.join(output_dir, 'manifest.json')
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def _save_manifest(output_dir, manifest):
+    manifest_file = os.path.join(output_dir, 'manifest.json')
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+def render_trend_plots(payloads, output_dir=PLOTS_DIR, workers=1, force=False):
+    """
+    Render station figures whose inputs changed since the last run.
+
+    Args:
+        payloads: List of station_plot_payload() dicts
+        output_dir: Directory for the PNG files and manifest.json
+        workers: Render processes (1 = render in this process)
+        force: Redraw every station
+
+    Returns:
+        (list of rendered files, number of skipped stations)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _load_manifest(output_dir)
+
+    tasks = []
+    fingerprints = {}
+    for payload in payloads:
+        station = payload['station']
+        output_file = plot_file(station, output_dir)
+        fingerprints[station] = payload_fingerprint(payload)
+        if not force and manifest.get(station) == fingerprints[station] and os.path.exists(output_file):
+            continue
+        tasks.append((payload, output_file))
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            rendered = list(executor.map(render_station_plot, tasks))
+    else:
+        rendered = [render_station_plot(task) for task in tasks]
+
+    for station, _ in rendered:
+        manifest[station] = fingerprints[station]
+    _save_manifest(output_dir, manifest)
+
+    return [output_file for _, output_file in rendered], len(payloads) - len(tasks)
+
+def main(force=False):
+    """Render trend plots for all stations."""
+    print("=" * 60)
+    print("Trend Plots")
+    print("=" * 60)
+
+    annual_file = 'output/annual_water_levels.csv'
+    if not os.path.exists(annual_file):
+        print(f"Error: {annual_file} not found!")
+        print("Please run aggregate_data.py first.")
+        return
+
+    annual_data = pd.read_csv(annual_file)
+    all_fits = fit_station_trends(annual_data)
+    payloads = [station_plot_payload(station, annual_data[annual_data['station'] == station],
+                                     all_fits[station])
+                for station in annual_data['station'].unique()]
+
+    rendered, skipped = render_trend_plots(payloads, workers=os.cpu_count() or 1, force=force)
+    for output_file in rendered:
+        print(f"[OK] Trend plot saved to: {output_file}")
+    if skipped:
+        print(f"Skipped {skipped} unchanged station plot(s)")
+
+if __name__ == "__main__":
+    # Run through the importable module so pool workers can unpickle render_station_plot
+    # (also when this file is exec'd by run_analysis.py)
+    from models import trend_plots
+    trend_plots.main(force='--force' in sys.argv[1:])
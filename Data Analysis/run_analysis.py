@@ -5,11 +5,12 @@ Runs all phases: aggregation, trend analysis, projections, and flood assessment.
 Main output: output/flood_risk_summary.csv
 """
 
+import argparse
 import os
 import sys
 
-def run_script(script_name, description):
-    """Run a Python script and handle errors."""
+def run_script(script_name, description, argv=()):
+    """Run a Python script (with its own command-line arguments) and handle errors."""
     print("\n" + "=" * 60)
     print(description)
     print("=" * 60)
@@ -28,7 +29,13 @@ def run_script(script_name, description):
         with open(script_name, 'r') as f:
             code = f.read()
         
-        exec(compile(code, script_name, 'exec'), {'__name__': '__main__'})
+        # Each script parses only the arguments meant for it
+        saved_argv = sys.argv
+        sys.argv = [script_name, *argv]
+        try:
+            exec(compile(code, script_name, 'exec'), {'__name__': '__main__', '__file__': script_name})
+        finally:
+            sys.argv = saved_argv
         
         return True
     except Exception as e:
@@ -39,6 +46,13 @@ def run_script(script_name, description):
 
 def main():
     """Run the complete analysis pipeline."""
+    parser = argparse.ArgumentParser(description='Run the water level projection analysis pipeline.')
+    parser.add_argument('--plots', action='store_true',
+                        help='also render per-station trend plots (optional stage)')
+    parser.add_argument('--all-stations', action='store_true',
+                        help='flood stage: pair every city with every station instead of '
+                             'interpolating from the nearest stations (legacy)')
+    args = parser.parse_args()
     
     print("=" * 60)
     print("Water Level Projection Analysis Pipeline")
@@ -48,17 +62,22 @@ def main():
     print("2. Trend analysis")
     print("3. Optimized blended ensemble model projections")
     print("4. Flood risk assessment")
+    if args.plots:
+        print("5. Trend plots")
     
     scripts = [
-        ('data_cleaning/aggregate_data.py', 'Phase 1: Data Aggregation'),
-        ('models/trend_analysis.py', 'Phase 2: Trend Analysis'),
-        ('models/projection_models.py', 'Phase 3: Projection Models'),
-        ('models/flood_risk_assessment.py', 'Phase 4: Flood Risk Assessment')
+        ('data_cleaning/aggregate_data.py', 'Phase 1: Data Aggregation', []),
+        ('models/trend_analysis.py', 'Phase 2: Trend Analysis', []),
+        ('models/projection_models.py', 'Phase 3: Projection Models', []),
+        ('models/flood_risk_assessment.py', 'Phase 4: Flood Risk Assessment',
+         ['--all-stations'] if args.all_stations else [])
     ]
+    if args.plots:
+        scripts.append(('models/trend_plots.py', 'Phase 5: Trend Plots', []))
     
     success_count = 0
-    for script, description in scripts:
-        success = run_script(script, description)
+    for script, description, script_args in scripts:
+        success = run_script(script, description, script_args)
         if success:
             success_count += 1
         else:
@@ -77,9 +96,26 @@ def main():
         print("\nOther Output Files:")
         print("  - output/annual_water_levels.csv")
         print("  - output/trend_analysis_summary.csv")
+        print("  - output/rolling_rates.csv")
+        print("  - output/changepoints.csv")
+        print("  - output/monthly_trend_summary.csv")
+        print("  - output/model_registry.json")
         print("  - output/water_level_projections.csv")
+        print("  - output/projection_curves.csv")
+        print("  - output/scenario_projections.csv")
+        print("  - output/monte_carlo_projections.csv")
+        print("  - output/backtest_skill.csv")
         print("  - output/flood_risk_assessment.csv")
-        print("  - output/trend_analysis.png")
+        print("  - output/flood_risk_summary_long.csv")
+        print("  - output/flood_risk_scenarios.csv")
+        if os.path.exists('data/assets.csv'):
+            print("  - output/asset_risk/year=YYYY/part-NNNNN.csv")
+            print("  - output/asset_risk/summary.csv")
+        if os.path.exists('data/dem.npy') and os.path.exists('data/dem.json'):
+            print("  - output/inundation_tiles.csv")
+            print("  - output/inundation_summary.csv")
+        if args.plots:
+            print("  - output/plots/trend_<station>.png")
     else:
         print("\n[WARNING] Pipeline incomplete. Check errors above.")
 